@@ -0,0 +1,9 @@
+"""
+Micro-benchmarks for XBee Home Automation hot paths.
+
+Run a benchmark module from the repository root, for example:
+ $ python -m benchmarks.codec
+
+benchmarks.suite runs the protocol and logging benchmarks together, and
+saves their results as JSON to compare later runs with.
+"""
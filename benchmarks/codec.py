@@ -0,0 +1,132 @@
+"""
+Compare the struct-based xh.encoding codecs with the per-byte loops they
+replace, for the field widths which appear in API frames; and the bit field
+index tables with the per-bit loop.
+
+ $ python -m benchmarks.codec [--number N]
+"""
+
+import argparse
+import timeit
+
+from xh import encoding
+
+
+# The per-byte implementations which xh.encoding used before its fixed-width
+# fast paths, kept here as the point of comparison.
+def legacyStringToNumber(s):
+	n = 0
+	for c in s:
+		n *= encoding.BYTE_BASE
+		n += ord(c)
+	return n
+
+
+def legacyNumberToString(n, padToBytes=1):
+	s = ''
+	while n > 0:
+		lowByte = n % encoding.BYTE_BASE
+		s = chr(lowByte) + s
+		n = n / encoding.BYTE_BASE
+	if padToBytes is not None and len(s) < padToBytes:
+		s = ('\x00'*(padToBytes - len(s))) + s
+	return s
+
+
+def legacyBitFieldToIndexSet(bitField):
+	b = bitField
+	i = 0
+	indices = set()
+	while b > 0:
+		if b & 0x1:
+			indices.add(i)
+		b = b >> 1
+		i += 1
+	return indices
+
+
+# (description, width, sample number) for each field width in API frames
+WIDTHS = [
+	('frame id / status', 1, 0x2a),
+	('16-bit address', 2, 0x3ef7),
+	('serial half (SH/SL)', 4, 0x13a200),
+	('64-bit serial', 8, 0x13a200abcd1234),
+	('128-bit link key (KY)', 16, (0x0123456789abcdef << 64) | 0xfedcba98),
+]
+
+# (description, bit field) for sample masks and pull-up resistor fields
+BIT_FIELDS = [
+	('analog mask', 0x83),
+	('digital mask', 0x1c11),
+	('pull-up resistors', 0x3fff),
+]
+
+# A remote AT response header: frame id, serial, address, (command), status.
+REMOTE_AT_FIELDS = [(0, 1), (1, 8), (9, 2), (13, 1)]
+
+
+def timePerCall(fn, args, number):
+	"""
+	@return the best-of-three time in microseconds for one call of fn(*args)
+	"""
+	timer = timeit.Timer(lambda: fn(*args))
+	return min(timer.repeat(repeat=3, number=number)) / number * 1e6
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__,
+		formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--number', '-n', type=int, default=100000,
+		help='Calls to time per measurement.')
+	args = parser.parse_args()
+
+	rowT = '%-24s %10s %10s %8s'
+	print rowT % ('unpack', 'loop us', 'codec us', 'speedup')
+	for description, width, n in WIDTHS:
+		s = encoding.numberToString(n, padToBytes=width)
+		assert legacyStringToNumber(s) == encoding.stringToNumber(s)
+		before = timePerCall(legacyStringToNumber, (s,), args.number)
+		after = timePerCall(encoding.stringToNumber, (s,), args.number)
+		print rowT % (description, '%.3f' % before, '%.3f' % after,
+			'%.1fx' % (before / after))
+
+	print
+	print rowT % ('pack', 'loop us', 'codec us', 'speedup')
+	for description, width, n in WIDTHS:
+		assert (legacyNumberToString(n, width)
+			== encoding.numberToString(n, width))
+		before = timePerCall(legacyNumberToString, (n, width),
+			args.number)
+		after = timePerCall(encoding.numberToString, (n, width),
+			args.number)
+		print rowT % (description, '%.3f' % before, '%.3f' % after,
+			'%.1fx' % (before / after))
+
+	print
+	frame = ('\x2a' + encoding.numberToSerialString(0x13a200abcd1234)
+		+ '\x03\x72' + 'IS' + '\x00')
+	def sliceEachField():
+		return tuple([legacyStringToNumber(frame[o:o+w])
+			for o, w in REMOTE_AT_FIELDS])
+	batch = encoding.FieldDecoder(REMOTE_AT_FIELDS)
+	assert sliceEachField() == batch.decode(frame)
+	before = timePerCall(sliceEachField, (), args.number)
+	after = timePerCall(batch.decode, (frame,), args.number)
+	print rowT % ('remote AT header (batch)', '%.3f' % before,
+		'%.3f' % after, '%.1fx' % (before / after))
+
+	print
+	print rowT % ('bit field', 'loop us', 'table us', 'speedup')
+	for description, bitField in BIT_FIELDS:
+		assert (legacyBitFieldToIndexSet(bitField)
+			== set(encoding.bitFieldToIndices(bitField)))
+		before = timePerCall(legacyBitFieldToIndexSet, (bitField,),
+			args.number)
+		after = timePerCall(encoding.bitFieldToIndices, (bitField,),
+			args.number)
+		print rowT % (description, '%.3f' % before, '%.3f' % after,
+			'%.1fx' % (before / after))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,91 @@
+"""
+Measure the memory footprint of parsed Frames, as held by the Frame Logger's
+history or by queues of received frames.
+
+Many frames of each kind are parsed and kept; the footprint per frame is the
+total size of all the objects reachable from them (counting each object
+once, so objects shared among frames, like enum values, amortize to nothing)
+divided by the number of frames.
+
+ $ python -m benchmarks.memory [--number N]
+"""
+
+import argparse
+import gc
+import sys
+import types
+
+from xh import protocol
+
+
+# API frame data for each kind of received frame
+FRAMES = [
+	('Data (4 samples)', '\x92\x00\x13\xa2\x00\x40\x11\x13\x7d\x7e\x11\x01'
+		+ '\x01\x00\x11\x83\x00\x10\x02\x00\x01\x22\x0b\xb8'),
+	('NodeId', '\x95\x00\x13\xa2\x00\x40\x11\x13\x7d\x7e\x11\x02\x12\x34'
+		+ '\x00\x13\xa2\x00\x40\x11\x13\x7dnode\x00\xff\xfe\x01\x01'
+		+ '\xc1\x05\x10\x1e'),
+	('remote SleepPeriod', '\x97\x0b\x00\x13\xa2\x00\x40\x11\x13\x7d\x7e'
+		+ '\x11SP\x00\x01\x2c'),
+	('InputSample (4 samples)', '\x88\x04IS\x00\x01\x00\x11\x83\x00\x10'
+		+ '\x02\x00\x01\x22\x0b\xb8'),
+]
+
+# Objects of these types are part of the program, not of any frame.
+_PROGRAM_TYPES = (
+	type,
+	types.ClassType,
+	types.ModuleType,
+	types.FunctionType,
+	types.BuiltinFunctionType,
+	types.MethodType,
+)
+
+
+def deepSize(roots):
+	"""
+	@return the total size in bytes of the objects reachable from roots
+		(excluding roots themselves), each counted once
+	"""
+	seen = set([id(roots)])
+	pending = list(roots)
+	total = 0
+	while pending:
+		obj = pending.pop()
+		if id(obj) in seen or isinstance(obj, _PROGRAM_TYPES):
+			continue
+		seen.add(id(obj))
+		total += sys.getsizeof(obj)
+		pending.extend(gc.get_referents(obj))
+	return total
+
+
+def measure(frameData, number):
+	"""
+	@return (bytes per frame, garbage-collected objects per frame)
+	"""
+	gc.collect()
+	numObjects = len(gc.get_objects())
+	frames = [protocol.ParseFromApiFrame(frameData)
+		for i in xrange(number)]
+	gc.collect()
+	numObjects = len(gc.get_objects()) - numObjects - 1
+	return (float(deepSize(frames)) / number, float(numObjects) / number)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__,
+		formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--number', '-n', type=int, default=10000,
+		help='Frames of each kind to keep.')
+	args = parser.parse_args()
+
+	rowT = '%-24s %14s %14s'
+	print rowT % ('frame', 'bytes/frame', 'gc objs/frame')
+	for description, frameData in FRAMES:
+		size, numObjects = measure(frameData, args.number)
+		print rowT % (description, '%.0f' % size, '%.1f' % numObjects)
+
+
+if __name__ == '__main__':
+	main()
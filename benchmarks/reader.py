@@ -0,0 +1,158 @@
+"""
+Compare the ways of reading received API frames from the serial port: the
+xbee library's reader thread (byte-at-a-time reads, decoded to API dicts),
+xh.reader.ApiFrameReader (polling), and xh.reader.SelectApiFrameReader
+(waiting on the file descriptor, with bulk reads).
+
+Each reader reads from a pseudo-terminal, as it would a serial device, while
+this writes frames into the other end. Measured are:
+ * throughput: frames per second, with a burst of frames written as fast as
+   the pseudo-terminal takes them;
+ * latency: the time from writing one frame to its being handled;
+ * idle CPU: the processor time the reader uses with nothing to read.
+
+ $ python -m benchmarks.reader [--number N]
+"""
+
+import argparse
+import os
+import pty
+import struct
+import threading
+import time
+
+from xh import reader
+from xh.deps import serial, xbee
+from benchmarks.memory import FRAMES
+
+
+IDLE_SECONDS = 1.0
+
+
+def encodeFrame(frameData):
+	return ('\x7e' + struct.pack('>H', len(frameData)) + frameData
+		+ chr(0xFF - (sum(bytearray(frameData)) & 0xFF)))
+
+
+def writeAll(fd, data):
+	while data:
+		n = os.write(fd, data)
+		data = data[n:]
+
+
+class Counter:
+	"""
+	A reader callback, which counts the frames handled and signals (and
+	notes the time) when a given count is reached.
+	"""
+
+
+	def __init__(self):
+		self.__lock = threading.Lock()
+		self.__count = 0
+		self.__target = None
+		self.__reached = threading.Event()
+		self.__reachedTime = None
+
+
+	def expect(self, numMore):
+		with self.__lock:
+			self.__target = self.__count + numMore
+			self.__reached.clear()
+
+
+	def wait(self, timeoutSeconds):
+		"""
+		@return the time the count was reached
+		"""
+		if not self.__reached.wait(timeoutSeconds):
+			raise RuntimeError('frames not received')
+		return self.__reachedTime
+
+
+	def __call__(self, frame):
+		with self.__lock:
+			self.__count += 1
+			if self.__count == self.__target:
+				self.__reachedTime = time.time()
+				self.__reached.set()
+
+
+def startXbee(serialObj, callback):
+	return xbee.ZigBee(serialObj, callback=callback)
+
+
+def startPolling(serialObj, callback):
+	frameReader = reader.ApiFrameReader(serialObj, callback)
+	frameReader.start()
+	return frameReader
+
+
+def startSelect(serialObj, callback):
+	frameReader = reader.SelectApiFrameReader(serialObj, callback)
+	frameReader.start()
+	return frameReader
+
+
+READERS = [
+	('xbee library', startXbee),
+	('ApiFrameReader', startPolling),
+	('SelectApiFrameReader', startSelect),
+]
+
+
+def measure(start, number, numLatencies):
+	"""
+	@return (frames per second, mean latency in seconds, idle CPU
+		fraction) for a reader
+	"""
+	master, slave = pty.openpty()
+	serialObj = serial.Serial(os.ttyname(slave))
+	counter = Counter()
+	frameReader = start(serialObj, counter)
+	try:
+		encoded = [encodeFrame(d) for name, d in FRAMES]
+
+		counter.expect(number)
+		startTime = time.time()
+		writeAll(master, ''.join(encoded[i % len(encoded)]
+			for i in xrange(number)))
+		perSecond = number / (counter.wait(60) - startTime)
+
+		totalLatency = 0.0
+		for i in xrange(numLatencies):
+			counter.expect(1)
+			startTime = time.time()
+			writeAll(master, encoded[i % len(encoded)])
+			totalLatency += counter.wait(10) - startTime
+
+		startCpu = time.clock()
+		time.sleep(IDLE_SECONDS)
+		idleCpu = (time.clock() - startCpu) / IDLE_SECONDS
+	finally:
+		frameReader.halt()
+		serialObj.close()
+		os.close(master)
+	return perSecond, totalLatency / numLatencies, idleCpu
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__,
+		formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--number', '-n', type=int, default=5000,
+		help='Frames to read for the throughput.')
+	parser.add_argument('--latencies', type=int, default=200,
+		help='Frames to read one at a time for the latency.')
+	args = parser.parse_args()
+
+	print '%-22s %12s %12s %10s' % ('reader', 'frames/s', 'latency us',
+		'idle CPU')
+	for name, start in READERS:
+		perSecond, latency, idleCpu = measure(start, args.number,
+			args.latencies)
+		print '%-22s %12.0f %12.0f %9.1f%%' % (name, perSecond,
+			latency * 1e6, idleCpu * 100)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,467 @@
+"""
+Time the protocol and logging hot paths on generated inputs, and save the
+results as JSON, so that runs before and after a change can be compared:
+ * ParseFromDict for each registered frame type (and for the AT response of
+   each registered Command), InputSample.parseParameter and
+   NodeDiscover.parseParameter, on frames from simulated nodes (see
+   xh.simulator);
+ * the xh.encoding helpers;
+ * datalogging.log (into a temporary data directory), datalogging.parseLogFile
+   and the webgraphs plugin's combine.buildJsData.
+
+Measured for each benchmark are:
+ * ops/s: calls per second (the best of three runs of --number calls);
+ * allocs/op: the objects (tracked by the garbage collector) which each call
+   leaves allocated, with its result kept;
+ * peak KiB: how much the peak resident memory grew over --number calls,
+   keeping their results.
+Where the platform can fork, each benchmark runs in its own process, so that
+one's memory use does not hide another's.
+
+ $ python -m benchmarks.suite [--number N] [--filter TEXT] [--output FILE]
+	[--compare PREVIOUS_FILE]
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+try:
+	import resource
+except ImportError:	# not POSIX
+	resource = None
+
+from xh import Config, datalogging, encoding, protocol, simulator
+from xh.protocol import Command, CommandRegistry, Frame
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+	os.path.abspath(__file__))), 'plugins'))
+from webgraphs import combine
+
+
+FORMAT_VERSION = 1
+DEFAULT_OUTPUT_T = os.path.join('benchmarks', 'results', 'suite-%s.json')
+
+# how many different inputs to cycle through for each benchmark
+NUM_INPUTS = 64
+LOG_FILE_LINES = 1000
+GRAPH_SERIES = 4
+GRAPH_POINTS = 500
+LOG_INTERVAL = datetime.timedelta(minutes=1)
+
+FORK_AVAILABLE = hasattr(os, 'fork') and resource is not None
+
+_API_FIELD_WIDTHS = [1, 2, 4, 8]
+
+
+
+class Benchmark:
+	"""
+	A function to time, and the inputs to call it with (in turn).
+	"""
+
+
+	def __init__(self, name, function, inputs, cost=1):
+		"""
+		@param cost roughly how many items each call handles (such as
+			lines of a file), to scale down the number of calls
+		"""
+		self.__name = name
+		self.__function = function
+		self.__inputs = inputs
+		self.__cost = cost
+
+
+	def getName(self):
+		return self.__name
+
+
+	def getCalls(self, number):
+		"""
+		@return the inputs of (about) number / cost calls, in turn
+		"""
+		numCalls = max(1, number / self.__cost)
+		inputs = self.__inputs
+		return [inputs[i % len(inputs)] for i in xrange(numCalls)]
+
+
+	def measure(self, number):
+		"""
+		@return a dict of the measurements
+		"""
+		function = self.__function
+		calls = self.getCalls(number)
+		def run():
+			for x in calls:
+				function(x)
+		run()
+		seconds = min(timeit.Timer(run).repeat(repeat=3, number=1))
+
+		gc.collect()
+		gc.disable()
+		try:
+			numObjects = len(gc.get_objects())
+			startPeak = getPeakKiB()
+			results = [function(x) for x in calls]
+			endPeak = getPeakKiB()
+			# less the list of results
+			numObjects = len(gc.get_objects()) - numObjects - 1
+		finally:
+			gc.enable()
+		del results
+		return {
+			'calls': len(calls),
+			'opsPerSecond': len(calls) / seconds,
+			'allocationsPerOp': float(numObjects) / len(calls),
+			'peakKiB': (None if startPeak is None
+				else endPeak - startPeak),
+		}
+
+
+
+def getPeakKiB():
+	"""
+	@return the peak resident memory of this process so far, in KiB, or
+		None if not known
+	"""
+	if resource is None:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin':
+		# in bytes there
+		peak /= 1024
+	return peak
+
+
+def runIsolated(benchmark, number):
+	"""
+	Measure a benchmark in a forked process (where possible).
+	@return a dict of the measurements
+	"""
+	if not FORK_AVAILABLE:
+		return benchmark.measure(number)
+	readFd, writeFd = os.pipe()
+	pid = os.fork()
+	if pid == 0:
+		os.close(readFd)
+		status = 0
+		try:
+			result = benchmark.measure(number)
+		except:
+			logging.getLogger().error('%s failed'
+				% benchmark.getName(), exc_info=True)
+			result = None
+			status = 1
+		with os.fdopen(writeFd, 'w') as f:
+			json.dump(result, f)
+		os._exit(status)
+	os.close(writeFd)
+	with os.fdopen(readFd) as f:
+		result = json.load(f)
+	os.waitpid(pid, 0)
+	if result is None:
+		raise RuntimeError('%s failed.' % benchmark.getName())
+	return result
+
+
+def createNodes():
+	return simulator.createNodes(NUM_INPUTS, seed=1)
+
+
+def createSampleDict(node, rand):
+	"""
+	@return a list of the sample dicts of an IO sample from the node, as
+		the xbee library decodes them
+	"""
+	d = {}
+	for name, function in sorted(simulator.DEFAULT_PIN_FUNCTIONS.items()):
+		pin = simulator.PIN_COMMAND_TO_DIO[name]
+		if function == simulator.PIN_ANALOG_INPUT:
+			d['adc-%d' % pin] = rand.randint(0, 0x3FF)
+		else:
+			d['dio-%d' % pin] = rand.random() < 0.5
+	return [d]
+
+
+def createDataDicts(nodes, rand):
+	return [{
+		'id': str(Frame.TYPE.rx_io_data_long_addr),
+		'source_addr_long': encoding.numberToSerialString(
+			n.getSerial()),
+		'source_addr': encoding.numberToString(n.getNetworkAddress(),
+			2),
+		'options': '\x01',
+		'samples': createSampleDict(n, rand),
+	} for n in nodes]
+
+
+def createNodeIdDicts(nodes):
+	return [{
+		'id': str(Frame.TYPE.node_id_indicator),
+		'sender_addr_long': encoding.numberToSerialString(
+			n.getSerial()),
+		'sender_addr': encoding.numberToString(n.getNetworkAddress(),
+			2),
+		'options': '\x02',
+		'source_addr_long': encoding.numberToSerialString(
+			n.getSerial()),
+		'source_addr': encoding.numberToString(n.getNetworkAddress(),
+			2),
+		'node_id': n.getNodeIdentifier(),
+		'parent_source_addr': '\xff\xfe',
+		'device_type': chr(n.getDeviceType().index),
+		'source_event': '\x01',
+		'digi_profile_id': '\xc1\x05',
+		'manufacturer_id': '\x10\x1e',
+	} for n in nodes]
+
+
+def getResponseParameter(node, name):
+	"""
+	@return the parameter of the node's response to the command name
+	"""
+	if name == Command.NAME.ND:
+		return node.encodeNodeDiscovery(
+			simulator.UNKNOWN_NETWORK_ADDRESS)
+	status, parameter = node.handleCommand(str(name), '')
+	if status != Command.STATUS.OK.index:
+		raise ValueError('%s does not answer %s.' % (node, name))
+	return parameter
+
+
+def createAtResponseDicts(nodes, name, remote=False):
+	dicts = []
+	for i, n in enumerate(nodes):
+		d = {
+			'id': str(Frame.TYPE.remote_at_response if remote
+				else Frame.TYPE.at_response),
+			'frame_id': chr(i % 0xFF + 1),
+			'command': str(name),
+			'status': '\x00',
+		}
+		parameter = getResponseParameter(n, name)
+		if parameter:
+			d['parameter'] = parameter
+		if remote:
+			d['source_addr_long'] = encoding.numberToSerialString(
+				n.getSerial())
+			d['source_addr'] = encoding.numberToString(
+				n.getNetworkAddress(), 2)
+		dicts.append(d)
+	return dicts
+
+
+def createProtocolBenchmarks(nodes, rand):
+	parse = protocol.ParseFromDict
+	benchmarks = [
+		Benchmark('ParseFromDict rx_io_data_long_addr', parse,
+			createDataDicts(nodes, rand)),
+		Benchmark('ParseFromDict node_id_indicator', parse,
+			createNodeIdDicts(nodes)),
+		Benchmark('ParseFromDict remote_at_response IS', parse,
+			createAtResponseDicts(nodes, Command.NAME.IS,
+				remote=True)),
+	]
+	for name in Command.NAME:
+		if CommandRegistry.get(name) is not None:
+			benchmarks.append(Benchmark(
+				'ParseFromDict at_response %s' % name, parse,
+				createAtResponseDicts(nodes, name)))
+
+	inputSample = protocol.InputSample()
+	nodeDiscover = protocol.NodeDiscover()
+	benchmarks += [
+		Benchmark('InputSample.parseParameter',
+			inputSample.parseParameter,
+			[n.encodeSamples() for n in nodes]),
+		Benchmark('NodeDiscover.parseParameter',
+			nodeDiscover.parseParameter,
+			[getResponseParameter(n, Command.NAME.ND)
+				for n in nodes]),
+	]
+	return benchmarks
+
+
+def createEncodingBenchmarks(nodes, rand):
+	serials = [n.getSerial() for n in nodes]
+	benchmarks = []
+	for width in _API_FIELD_WIDTHS:
+		numbers = [rand.getrandbits(8 * width)
+			for i in xrange(NUM_INPUTS)]
+		benchmarks += [
+			Benchmark('encoding.stringToNumber %d bytes' % width,
+				encoding.stringToNumber,
+				[encoding.numberToString(n, width)
+					for n in numbers]),
+			Benchmark('encoding.numberToString %d bytes' % width,
+				lambda n, width=width: encoding.numberToString(
+					n, width),
+				numbers),
+		]
+	header = encoding.FieldDecoder([(0, 1), (1, 8), (9, 2), (13, 1)])
+	benchmarks += [
+		Benchmark('encoding.numberToSerialString',
+			encoding.numberToSerialString, serials),
+		Benchmark('encoding.buildSerial',
+			lambda s: encoding.buildSerial(s >> 32, s & 0xFFFFFFFF),
+			serials),
+		Benchmark('encoding.stringToVolts', encoding.stringToVolts,
+			[encoding.numberToString(rand.randint(0, 0x3FF), 2)
+				for i in xrange(NUM_INPUTS)]),
+		Benchmark('encoding.bitFieldToIndices',
+			encoding.bitFieldToIndices,
+			[rand.getrandbits(16) for i in xrange(NUM_INPUTS)]),
+		Benchmark('encoding.bitFieldToIndexSet',
+			encoding.bitFieldToIndexSet,
+			[rand.getrandbits(16) for i in xrange(NUM_INPUTS)]),
+		Benchmark('encoding.FieldDecoder.decode', header.decode,
+			[encoding.numberToString(rand.getrandbits(14 * 8), 14)
+				for i in xrange(NUM_INPUTS)]),
+	]
+	return benchmarks
+
+
+def createLogData(rand, numPoints, gapEvery=None):
+	"""
+	@return a list of (datetime, value string) log entries, one a
+		minute, with a gap (longer than combine.GAP_DT) every
+		gapEvery entries
+	"""
+	d = datetime.datetime(2013, 1, 1)
+	data = []
+	for i in xrange(numPoints):
+		if gapEvery and i and i % gapEvery == 0:
+			d += combine.GAP_DT
+		d += LOG_INTERVAL
+		data.append((d, '%.1f' % rand.uniform(0, 100)))
+	return data
+
+
+def createLoggingBenchmarks(nodes, rand, dataDir):
+	# Send data logs to the temporary directory.
+	Config.DATA_DIR = dataDir
+	datalogging._FILE_NAME_T = os.path.join(dataDir, 'datalog-%s.csv')
+	pins = [protocol.PIN.AD1, protocol.PIN.AD2, protocol.PIN.DIO4]
+	now = datetime.datetime.utcnow()
+	logArgs = [('%s-%s' % (datalogging.formatSerial(n.getSerial()),
+		pins[i % len(pins)]), now, rand.randint(0, 0x3FF))
+		for i, n in enumerate(nodes[:len(pins) * 2])]
+
+	logFiles = [['%s,%s\n' % (datalogging.formatTimestamp(d), v)
+		for d, v in createLogData(rand, LOG_FILE_LINES)]
+		for i in xrange(4)]
+
+	names = ['series%d' % i for i in xrange(GRAPH_SERIES)]
+	graphDefinitions = {'series': dict((name, [{}]) for name in names)}
+	allLogData = dict((name, createLogData(rand, GRAPH_POINTS,
+		gapEvery=GRAPH_POINTS / 4)) for name in names)
+
+	return [
+		Benchmark('datalogging.log', lambda a: datalogging.log(*a),
+			logArgs),
+		Benchmark('datalogging.parseLogFile %d lines' % LOG_FILE_LINES,
+			datalogging.parseLogFile, logFiles,
+			cost=LOG_FILE_LINES),
+		Benchmark('combine.buildJsData %d series x %d points'
+			% (GRAPH_SERIES, GRAPH_POINTS),
+			lambda data: combine.buildJsData(graphDefinitions,
+				data),
+			[allLogData], cost=GRAPH_SERIES * GRAPH_POINTS),
+	]
+
+
+def loadResults(path):
+	with open(path) as f:
+		results = json.load(f)
+	if results.get('formatVersion') != FORMAT_VERSION:
+		raise ValueError('%s is not in results format version %d.'
+			% (path, FORMAT_VERSION))
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__,
+		formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--number', '-n', type=int, default=20000,
+		help='Calls to time per measurement (fewer for benchmarks'
+		+ ' of whole files or graphs).')
+	parser.add_argument('--filter', '-k', dest='filterText',
+		help='Run only the benchmarks whose names contain this.')
+	parser.add_argument('--output', '-o',
+		help='Where to save the results (default: '
+		+ DEFAULT_OUTPUT_T % 'TIME' + ').')
+	parser.add_argument('--compare', '-c', dest='previousPath',
+		help='Results of an earlier run to compare ops/s with.')
+	args = parser.parse_args()
+
+	# Quiet the console, but leave the levels (which the data loggers
+	# inherit) as they are.
+	for handler in logging.getLogger().handlers:
+		handler.setLevel(logging.WARNING)
+	protocol.setKeyAuditing(protocol.KEY_AUDIT.NONE)
+	previous = {}
+	if args.previousPath:
+		previous = loadResults(args.previousPath)['benchmarks']
+
+	rand = random.Random(0)
+	nodes = createNodes()
+	dataDir = tempfile.mkdtemp(prefix='xh-benchmarks-')
+	try:
+		benchmarks = (createProtocolBenchmarks(nodes, rand)
+			+ createEncodingBenchmarks(nodes, rand)
+			+ createLoggingBenchmarks(nodes, rand, dataDir))
+		if args.filterText:
+			benchmarks = [b for b in benchmarks
+				if args.filterText in b.getName()]
+
+		rowT = '%-44s %12s %10s %9s %8s'
+		print rowT % ('benchmark', 'ops/s', 'allocs/op', 'peak KiB',
+			'vs prev')
+		results = {}
+		for benchmark in benchmarks:
+			result = runIsolated(benchmark, args.number)
+			name = benchmark.getName()
+			results[name] = result
+			change = ''
+			if name in previous:
+				change = '%.2fx' % (result['opsPerSecond']
+					/ previous[name]['opsPerSecond'])
+			peak = result['peakKiB']
+			print rowT % (name, '%.0f' % result['opsPerSecond'],
+				'%.1f' % result['allocationsPerOp'],
+				'-' if peak is None else '%d' % peak, change)
+	finally:
+		shutil.rmtree(dataDir, ignore_errors=True)
+
+	now = time.time()
+	output = args.output or DEFAULT_OUTPUT_T % time.strftime(
+		'%Y%m%dT%H%M%SZ', time.gmtime(now))
+	outputDir = os.path.dirname(output)
+	if outputDir and not os.path.isdir(outputDir):
+		os.makedirs(outputDir)
+	with open(output, 'w') as f:
+		json.dump({
+			'formatVersion': FORMAT_VERSION,
+			'time': now,
+			'python': sys.version,
+			'platform': platform.platform(),
+			'number': args.number,
+			'benchmarks': results,
+		}, f, indent=1, sort_keys=True)
+	print
+	print 'saved results to %s' % output
+
+
+if __name__ == '__main__':
+	main()
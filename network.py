@@ -108,10 +108,15 @@ def _setNetworkParams(panId, linkKey):
 		keyCmd.setParameter(linkKey)
 		commands.append(keyCmd)
 
-	commands.append(xh.protocol.Write())
-
-	for cmd in commands:
-		xh.synchronous.sendAndWait(cmd)
+	# Write the settings only once every one of them has been applied.
+	for response in xh.synchronous.sendBatch(commands):
+		if isinstance(response, Exception):
+			raise response
+		if response.getStatus() != response.STATUS.OK:
+			raise RuntimeError('Failed to set %s: %s'
+				% (response.getName(), response.getStatus()))
+	xh.synchronous.sendAndWait(xh.protocol.Write(),
+		priority=xh.transmit.PRIORITY.NORMAL)
 
 	_addConfigEntry(panId, linkKey)
 
@@ -1,5 +1,4 @@
 import logging
-import threading
 
 import xh
 from xh.protocol import Command, PIN
@@ -17,7 +16,7 @@ class DataLogger(xh.Plugin):
 	supply voltages (via InputVolts). Data is logged raw (in volts or as
 	boolean values).
 
-	InputVolts is actively queried.
+	InputVolts is actively queried (see __createPoller).
 	"""
 	_PRESENCE_PLUGIN_NAME = 'Presence'
 	_POLL_INTERVAL_SEC = 5 * 60.0
@@ -31,7 +30,16 @@ class DataLogger(xh.Plugin):
 		xh.Plugin.activate(self)
 		self.__presence = self.getPluginObjByName(
 			self._PRESENCE_PLUGIN_NAME)
-		self.__poll()
+		self.__poller = self.__createPoller()
+		self.__poller.start()
+
+
+	def deactivate(self):
+		self.__poller.halt()
+		for serial, stats in sorted(self.__poller.getStats().items()):
+			log.debug('polls of %s: %s'
+				% (xh.datalogging.formatSerial(serial), stats))
+		xh.Plugin.deactivate(self)
 
 
 	def _frameReceived(self, frame):
@@ -46,18 +54,23 @@ class DataLogger(xh.Plugin):
 	def __logData(self, frame):
 		serial = (frame.getSourceAddressLong()
 			or self.__presence.getLocalSerial())
-		t = frame.getTimestamp()
-		for sample in frame.getSamples():
-			xh.datalogging.logPinValue(serial, t,
-				sample.getPinName(), sample.getValue())
+		self.__logSampleArrays(serial, frame.getTimestamp(),
+			frame.getSampleArrays())
 
 
 	def __logInputSample(self, frame):
 		serial = (frame.getRemoteSerial()
 			or self.__presence.getLocalSerial())
-		for sample in frame.getSamples():
-			xh.datalogging.logPinValue(serial, frame.getTimestamp(),
-				sample.getPinName(), sample.getValue())
+		sampleArrays = frame.getSampleArrays()
+		if sampleArrays:
+			self.__logSampleArrays(serial, frame.getTimestamp(),
+				sampleArrays)
+
+
+	def __logSampleArrays(self, serial, t, sampleArrays):
+		pinNames, values = sampleArrays
+		for pinName, value in zip(pinNames, values):
+			xh.datalogging.logPinValue(serial, t, pinName, value)
 
 
 	def __logInputVolts(self, frame):
@@ -68,7 +81,7 @@ class DataLogger(xh.Plugin):
 		xh.datalogging.logPinValue(serial, t, PIN.VCC, v)
 
 
-	def __poll(self):
+	def __createPoller(self):
 		"""
 		At a set interval, poll for data values which are not
 		automatically sent.
@@ -77,10 +90,8 @@ class DataLogger(xh.Plugin):
 		xh.protocol.data.VCC_BUG_URL) by actively polling supply
 		voltage level.
 		"""
-		thread = threading.Timer(self._POLL_INTERVAL_SEC, self.__poll)
-		thread.daemon = True
-		thread.start()
-		for serial in self.__presence.getRemoteSerials():
-			xh.protocol.InputVolts(dest=serial).send()
-
-
+		return xh.polling.FleetPoller(
+			lambda serial: xh.protocol.InputVolts(dest=serial),
+			self.__presence.getRemoteSerials,
+			self._POLL_INTERVAL_SEC,
+			priority=xh.transmit.PRIORITY.BULK)
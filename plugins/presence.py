@@ -49,10 +49,14 @@ class Presence(xh.Plugin):
 	def activate(self):
 		xh.Plugin.activate(self)
 
-		highBits = xh.synchronous.sendAndWait(
-			Command(Command.NAME.SH)).getParameter()
-		lowBits = xh.synchronous.sendAndWait(
-			Command(Command.NAME.SL)).getParameter()
+		responses = xh.synchronous.sendBatch([
+			Command(Command.NAME.SH),
+			Command(Command.NAME.SL),
+		])
+		for response in responses:
+			if isinstance(response, Exception):
+				raise response
+		highBits, lowBits = [r.getParameter() for r in responses]
 		with self.__lock:
 			self.__localSerial = xh.encoding.buildSerial(
 				highBits, lowBits)
@@ -45,21 +45,47 @@ def getFrameLoggerPlugin():
 	return p and p.plugin_object
 
 
-INTERACT_BANNER = ('The xbee object is available as "xb". A received frame list'
+INTERACT_BANNER = ('The xbee object is available as "xb", and the local XBees'
+	+ ' (xh.radios.RadioRouter) as "router". A received frame list'
 	+ ' is available from the Frame Logger plugin, available as "fl".'
 	+ ' Type control-D to exit.')
 
 
+def getSerialDevices(args):
+	"""
+	@return the list of serial devices (or fakes, replays or simulations)
+		to use
+	"""
+	if args.fakeSerial:
+		return [xh.setuputil.FAKE_SERIAL]
+	if args.simulatedNodes is not None:
+		return [xh.simulator.SimulatedMesh(args.simulatedNodes,
+			escaped=args.escaped,
+			sampleRateMillis=args.simulatedSampleRate)]
+	if args.replayPath:
+		return xh.capture.openReplayDevices(args.replayPath,
+			speed=args.replaySpeed or None, escaped=args.escaped)
+	return args.serialDevice or [None]
+
+
 def run(args):
 	log.debug('collecting plugins')
 	if not args.noPlugins:
 		xh.setuputil.collectPlugins()
 	fl = getFrameLoggerPlugin()
 	xh.setuputil.setLoggerRedisplayAfterEmit(logging.getLogger())
-	serialDevice = (xh.setuputil.FAKE_SERIAL if args.fakeSerial
-			else args.serialDevice)
-	with xh.setuputil.initializedXbee(serialDevice=serialDevice) as xb:
-		log.info('connected to locally attached XBee')
+	with xh.setuputil.initializedRadios(getSerialDevices(args),
+			nativeReader=(args.nativeReader
+				or args.capturePath is not None),
+			escaped=args.escaped,
+			numWorkers=args.numWorkers,
+			overflow=args.overflow,
+			bauds=args.bauds,
+			capturePath=args.capturePath) as router:
+		numRadios = len(router.getRadios())
+		log.info('connected to %d locally attached XBee%s', numRadios,
+			'' if numRadios == 1 else 's')
+		xb = router.getDefaultRadio().getXbee()
 		xh.protocol.Command.setXbeeSingleton(xb)
 		with (xh.util.noopContext() if args.noPlugins
 				else xh.setuputil.activatedPlugins()):
@@ -72,11 +98,32 @@ def run(args):
 			namespace.update(locals())
 			code.interact(banner=INTERACT_BANNER, local=namespace)
 
+	xh.protocol.logUnusedKeyCounts()
 	log.info('exiting')
 
 
-def listNodeIds(serialDevice=None, timeout=None):
-	with xh.setuputil.initializedXbee(serialDevice=serialDevice) as xb:
+def listNodeIds(serialDevice=None, timeout=None, nativeReader=False,
+		escaped=False):
+	return [n for n in iterNodeIds(serialDevice=serialDevice,
+		timeout=timeout, nativeReader=nativeReader, escaped=escaped)]
+
+
+def iterNodeIds(serialDevice=None, timeout=None, nativeReader=False,
+		escaped=False, count=None, quietTime=None,
+		numWorkers=xh.pipeline.NUM_WORKERS,
+		overflow=xh.pipeline.OVERFLOW.BLOCK, bauds=None):
+	"""
+	Discover nodes, generating each one's NodeId as it responds.
+	@param count if given, stop after this many nodes respond
+	@param quietTime if given, stop when this long (in seconds) passes
+		without another node responding (otherwise, wait the whole
+		timeout, since nodes respond after a random delay of up to
+		NT, and sleeping ones up to NT + SP)
+	"""
+	with xh.setuputil.initializedXbee(serialDevice=serialDevice,
+			nativeReader=nativeReader, escaped=escaped,
+			numWorkers=numWorkers, overflow=overflow,
+			bauds=bauds) as xb:
 		xh.protocol.Command.setXbeeSingleton(xb)
 
 		if timeout is None:
@@ -87,7 +134,7 @@ def listNodeIds(serialDevice=None, timeout=None):
 					xh.protocol.SleepPeriod())
 			except xh.synchronous.TimeoutError, e:
 				log.error(str(e))
-				return []
+				return
 			timeoutMillis = nTimeoutResponse.getTimeoutMillis()
 			sleepMillis = sleepResponse.getPeriodMillis()
 			if (sleepMillis != xh.protocol.SleepPeriod.
@@ -97,10 +144,10 @@ def listNodeIds(serialDevice=None, timeout=None):
 						+ ' devices', sleepMillis)
 			timeout = timeoutMillis / 1000.0
 
-		nodeInfoResponses = xh.synchronous.sendAndAccumulate(
-			xh.protocol.NodeDiscover(),
-			timeout)
-		return [r.getNodeId() for r in nodeInfoResponses]
+		for r in xh.synchronous.sendAndIterate(
+				xh.protocol.NodeDiscover(), timeout,
+				count=count, quietSeconds=quietTime):
+			yield r.getNodeId()
 
 
 def list(args):
@@ -117,17 +164,20 @@ def list(args):
 		pluginInfoStr += '\n\t' + ' '.join(infos)
 	log.info(pluginInfoStr)
 
-	serialDevice = (xh.setuputil.FAKE_SERIAL if args.fakeSerial
-			else args.serialDevice)
-	nodeInfoList = listNodeIds(
-		serialDevice=serialDevice,
-		timeout=args.timeout)
-
-	nodeInfoStr = 'XBees:'
-	for n in nodeInfoList:
-		lineStr = str(n)
-		nodeInfoStr += '\n\t' + lineStr
-	log.info(nodeInfoStr)
+	numNodes = 0
+	for n in iterNodeIds(
+			serialDevice=getSerialDevices(args),
+			timeout=args.timeout,
+			nativeReader=args.nativeReader,
+			escaped=args.escaped,
+			count=args.count,
+			quietTime=args.quietTime,
+			numWorkers=args.numWorkers,
+			overflow=args.overflow,
+			bauds=args.bauds):
+		log.info('XBee: %s', n)
+		numNodes += 1
+	log.info('%d XBee%s found.', numNodes, '' if numNodes == 1 else 's')
 
 
 LOG_LEVELS = [
@@ -150,6 +200,8 @@ def setVerbosity(verbose, quiet):
 		parser.error('%d V%s is all the more verbose one can be.'
 			% (maxVs, '' if maxVs == 1 else 's'))
 	logging.getLogger().setLevel(LOG_LEVELS[verbosity])
+	if LOG_LEVELS[verbosity] <= logging.DEBUG:
+		xh.protocol.setKeyAuditing(xh.protocol.KEY_AUDIT.ALL)
 
 
 def addCommonArguments(*subparsers):
@@ -168,16 +220,71 @@ def addCommonArguments(*subparsers):
 		verbosityGroup.add_argument('--quiet', '-q', action='count')
 		serialGroup = commonGroup.add_mutually_exclusive_group()
 		serialGroup.add_argument('--serial-device', dest='serialDevice',
-			help='Device to use for local XBee communication.')
+			action='append',
+			help='Device to use for local XBee communication.'
+			+ ' Repeat to use several XBees at once; commands'
+			+ ' to a node are sent by the XBee which last'
+			+ ' heard from it, else the first.')
 		serialGroup.add_argument('--fake-serial', dest='fakeSerial',
 			action='store_true',
 			help='Use a fake XBee object and do not look for or'
 			+ ' open a serial device.')
+		serialGroup.add_argument('--replay', dest='replayPath',
+			metavar='CAPTURE_FILE',
+			help='Receive the frames of a capture file (see'
+			+ ' run --capture) instead of from a serial'
+			+ ' device, one fake XBee per radio captured.')
+		serialGroup.add_argument('--simulate', type=int,
+			dest='simulatedNodes', metavar='NUM_NODES',
+			help='Talk to a simulated mesh of this many XBee'
+			+ ' nodes (some of them sleeping end devices)'
+			+ ' instead of a serial device, to generate'
+			+ ' load.')
+		commonGroup.add_argument('--replay-speed', type=float,
+			dest='replaySpeed', default=1.0,
+			help='How many times faster than captured to replay'
+			+ ' frames, or 0 for as fast as they can be'
+			+ ' handled. Default %(default)g.')
+		commonGroup.add_argument('--simulate-sample-rate', type=int,
+			dest='simulatedSampleRate', metavar='MILLIS',
+			default=xh.simulator.DEFAULT_SAMPLE_RATE_MILLIS,
+			help='How often each simulated node sends IO samples,'
+			+ ' or 0 for never. Default %(default)d.')
+		commonGroup.add_argument('--native-reader', dest='nativeReader',
+			action='store_true',
+			help='Parse received API frames directly, instead of'
+			+ ' through the xbee library\'s API dicts.')
+		commonGroup.add_argument('--escaped', action='store_true',
+			help='The local XBee is in escaped API mode (AP=2).')
+		commonGroup.add_argument('--baud', type=int, action='append',
+			dest='bauds',
+			choices=xh.protocol.BaudRate.STANDARD_BAUDS,
+			help=('Serial rate to try moving the local XBee to'
+			+ ' from %d; repeat to give several, of which the'
+			+ ' highest working one is used (and the XBee is'
+			+ ' moved back on exit).') % xh.Config.SERIAL_BAUD)
+		commonGroup.add_argument('--lazy-frames', dest='lazyFrames',
+			action='store_true',
+			help='Decode the fields of received sample and node'
+			+ ' ID frames only when they are used.')
+		commonGroup.add_argument('--workers', type=int,
+			dest='numWorkers', default=xh.pipeline.NUM_WORKERS,
+			help='Threads to parse received frames and run their'
+			+ ' handlers on (0 to use the serial reading thread).'
+			+ ' Default %(default)d.')
+		commonGroup.add_argument('--overflow',
+			choices=[str(p) for p in xh.pipeline.OVERFLOW],
+			default=str(xh.pipeline.OVERFLOW.BLOCK),
+			help='What to do with received frames when the'
+			+ ' workers fall behind. Default %(default)s.')
 
 
 def main():
 	args = parser.parse_args()
 	setVerbosity(args.verbose, args.quiet)
+	args.overflow = xh.enumutil.fromString(xh.pipeline.OVERFLOW,
+		args.overflow)
+	xh.protocol.setLazyDecoding(args.lazyFrames)
 	xh.setuputil.setDependenciesLoggingLevel(logging.WARNING)
 	with xh.Config():
 		log.debug('opened config')
@@ -190,6 +297,9 @@ runParser = subparsers.add_parser('run')
 runParser.set_defaults(func=run)
 runParser.add_argument('--no-plugins', action='store_true', dest='noPlugins',
 	help='Do not load or activate any plugins.')
+runParser.add_argument('--capture', dest='capturePath', metavar='CAPTURE_FILE',
+	help='Record the received API frames in a capture file, to replay later'
+		' with --replay. Implies --native-reader.')
 
 listParser = subparsers.add_parser('list')
 listParser.set_defaults(func=list)
@@ -197,6 +307,11 @@ listParser.add_argument('--timeout', '-t', type=float,
 	help='Timeout (in seconds, fractional ok) to wait for XBee responses. '
 		'Useful if sleeping nodes will not respond within the default '
 		'ND timeout, NT.')
+listParser.add_argument('--count', '-n', type=int,
+	help='Stop once this many XBees have responded.')
+listParser.add_argument('--quiet-time', type=float, dest='quietTime',
+	help='Stop once this long (in seconds) passes without another XBee '
+		'responding, rather than waiting the whole timeout.')
 
 netParser = network.addSubparser(subparsers)
 
@@ -12,10 +12,19 @@ import enumutil
 import signals
 import encoding
 import util
+import rtt
+import correlator
 from plugin import Plugin
 
 import protocol
 
+import pipeline
+import reader
+import capture
+import simulator
+import transmit
+import radios
 import setuputil
 import synchronous
+import polling
 import datalogging
@@ -0,0 +1,227 @@
+"""
+Use the locally attached XBee from event-loop (asyncio) code, so many
+conversations with nodes can run concurrently without a thread each.
+
+Python 2 has no asyncio, so this uses its backport, Trollius (an optional
+dependency). Coroutines use yield From(...) in place of await:
+
+	radio = xh.aio.Radio()
+
+	@trollius.coroutine
+	def poll(serial):
+		response = yield From(radio.send(InputSample(dest=serial)))
+		...
+
+	@trollius.coroutine
+	def watch():
+		with radio.frames(frameClass=Data) as stream:
+			while True:
+				data = yield From(stream.get())
+				...
+
+Frames are received in the reader thread (via signals.FRAME_RECEIVED),
+and handed to the event loop with one call per frame.
+"""
+
+import logging
+
+from . import correlator, rtt, signals
+from .deps import trollius
+
+if trollius is None:
+	raise ImportError('xh.aio requires trollius '
+		+ '(https://pypi.python.org/pypi/trollius).')
+from trollius import From, Return
+
+
+__all__ = [
+	'Radio',
+	'send',
+	'wrapFuture',
+]
+
+
+log = logging.getLogger('xh.aio')
+
+
+
+def wrapFuture(future, loop=None):
+	"""
+	@param future a correlator.Future, done in any thread
+	@param loop the event loop to use (default: the current loop)
+	@return a trollius.Future, done in the event loop's thread when the
+		given future is done. Cancelling it cancels the given future.
+	"""
+	loop = loop or trollius.get_event_loop()
+	aioFuture = trollius.Future(loop=loop)
+
+	def transfer():
+		if aioFuture.done():
+			return
+		if future.isCancelled():
+			aioFuture.cancel()
+			return
+		try:
+			aioFuture.set_result(future.getResult())
+		except Exception as e:
+			aioFuture.set_exception(e)
+
+	def cancelIfCancelled(f):
+		if f.cancelled():
+			future.cancel()
+
+	aioFuture.add_done_callback(cancelIfCancelled)
+	future.addDoneCallback(lambda f: loop.call_soon_threadsafe(transfer))
+	return aioFuture
+
+
+def send(command, xb=None, timeoutSeconds=None, loop=None):
+	"""
+	Send a Command; the asynchronous counterpart to
+	synchronous.sendAndWait.
+	@param timeoutSeconds how long to wait for the response (default:
+		from the round-trip times measured to the destination, see
+		xh.rtt)
+	@return a trollius.Future for the Frame received in response (or
+		correlator.TimeoutError)
+	"""
+	if timeoutSeconds is None:
+		timeoutSeconds = rtt.getTimeoutSeconds(
+			command.getRemoteSerial())
+	return wrapFuture(
+		command.sendAsync(xb=xb, timeoutSeconds=timeoutSeconds),
+		loop=loop)
+
+
+
+class FrameStream:
+	"""
+	Received Frames (of a given class), queued in the event loop. Get them
+	with yield From(stream.get()); close the stream (or use it as a
+	context manager) to stop receiving.
+	"""
+
+
+	def __init__(self, radio, frameClass, maxSize, loop):
+		self.__radio = radio
+		self.__frameClass = frameClass
+		self.__queue = trollius.Queue(maxsize=maxSize, loop=loop)
+		self.__numDropped = 0
+
+
+	def get(self):
+		"""
+		@return a coroutine for the next Frame
+		"""
+		return self.__queue.get()
+
+
+	def getNumDropped(self):
+		"""
+		@return how many Frames were dropped because the stream was full
+		"""
+		return self.__numDropped
+
+
+	def close(self):
+		self.__radio._removeStream(self)
+
+
+	def __enter__(self):
+		return self
+
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+
+	def _put(self, frame):
+		if (self.__frameClass is not None
+			and not isinstance(frame, self.__frameClass)):
+			return
+		try:
+			self.__queue.put_nowait(frame)
+		except trollius.QueueFull:
+			self.__numDropped += 1
+
+
+
+class Radio:
+	"""
+	The local XBee, as seen from one event loop.
+	"""
+
+
+	def __init__(self, xb=None, loop=None):
+		"""
+		@param xb the Xbee API object to send with (default: the Command
+			Xbee singleton)
+		@param loop the event loop to deliver Frames and responses in
+			(default: the current loop)
+		"""
+		self.__xb = xb
+		self.__loop = loop or trollius.get_event_loop()
+		self.__streams = ()
+		signals.FRAME_RECEIVED.connect(self.__receive, weak=False)
+
+
+	def close(self):
+		"""
+		Stop receiving Frames.
+		"""
+		signals.FRAME_RECEIVED.disconnect(self.__receive)
+
+
+	def send(self, command, timeoutSeconds=None):
+		"""
+		@return a trollius.Future for the Frame received in response
+		"""
+		return send(command, xb=self.__xb,
+			timeoutSeconds=timeoutSeconds, loop=self.__loop)
+
+
+	@trollius.coroutine
+	def accumulate(self, command, timeoutSeconds):
+		"""
+		Send a Command and accumulate its responses; the asynchronous
+		counterpart to synchronous.sendAndAccumulate.
+		@return a list of Frames received in response
+		"""
+		responses = []
+		def appendInLoop(frame):
+			self.__loop.call_soon_threadsafe(
+				responses.append, frame)
+		with correlator.listening(command.getFrameId(),
+			command.getRemoteSerial(), appendInLoop):
+			command.send(xb=self.__xb)
+			yield From(trollius.sleep(timeoutSeconds,
+				loop=self.__loop))
+		raise Return(list(responses))
+
+
+	def frames(self, frameClass=None, maxSize=0):
+		"""
+		@param frameClass if given, only receive Frames of this class
+			(such as protocol.Data)
+		@param maxSize if positive, drop Frames received when this many
+			are already queued
+		@return a new FrameStream of the Frames received from now on
+		"""
+		stream = FrameStream(self, frameClass, maxSize, self.__loop)
+		self.__streams += (stream,)
+		return stream
+
+
+	def _removeStream(self, stream):
+		self.__streams = tuple(
+			s for s in self.__streams if s is not stream)
+
+
+	def __receive(self, sender=None, signal=None, frame=None):
+		if self.__streams:
+			self.__loop.call_soon_threadsafe(self.__dispatch, frame)
+
+
+	def __dispatch(self, frame):
+		for stream in self.__streams:
+			stream._put(frame)
@@ -0,0 +1,369 @@
+"""
+Record the API frames received by the local XBees into a compact binary
+capture file, and replay a capture as if from a serial device, so that real
+traffic can be fed through the usual parsing and dispatch (and plugins)
+without any XBees, at the speed it was captured, N times that, or as fast as
+it can be read.
+
+Record with initializedRadios(capturePath=...) (xh run --capture FILE), and
+replay by opening a ReplayDevice as the serial device (xh run --replay FILE).
+
+The file starts with a header (the magic string, the format version, and
+the capture's start time in seconds since the epoch), followed by a record
+for each frame: the microseconds since the previous record, the index of the
+radio which received it, the length of the frame data, and the frame data
+(unescaped, from the API id through the last byte before the checksum). A
+radio's name is recorded (with the index RADIO_NAME) before its first frame.
+"""
+
+import logging
+import struct
+import threading
+import time
+
+from . import protocol
+
+
+__all__ = [
+	'CaptureReader',
+	'CaptureWriter',
+	'ReplayDevice',
+	'openReplayDevices',
+]
+
+
+log = logging.getLogger('xh.capture')
+
+MAGIC = 'XHCAP'
+VERSION = 1
+
+# the radio index of a record naming the next radio
+RADIO_NAME = 0xFF
+
+# the most bytes for a ReplayDevice to have waiting at once
+REPLAY_BUFFER_BYTES = 0x10000
+
+_HEADER = struct.Struct('>5sBd')
+_RECORD = struct.Struct('>IBH')
+_MAX_DELTA_MICROS = 0xFFFFFFFF
+
+
+
+class CaptureWriter:
+	"""
+	Writes received frames to a capture file. It is thread-safe, so all
+	the radios' readers may write to one CaptureWriter.
+	"""
+
+
+	def __init__(self, path):
+		self.__path = path
+		self.__file = open(path, 'wb')
+		self.__lock = threading.Lock()
+		self.__startTime = time.time()
+		self.__lastMicros = 0
+		self.__radioIndices = {}
+		self.__numFrames = 0
+		self.__file.write(_HEADER.pack(MAGIC, VERSION,
+			self.__startTime))
+
+
+	def getPath(self):
+		return self.__path
+
+
+	def getNumFrames(self):
+		return self.__numFrames
+
+
+	def write(self, radioName, frameData):
+		"""
+		Record a frame as received now.
+		@param radioName the name of the radio which received it
+		@param frameData the API frame data
+		"""
+		with self.__lock:
+			# Clamp to keep the time from going backwards if the
+			# clock is set back.
+			micros = max(self.__lastMicros,
+				int((time.time() - self.__startTime) * 1e6))
+			index = self.__radioIndices.get(radioName)
+			if index is None:
+				index = self.__addRadio(radioName, micros)
+			self.__writeRecord(micros, index, frameData)
+			self.__numFrames += 1
+
+
+	def __addRadio(self, radioName, micros):
+		"""
+		(The lock must be held.)
+		"""
+		index = len(self.__radioIndices)
+		if index >= RADIO_NAME:
+			raise ValueError('Too many radios to capture.')
+		self.__writeRecord(micros, RADIO_NAME, str(radioName))
+		self.__radioIndices[radioName] = index
+		return index
+
+
+	def __writeRecord(self, micros, index, data):
+		"""
+		(The lock must be held.)
+		"""
+		delta = min(micros - self.__lastMicros, _MAX_DELTA_MICROS)
+		self.__lastMicros += delta
+		self.__file.write(_RECORD.pack(delta, index, len(data)) + data)
+
+
+	def close(self):
+		with self.__lock:
+			self.__file.close()
+
+
+	def __enter__(self):
+		return self
+
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+
+
+class CaptureReader:
+	"""
+	Iterating over a CaptureReader generates (seconds since the start of
+	the capture, radio name, frame data) for each frame in a capture file.
+	"""
+
+
+	def __init__(self, path):
+		self.__path = path
+		with open(path, 'rb') as f:
+			self.__startTime = self.__readHeader(f)
+
+
+	def getPath(self):
+		return self.__path
+
+
+	def getStartTime(self):
+		"""
+		@return when the capture started, in seconds since the epoch
+		"""
+		return self.__startTime
+
+
+	def getRadioNames(self):
+		"""
+		@return the names of the radios captured, in the order first
+			heard
+		"""
+		names = []
+		for seconds, name, frameData in self:
+			if name not in names:
+				names.append(name)
+		return names
+
+
+	def __readHeader(self, f):
+		header = f.read(_HEADER.size)
+		magic = None
+		if len(header) == _HEADER.size:
+			magic, version, startTime = _HEADER.unpack(header)
+		if magic != MAGIC:
+			raise ValueError('%s is not a capture file.'
+				% self.__path)
+		if version != VERSION:
+			raise ValueError(('%s has capture format version %d,'
+				+ ' not %d.') % (self.__path, version, VERSION))
+		return startTime
+
+
+	def __iter__(self):
+		with open(self.__path, 'rb') as f:
+			self.__readHeader(f)
+			micros = 0
+			names = []
+			while True:
+				header = f.read(_RECORD.size)
+				if not header:
+					return
+				data = None
+				if len(header) == _RECORD.size:
+					delta, index, length = (
+						_RECORD.unpack(header))
+					data = f.read(length)
+				if data is None or len(data) < length:
+					# as when the capture was not
+					# closed
+					log.warning(('%s ends in a partial'
+						+ ' record') % self.__path)
+					return
+				micros += delta
+				if index == RADIO_NAME:
+					names.append(data)
+					continue
+				yield micros / 1e6, names[index], data
+
+
+
+class ReplayDevice:
+	"""
+	A stand-in for a serial device (like the xbee library's FakeDevice),
+	from which the frames of one radio in a capture file can be read, each
+	once the time it was captured (relative to the start) has passed.
+	Writes are discarded.
+	"""
+
+
+	def __init__(self, path, radioName=None, speed=1.0, escaped=False,
+		startTime=None):
+		"""
+		@param radioName the radio whose frames to replay (default: the
+			first in the capture)
+		@param speed how many times faster than captured to replay, or
+			None for as fast as the frames are read
+		@param escaped whether to encode the frames as in escaped API
+			mode (AP=2)
+		@param startTime when the replay starts, as from time.time
+			(default: when first read), to keep several
+			ReplayDevices of one capture in step
+		"""
+		reader = CaptureReader(path)
+		if radioName is None:
+			names = reader.getRadioNames()
+			radioName = names[0] if names else None
+		if speed is not None and speed <= 0:
+			raise ValueError('Replay speed %r is not positive.'
+				% speed)
+		self.__path = path
+		self.__radioName = radioName
+		self.__speed = speed
+		self.__escaped = escaped
+		self.__startTime = startTime
+		self.__frames = ((seconds, frameData)
+			for seconds, name, frameData in reader
+			if name == radioName)
+		self.__next = None
+		self.__pending = bytearray()
+		self.__numFrames = 0
+		self.__numBytesWritten = 0
+		self.__isDone = False
+		self.__doneTime = None
+		self.__isOpen = True
+
+
+	def getName(self):
+		"""
+		@return the name of the radio replayed
+		"""
+		return self.__radioName
+
+
+	def getNumFrames(self):
+		"""
+		@return how many frames have been made available to read
+		"""
+		return self.__numFrames
+
+
+	def isDone(self):
+		"""
+		@return whether all the frames have been read
+		"""
+		return self.__isDone and not self.__pending
+
+
+	def getElapsedSeconds(self):
+		"""
+		@return the time from the start of the replay to its last frame
+			being made available (or to now, if not yet done)
+		"""
+		if self.__startTime is None:
+			return 0.0
+		return (self.__doneTime or time.time()) - self.__startTime
+
+
+	def inWaiting(self):
+		self.__fill()
+		return len(self.__pending)
+
+
+	def read(self, size=1):
+		self.__fill()
+		data = str(self.__pending[:size])
+		del self.__pending[:size]
+		return data
+
+
+	def write(self, data):
+		self.__numBytesWritten += len(data)
+
+
+	def flush(self):
+		pass
+
+
+	def flushInput(self):
+		del self.__pending[:]
+
+
+	def close(self):
+		self.__isOpen = False
+
+
+	def isOpen(self):
+		return self.__isOpen
+
+
+	def __str__(self):
+		return 'ReplayDevice %s of %s' % (self.__radioName, self.__path)
+
+
+	def __fill(self):
+		"""
+		Encode the frames which are due (up to REPLAY_BUFFER_BYTES)
+		into the bytes waiting to be read.
+		"""
+		now = time.time()
+		if self.__startTime is None:
+			self.__startTime = now
+		elapsed = now - self.__startTime
+		while len(self.__pending) < REPLAY_BUFFER_BYTES:
+			if self.__next is None:
+				self.__next = next(self.__frames, None)
+				if self.__next is None:
+					self.__finish(now)
+					return
+			seconds, frameData = self.__next
+			if (self.__speed is not None
+				and seconds / self.__speed > elapsed):
+				return
+			self.__pending += protocol.encodeFrame(frameData,
+				escaped=self.__escaped)
+			self.__next = None
+			self.__numFrames += 1
+
+
+	def __finish(self, now):
+		if self.__isDone:
+			return
+		self.__isDone = True
+		self.__doneTime = now
+		elapsed = self.getElapsedSeconds()
+		log.info('replayed %d frames of %s in %.3fs%s' % (
+			self.__numFrames, self.__radioName, elapsed,
+			' (%.0f frames/s)' % (self.__numFrames / elapsed)
+				if elapsed > 0 else ''))
+
+
+
+def openReplayDevices(path, speed=1.0, escaped=False):
+	"""
+	@return a ReplayDevice for each radio in the capture file, in step
+		with each other (see ReplayDevice)
+	"""
+	startTime = time.time()
+	return [ReplayDevice(path, radioName=name, speed=speed,
+		escaped=escaped, startTime=startTime)
+		for name in CaptureReader(path).getRadioNames()]
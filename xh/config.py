@@ -16,6 +16,9 @@ class Config:
 	ConfigParser.
 	"""
 	SERIAL_BAUD = 9600
+	# rates to try moving the local XBee to, from SERIAL_BAUD, at startup
+	# (see xh.setuputil.negotiateBaud); the highest working one is kept
+	NEGOTIATED_SERIAL_BAUDS = ()
 	PLUGIN_DIR = os.path.normpath(os.path.abspath(os.path.join(
 			os.path.dirname(__file__), '..', 'plugins')))
 	DATA_DIR = os.path.normpath(os.path.abspath(os.path.join(
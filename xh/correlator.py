@@ -0,0 +1,409 @@
+"""
+Match received Command responses to the Commands sent, and deliver each
+response to a Future (or listener) registered for it.
+
+Pending responses are kept in a table keyed by (frame id, remote serial), so
+each received frame is matched with one lookup, from the FRAME_RECEIVED
+dispatch, and whoever waits on the Future wakes immediately. The round-trip
+time of each matched response is recorded, and each expired one backs off
+its destination's timeout (see xh.rtt). Both are timed from when the Command
+is written to the serial port, not from when it is queued to be sent.
+"""
+
+import contextlib
+import heapq
+import logging
+import multiprocessing
+import threading
+import time
+
+from . import rtt, signals
+
+
+__all__ = [
+	'CancelledError',
+	'Future',
+	'TimeoutError',
+	'expect',
+	'listening',
+	'markSent',
+]
+
+
+log = logging.getLogger('xh.correlator')
+
+TimeoutError = multiprocessing.TimeoutError
+
+
+
+class CancelledError(Exception):
+	pass
+
+
+
+class Future:
+	"""
+	The eventual result (or exception) of an operation, such as the response
+	to a Command. Thread-safe.
+	"""
+
+
+	def __init__(self):
+		self.__condition = threading.Condition()
+		self.__done = False
+		self.__cancelled = False
+		self.__result = None
+		self.__exception = None
+		self.__callbacks = []
+
+
+	def isDone(self):
+		return self.__done
+
+
+	def isCancelled(self):
+		return self.__cancelled
+
+
+	def getResult(self, timeoutSeconds=None):
+		"""
+		Wait for and return the result.
+		@param timeoutSeconds how long to wait, or None to wait
+			indefinitely
+		@raise TimeoutError if the Future is not done in time
+		@raise CancelledError if the Future was cancelled
+		@raise the Future's exception, if it was set
+		"""
+		with self.__condition:
+			if not self.__done:
+				self.__wait(timeoutSeconds)
+			if not self.__done:
+				raise TimeoutError(
+					'Future not done after %.3fs.'
+					% timeoutSeconds)
+		if self.__cancelled:
+			raise CancelledError()
+		if self.__exception is not None:
+			raise self.__exception
+		return self.__result
+
+
+	def __wait(self, timeoutSeconds):
+		if timeoutSeconds is None:
+			while not self.__done:
+				self.__condition.wait()
+			return
+		deadline = time.time() + timeoutSeconds
+		remaining = timeoutSeconds
+		while not self.__done and remaining > 0:
+			self.__condition.wait(remaining)
+			remaining = deadline - time.time()
+
+
+	def getException(self, timeoutSeconds=None):
+		"""
+		Wait for the Future, as for getResult.
+		@return the exception set (or None)
+		"""
+		try:
+			self.getResult(timeoutSeconds)
+		except (TimeoutError, CancelledError):
+			raise
+		except Exception as e:
+			return e
+		return None
+
+
+	def setResult(self, result):
+		"""
+		@return whether the result was set (False if already done)
+		"""
+		return self.__finish(result=result)
+
+
+	def setException(self, exception):
+		"""
+		@return whether the exception was set (False if already done)
+		"""
+		return self.__finish(exception=exception)
+
+
+	def cancel(self):
+		"""
+		@return whether the Future was cancelled (False if already done)
+		"""
+		return self.__finish(cancelled=True)
+
+
+	def addDoneCallback(self, callback):
+		"""
+		Call callback(future) when this Future is done (or now, if it is
+		already done). Callbacks are called in the thread which
+		finishes the Future.
+		"""
+		with self.__condition:
+			if not self.__done:
+				self.__callbacks.append(callback)
+				return
+		self.__call(callback)
+
+
+	def __finish(self, result=None, exception=None, cancelled=False):
+		with self.__condition:
+			if self.__done:
+				return False
+			self.__result = result
+			self.__exception = exception
+			self.__cancelled = cancelled
+			self.__done = True
+			self.__condition.notify_all()
+			callbacks = self.__callbacks
+			self.__callbacks = None
+		for callback in callbacks:
+			self.__call(callback)
+		return True
+
+
+	def __call(self, callback):
+		try:
+			callback(self)
+		except:
+			log.error('error in Future callback %s' % callback,
+				exc_info=True)
+
+
+
+class Correlator:
+	"""
+	The table of pending responses. Futures registered with a timeout are
+	failed with TimeoutError once it passes, by a single expiry thread
+	(so waiters can block without a timeout, and wake as soon as their
+	response is dispatched; in Python 2 a wait with a timeout polls).
+	"""
+
+
+	def __init__(self):
+		self.__lock = threading.Lock()
+		self.__deadlineAdded = threading.Condition(self.__lock)
+		self.__futures = {}
+		self.__sentTimes = {}
+		self.__timeouts = {}
+		self.__numPendingByFrameId = {}
+		self.__listeners = {}
+		self.__deadlines = []
+		self.__expiryThread = None
+
+
+	def expect(self, frameId, remoteSerial=None, timeoutSeconds=None,
+			sent=True):
+		"""
+		@param frameId the frame id of a Command about to be sent
+		@param remoteSerial the Command's destination, or None if local
+		@param timeoutSeconds if given, after how long (from when the
+			Command is sent) to fail the Future with TimeoutError
+		@param sent whether the Command counts as sent now; if not,
+			markSent must be called once it is written
+		@return a Future for the (first) response. If it is cancelled,
+			it stops waiting.
+		"""
+		key = (frameId, remoteSerial)
+		future = Future()
+		with self.__lock:
+			previous = self.__futures.get(key)
+			if previous is None:
+				numPending = self.__numPendingByFrameId
+				numPending[frameId] = (
+					numPending.get(frameId, 0) + 1)
+			self.__futures[key] = future
+			self.__sentTimes[key] = None
+			self.__timeouts[key] = timeoutSeconds
+			if sent:
+				self.__markSent(key, future)
+		if previous is not None:
+			previous.setException(RuntimeError(('Superseded by a '
+				+ 'new Command with frame id %d to %s.') % key))
+		future.addDoneCallback(lambda f: self.__forget(key, f))
+		return future
+
+
+	def markSent(self, frameId, remoteSerial, future):
+		"""
+		Start timing the response awaited by future (from expect with
+		sent=False), now that its Command has been written.
+		"""
+		key = (frameId, remoteSerial)
+		with self.__lock:
+			if self.__futures.get(key) is future:
+				self.__markSent(key, future)
+
+
+	def __markSent(self, key, future):
+		"""
+		(The lock must be held.)
+		"""
+		now = time.time()
+		self.__sentTimes[key] = now
+		timeoutSeconds = self.__timeouts[key]
+		if timeoutSeconds is not None:
+			self.__addDeadline(now + timeoutSeconds, key, future)
+
+
+	def addListener(self, frameId, remoteSerial, callback):
+		"""
+		Call callback(frame) with every response matching the given
+		frame id and remote serial, until removeListener is called.
+		"""
+		with self.__lock:
+			self.__listeners[(frameId, remoteSerial)] = callback
+
+
+	def removeListener(self, frameId, remoteSerial):
+		with self.__lock:
+			self.__listeners.pop((frameId, remoteSerial), None)
+
+
+	def getNumPending(self):
+		return len(self.__futures)
+
+
+	def isFrameIdPending(self, frameId):
+		"""
+		@return whether a response is expected with the given frame id
+			(from any destination)
+		"""
+		return frameId in self.__numPendingByFrameId
+
+
+	def dispatch(self, frame):
+		"""
+		Deliver a received frame to whatever is waiting for it (if it
+		is a Command response).
+		"""
+		if not hasattr(type(frame), 'getFrameId'):
+			return
+		key = (frame.getFrameId(), frame.getRemoteSerial())
+		with self.__lock:
+			sentTime = self.__sentTimes.get(key)
+			future = self.__pop(key)
+			listener = self.__listeners.get(key)
+		if future is not None:
+			# (unless it is answered before being marked sent)
+			if sentTime is not None:
+				rtt.recordResponse(key[1],
+					time.time() - sentTime, frame)
+			future.setResult(frame)
+		if listener is not None:
+			listener(frame)
+
+
+	def __forget(self, key, future):
+		with self.__lock:
+			if self.__futures.get(key) is future:
+				self.__pop(key)
+
+
+	def __pop(self, key):
+		"""
+		Remove and return the Future for key, if any. (The lock must be
+		held.)
+		"""
+		future = self.__futures.pop(key, None)
+		if future is not None:
+			del self.__sentTimes[key]
+			del self.__timeouts[key]
+			frameId = key[0]
+			n = self.__numPendingByFrameId[frameId] - 1
+			if n:
+				self.__numPendingByFrameId[frameId] = n
+			else:
+				del self.__numPendingByFrameId[frameId]
+		return future
+
+
+	def __addDeadline(self, deadline, key, future):
+		"""
+		(The lock must be held.)
+		"""
+		heapq.heappush(self.__deadlines, (deadline, key, future))
+		if self.__deadlines[0][2] is future:
+			self.__deadlineAdded.notify()
+		if self.__expiryThread is None:
+			self.__expiryThread = threading.Thread(
+				target=self.__expireForever,
+				name='CorrelatorExpiry')
+			self.__expiryThread.daemon = True
+			self.__expiryThread.start()
+
+
+	def __expireForever(self):
+		# Bind module globals locally: as a daemon thread this may
+		# still run while the interpreter shuts down and clears them.
+		clock, heappop = time.time, heapq.heappop
+		timeoutError = TimeoutError
+		recordTimeout = rtt.recordTimeout
+		deadlines = self.__deadlines
+		while True:
+			expired = []
+			with self.__lock:
+				while not deadlines:
+					self.__deadlineAdded.wait()
+				delay = deadlines[0][0] - clock()
+				if delay > 0:
+					self.__deadlineAdded.wait(delay)
+				now = clock()
+				while deadlines and deadlines[0][0] <= now:
+					deadline, key, future = heappop(
+						deadlines)
+					if self.__futures.get(key) is future:
+						self.__pop(key)
+						expired.append((key, future))
+			for key, future in expired:
+				recordTimeout(key[1])
+				future.setException(timeoutError(
+					('No response to frame id %d to %s'
+					+ ' in time.') % key))
+
+
+
+_correlator = Correlator()
+
+
+def expect(frameId, remoteSerial=None, timeoutSeconds=None, sent=True):
+	"""
+	@return a Future for the response to a Command with the given frame id
+		and destination (see Correlator.expect)
+	"""
+	return _correlator.expect(frameId, remoteSerial=remoteSerial,
+		timeoutSeconds=timeoutSeconds, sent=sent)
+
+
+def markSent(frameId, remoteSerial, future):
+	_correlator.markSent(frameId, remoteSerial, future)
+
+
+@contextlib.contextmanager
+def listening(frameId, remoteSerial, callback):
+	"""
+	Within the context, call callback(frame) with every response to a
+	Command with the given frame id and destination.
+	"""
+	_correlator.addListener(frameId, remoteSerial, callback)
+	try:
+		yield
+	finally:
+		_correlator.removeListener(frameId, remoteSerial)
+
+
+def getNumPending():
+	return _correlator.getNumPending()
+
+
+def isFrameIdPending(frameId):
+	return _correlator.isFrameIdPending(frameId)
+
+
+def _dispatchReceivedFrame(sender=None, signal=None, frame=None):
+	_correlator.dispatch(frame)
+
+
+signals.FRAME_RECEIVED.connect(_dispatchReceivedFrame)
@@ -6,6 +6,7 @@ import logging
 import logging.handlers
 import os
 import re
+import threading
 
 from .protocol import PIN
 from . import Config, signals
@@ -90,12 +91,15 @@ def parseLogFile(logFile):
 
 global _dataLoggerSingleton
 _dataLoggerSingleton = None
+# samples may be logged from several FramePipeline workers at once
+_dataLoggerLock = threading.Lock()
 def _getLogger():
 	global _dataLoggerSingleton
-	if _dataLoggerSingleton is None:
-		statusLog.debug('creating data logger')
-		_dataLoggerSingleton = _DataLogger()
-	return _dataLoggerSingleton
+	with _dataLoggerLock:
+		if _dataLoggerSingleton is None:
+			statusLog.debug('creating data logger')
+			_dataLoggerSingleton = _DataLogger()
+		return _dataLoggerSingleton
 
 
 
@@ -106,6 +110,7 @@ class _DataLogger:
 
 	def __init__(self):
 		self.__loggers = {}
+		self.__lock = threading.Lock()
 		statusLog.debug('will log data to %s', _FILE_NAME_T)
 		if not os.path.isdir(Config.DATA_DIR):
 			statusLog.debug('creating %s', Config.DATA_DIR)
@@ -118,18 +123,26 @@ class _DataLogger:
 		"""
 		dataLog = self.__loggers.get(name)
 		if dataLog is None:
-			dataLog = logging.getLogger(name)
-
-			# Do not propagate to root logger which
-			# has the default handler and prints to stdout.
-			dataLog.propagate = False
-
-			handler = logging.handlers.RotatingFileHandler(
-				_FILE_NAME_T % name,
-				maxBytes=self._MAX_BYTES_PER_LOGFILE,
-				backupCount=self._MAX_FILES_PER_NAME)
-			dataLog.addHandler(handler)
-			self.__loggers[name] = dataLog
+			with self.__lock:
+				dataLog = self.__loggers.get(name)
+				if dataLog is None:
+					dataLog = self.__createLogger(name)
+					self.__loggers[name] = dataLog
+		return dataLog
+
+
+	def __createLogger(self, name):
+		dataLog = logging.getLogger(name)
+
+		# Do not propagate to root logger which
+		# has the default handler and prints to stdout.
+		dataLog.propagate = False
+
+		handler = logging.handlers.RotatingFileHandler(
+			_FILE_NAME_T % name,
+			maxBytes=self._MAX_BYTES_PER_LOGFILE,
+			backupCount=self._MAX_FILES_PER_NAME)
+		dataLog.addHandler(handler)
 		return dataLog
 
 
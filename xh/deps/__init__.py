@@ -54,6 +54,17 @@ try:
 except ImportError as e:
 	failedImports.append((SUBMODULE_MSG % name, e))
 
+# Optional dependencies are None if they cannot be imported.
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	import trollius
+except ImportError:
+	trollius = None
+
 if failedImports:
 	msg = 'Unable to import required dependencies:'
 	for description, e in failedImports:
@@ -2,11 +2,46 @@
 Conversion functions to pack/unpack values for XBee API communication.
 """
 
+import struct
+
+from .deps import numpy
+
 
 BYTE_BASE = 0x100
 MILLIVOLTS_PER_VOLT = 1e-3
 BYTES_PER_SERIAL = 8		# number of bytes in an XBee serial number
 
+# Precompiled (big-endian, unsigned) formats for the fixed widths which appear
+# in API frames: frame ids and status (1), network addresses (2), serial halves
+# (4), serials (8). Link keys (16) are unpacked as two 8-byte halves.
+_STRUCT_CODES = {
+	1: 'B',
+	2: 'H',
+	4: 'I',
+	8: 'Q',
+}
+_STRUCTS = dict([(numBytes, struct.Struct('>' + code))
+	for numBytes, code in _STRUCT_CODES.iteritems()])
+_UNPACKERS = dict([(numBytes, s.unpack)
+	for numBytes, s in _STRUCTS.iteritems()])
+_PACKERS = dict([(numBytes, s.pack)
+	for numBytes, s in _STRUCTS.iteritems()])
+_STRUCT_128 = struct.Struct('>QQ')
+_INTEGER_TYPES = (int, long)
+_BITS_64 = 64
+_MASK_64 = (1 << _BITS_64) - 1
+
+# The (sorted) indices of the bits set in each 8-bit field, and in each 8-bit
+# field shifted up by 8 bits. A 16-bit field's indices are those of its low
+# byte followed by those of its high byte.
+_BITS_PER_BYTE = 8
+_BYTE_BIT_INDICES = tuple([
+	tuple([i for i in range(_BITS_PER_BYTE) if b & (1 << i)])
+	for b in range(BYTE_BASE)])
+_HIGH_BYTE_BIT_INDICES = tuple([
+	tuple([i + _BITS_PER_BYTE for i in indices])
+	for indices in _BYTE_BIT_INDICES])
+
 
 def numberToString(n, padToBytes=1):
 	"""
@@ -15,6 +50,17 @@ def numberToString(n, padToBytes=1):
 		it is at least the given number of bytes long.
 	Example: 0x3ef7 => '\x3e\xf7'
 	"""
+	if isinstance(n, _INTEGER_TYPES) and n >= 0:
+		if n < BYTE_BASE and padToBytes == 1:
+			return chr(n)
+		numBytes = (n.bit_length() + 7) / 8
+		if padToBytes is not None and numBytes < padToBytes:
+			numBytes = padToBytes
+		pack = _PACKERS.get(numBytes)
+		if pack is not None:
+			return pack(n)
+		elif numBytes == 2 * BYTES_PER_SERIAL:
+			return _STRUCT_128.pack(n >> _BITS_64, n & _MASK_64)
 	s = ''
 	while n > 0:
 		lowByte = n % BYTE_BASE
@@ -45,6 +91,12 @@ def stringToNumber(s):
 	Unpack a (little-endian) string to a number.
 	Example: '>\xf7' => 0x3ef7 or '\n\xe4' => 2788 (0x0ae4)
 	"""
+	unpack = _UNPACKERS.get(len(s))
+	if unpack is not None:
+		return unpack(s)[0]
+	elif len(s) == 2 * BYTES_PER_SERIAL:
+		high, low = _STRUCT_128.unpack(s)
+		return (high << _BITS_64) | low
 	n = 0
 	for c in s:
 		n *= BYTE_BASE
@@ -52,6 +104,141 @@ def stringToNumber(s):
 	return n
 
 
+class FixedWidthCodec:
+	"""
+	Pack/unpack an unsigned number of one fixed width (in bytes), using a
+	precompiled struct. Unpacking reads at an offset within a string or
+	buffer, so fields need not be sliced out of a frame first.
+	"""
+
+
+	def __init__(self, numBytes):
+		if not (numBytes in _STRUCTS
+				or numBytes == 2 * BYTES_PER_SERIAL):
+			raise ValueError(('No fixed-width codec for %r bytes; '
+				+ 'widths are %s.')
+				% (numBytes, sorted(_STRUCTS.keys()
+				+ [2 * BYTES_PER_SERIAL])))
+		self.__numBytes = numBytes
+		self.__struct = _STRUCTS.get(numBytes, _STRUCT_128)
+		self.__isWide = numBytes not in _STRUCTS
+
+
+	def getNumBytes(self):
+		return self.__numBytes
+
+
+	def decode(self, s, offset=0):
+		"""
+		@return the number packed in the given string at the given
+			offset
+		"""
+		if self.__isWide:
+			high, low = self.__struct.unpack_from(s, offset)
+			return (high << _BITS_64) | low
+		return self.__struct.unpack_from(s, offset)[0]
+
+
+	def encode(self, n):
+		"""
+		@return the number packed into a string of exactly this codec's
+			width
+		"""
+		if self.__isWide:
+			return self.__struct.pack(n >> _BITS_64, n & _MASK_64)
+		return self.__struct.pack(n)
+
+
+
+_CODECS = dict([(numBytes, FixedWidthCodec(numBytes))
+	for numBytes in _STRUCTS.keys() + [2 * BYTES_PER_SERIAL]])
+UINT8 = _CODECS[1]
+UINT16 = _CODECS[2]
+UINT32 = _CODECS[4]
+UINT64 = _CODECS[8]
+UINT128 = _CODECS[16]
+
+
+def getCodec(numBytes):
+	"""
+	@return the shared FixedWidthCodec for the given width
+	@raise ValueError if there is no codec for the width
+	"""
+	codec = _CODECS.get(numBytes)
+	if codec is None:
+		codec = FixedWidthCodec(numBytes)
+	return codec
+
+
+
+class FieldDecoder:
+	"""
+	Unpack several fixed-width fields, at fixed offsets, in one call.
+
+	The field layout is compiled once into a single struct format (with pad
+	bytes between fields), so decoding a frame header costs one unpack
+	rather than one slice and one conversion per field.
+	Example: FieldDecoder([(0, 8), (8, 2)]).decode(s) => (serial, addr)
+	"""
+
+
+	def __init__(self, fields):
+		"""
+		@param fields a sequence of (offset, numBytes) pairs, in order of
+			increasing offset and not overlapping. Each width must
+			be one supported by FixedWidthCodec.
+		"""
+		fmt = '>'
+		end = 0
+		self.__wideIndices = []
+		numValues = 0
+		for offset, numBytes in fields:
+			if offset < end:
+				raise ValueError(('Field at offset %d overlaps '
+					+ 'or precedes the previous field, '
+					+ 'which ends at %d.') % (offset, end))
+			if offset > end:
+				fmt += '%dx' % (offset - end)
+			code = _STRUCT_CODES.get(numBytes)
+			if code is not None:
+				fmt += code
+				numValues += 1
+			elif numBytes == 2 * BYTES_PER_SERIAL:
+				fmt += 'QQ'
+				self.__wideIndices.append(numValues)
+				numValues += 2
+			else:
+				raise ValueError(('No fixed-width codec for '
+					+ '%r bytes (at offset %d).')
+					% (numBytes, offset))
+			end = offset + numBytes
+		self.__struct = struct.Struct(fmt)
+		self.__unpackFrom = self.__struct.unpack_from
+
+
+	def getSize(self):
+		"""
+		@return the number of bytes from the first offset through the
+			end of the last field
+		"""
+		return self.__struct.size
+
+
+	def decode(self, s, offset=0):
+		"""
+		@param offset where, in the given string or buffer, offset 0 of
+			the field layout falls
+		@return a tuple of the decoded numbers, one per field
+		"""
+		values = self.__unpackFrom(s, offset)
+		if not self.__wideIndices:
+			return values
+		values = list(values)
+		for i in reversed(self.__wideIndices):
+			values[i:i+2] = [(values[i] << _BITS_64) | values[i+1]]
+		return tuple(values)
+
+
 def stringToBoolean(s):
 	"""
 	Unpack a string to boolean. The string is expected to be a packed
@@ -104,22 +291,64 @@ def voltsToNumber(v):
 	return (v / MILLIVOLTS_PER_VOLT) * (1024.0 / 1200.0)
 
 
-def bitFieldToIndexSet(bitField):
+def bitFieldToIndices(bitField):
 	"""
 	@param bitField encoded as an int
-	@return an set containing the indices of the bits which are set in the
-		given field.
-	Example: 0x43 == b0100 0011 => set([0, 1, 6])
+	@return a tuple of the indices of the bits which are set in the given
+		field, in increasing order. 8- and 16-bit fields (such as sample
+		masks) are looked up in precomputed tables.
+	Example: 0x43 == b0100 0011 => (0, 1, 6)
 	"""
+	if bitField < BYTE_BASE:
+		if bitField < 0:
+			return ()
+		return _BYTE_BIT_INDICES[bitField]
+	elif bitField < BYTE_BASE * BYTE_BASE:
+		return (_BYTE_BIT_INDICES[bitField & 0xFF]
+			+ _HIGH_BYTE_BIT_INDICES[bitField >> _BITS_PER_BYTE])
+
 	b = bitField
 	i = 0
-	indices = set()
+	indices = []
 	while b > 0:
 		if b & 0x1:
-			indices.add(i)
+			indices.append(i)
 		b = b >> 1
 		i += 1
-	return indices
+	return tuple(indices)
+
+
+def bitFieldToIndexSet(bitField):
+	"""
+	@param bitField encoded as an int
+	@return an set containing the indices of the bits which are set in the
+		given field.
+	Example: 0x43 == b0100 0011 => set([0, 1, 6])
+	"""
+	return set(bitFieldToIndices(bitField))
+
+
+def bitFieldsToBitArray(bitFields, numBits=16):
+	"""
+	Decode many bit fields at once, for example the sample masks of a
+	history of frames being reprocessed. Requires NumPy.
+	@param bitFields a sequence (or NumPy array) of non-negative ints, each
+		less than 2**numBits
+	@param numBits the width of the fields, at most 64
+	@return a NumPy bool array of shape (len(bitFields), numBits), in
+		which [i, j] is whether bit j of bitFields[i] is set. (To get
+		indices, as bitFieldToIndices does, use numpy.nonzero.)
+	@throw RuntimeError if NumPy is not available
+	"""
+	if numpy is None:
+		raise RuntimeError('NumPy is required to decode bit fields in '
+			+ 'bulk; use bitFieldToIndices instead.')
+	if not 0 < numBits <= _BITS_64:
+		raise ValueError('Number of bits %r is not in [1, %d].'
+			% (numBits, _BITS_64))
+	fields = numpy.asarray(bitFields, dtype=numpy.uint64)
+	shifts = numpy.arange(numBits, dtype=numpy.uint64)
+	return ((fields[:, numpy.newaxis] >> shifts) & 1).astype(bool)
 
 
 def indicesToBitField(indices):
@@ -1,9 +1,132 @@
+from .deps import Enum
+
+
 def fromString(enumeration, s):
 	"""
 	@return the enumeration value which matches the given string.
 	@throw ValueError if no match is found.
 	"""
+	if isinstance(enumeration, InternedEnum):
+		return enumeration.fromString(s)
 	for e in enumeration:
 		if str(e) == s:
 			return e
 	raise ValueError('No value "%s" in %s.' % (s, enumeration))
+
+
+
+class InternedValue(object):
+	"""
+	A value of an InternedEnum. Each value is a singleton, so equality and
+	hashing are by identity (and are done in C); ordering is by index, as
+	for plain enum values. The index is the value's compact integer
+	identity (also available as int(value)), and is stable as long as the
+	enumeration's keys are not reordered.
+	"""
+	__slots__ = ('enumtype', 'index', 'key', '__weakref__')
+
+
+	def __init__(self, enumtype, index, key):
+		self.enumtype = enumtype
+		self.index = index
+		self.key = key
+
+
+	def __str__(self):
+		return str(self.key)
+
+
+	def __repr__(self):
+		return 'InternedValue(%r, %r)' % (self.index, self.key)
+
+
+	def __int__(self):
+		return self.index
+
+
+	def __copy__(self):
+		return self
+
+
+	def __deepcopy__(self, memo):
+		return self
+
+
+	def __lt__(self, other):
+		if getattr(other, 'enumtype', None) is not self.enumtype:
+			return NotImplemented
+		return self.index < other.index
+
+
+	def __le__(self, other):
+		if getattr(other, 'enumtype', None) is not self.enumtype:
+			return NotImplemented
+		return self.index <= other.index
+
+
+	def __gt__(self, other):
+		if getattr(other, 'enumtype', None) is not self.enumtype:
+			return NotImplemented
+		return self.index > other.index
+
+
+	def __ge__(self, other):
+		if getattr(other, 'enumtype', None) is not self.enumtype:
+			return NotImplemented
+		return self.index >= other.index
+
+
+
+class InternedEnum(Enum):
+	"""
+	An Enum (with the same attribute, indexing, iteration, membership and
+	string semantics) whose values are InternedValues, and which keeps
+	precomputed maps for constant-time lookup of values by string and by
+	index, and membership tests.
+	"""
+
+
+	def __init__(self, *keys):
+		Enum.__init__(self, *keys, value_type=InternedValue)
+		values = tuple(self._values)
+		self.__dict__['_byString'] = dict([(str(v), v) for v in values])
+		self.__dict__['_byIndex'] = values
+		self.__dict__['_valueSet'] = frozenset(values)
+
+
+	def fromString(self, s):
+		"""
+		@return the value whose string form (its key) is s
+		@throw ValueError if there is no such value
+		"""
+		try:
+			return self._byString[s]
+		except KeyError:
+			raise ValueError('No value "%s" in %s.' % (s, self))
+
+
+	def fromIndex(self, index):
+		"""
+		@return the value with the given integer identity
+		@throw IndexError if there is no such value
+		"""
+		if index < 0:
+			raise IndexError('No value with index %r in %s.'
+				% (index, self))
+		return self._byIndex[index]
+
+
+	def getStringMap(self):
+		"""
+		@return a copy of the map from each string form to its value
+		"""
+		return dict(self._byString)
+
+
+	def __contains__(self, value):
+		if isinstance(value, basestring):
+			return value in self._byString
+		try:
+			return value in self._valueSet
+		except TypeError:
+			return False
@@ -0,0 +1,227 @@
+"""
+Parse and dispatch received frames on a pool of worker threads, so that the
+thread reading the serial port only queues raw frames, and a slow
+FRAME_RECEIVED handler (such as one writing to a file) does not stall reads.
+
+Frames from the same source (node serial) always go to the same worker, so
+they are handled in the order received. By default there is one worker, so
+FRAME_RECEIVED handlers (written for the single reader thread) never run
+concurrently; more workers spread the parsing but need handlers that are
+thread-safe.
+"""
+
+import collections
+import logging
+import threading
+
+from .deps import Enum
+
+
+__all__ = [
+	'OVERFLOW',
+	'FramePipeline',
+	'apiFrameSourceKey',
+	'dictSourceKey',
+]
+
+
+log = logging.getLogger('xh.pipeline')
+
+# What to do with a frame received when its worker's queue is full.
+OVERFLOW = Enum(
+	'BLOCK',		# wait (stalling the reader) for room
+	'DROP_OLDEST',		# drop the oldest queued frame to make room
+	'COUNT_AND_DROP',	# drop (and count) the new frame
+)
+
+NUM_WORKERS = 1
+MAX_DEPTH = 1000
+
+# API ids of received frames with a source serial, and its offset
+_API_FRAME_SERIAL_OFFSETS = {
+	0x92: 1,	# IO sample
+	0x95: 1,	# node identification
+	0x97: 2,	# remote AT command response
+}
+_SERIAL_BYTES = 8
+_DICT_SERIAL_KEY = 'source_addr_long'
+
+
+
+def apiFrameSourceKey(frameData):
+	"""
+	@param frameData the data of a received API frame
+	@return the (encoded) source serial, or None if the frame has none
+	"""
+	offset = _API_FRAME_SERIAL_OFFSETS.get(ord(frameData[0]))
+	if offset is None:
+		return None
+	return frameData[offset:offset + _SERIAL_BYTES]
+
+
+def dictSourceKey(d):
+	"""
+	@param d an API dict from the xbee library
+	@return the (encoded) source serial, or None if the frame has none
+	"""
+	return d.get(_DICT_SERIAL_KEY)
+
+
+
+class _Worker(threading.Thread):
+
+
+	def __init__(self, pipeline, index, maxDepth, overflow):
+		threading.Thread.__init__(self,
+			name='FramePipelineWorker%d' % index)
+		self.daemon = True
+		self.__pipeline = pipeline
+		self.__maxDepth = maxDepth
+		self.__overflow = overflow
+		self.__queue = collections.deque()
+		self.__lock = threading.Lock()
+		self.__changed = threading.Condition(self.__lock)
+		self.__running = True
+		self.__maxSeenDepth = 0
+		self.__numDropped = 0
+		self.__numProcessed = 0
+
+
+	def getDepth(self):
+		return len(self.__queue)
+
+
+	def getMaxSeenDepth(self):
+		return self.__maxSeenDepth
+
+
+	def getNumDropped(self):
+		return self.__numDropped
+
+
+	def getNumProcessed(self):
+		return self.__numProcessed
+
+
+	def put(self, raw):
+		with self.__lock:
+			if len(self.__queue) >= self.__maxDepth:
+				if self.__overflow == OVERFLOW.BLOCK:
+					while (self.__running
+						and len(self.__queue)
+						>= self.__maxDepth):
+						self.__changed.wait()
+				elif self.__overflow == OVERFLOW.DROP_OLDEST:
+					self.__queue.popleft()
+					self.__numDropped += 1
+				else:
+					self.__numDropped += 1
+					return
+			self.__queue.append(raw)
+			self.__maxSeenDepth = max(self.__maxSeenDepth,
+				len(self.__queue))
+			self.__changed.notify_all()
+
+
+	def halt(self):
+		with self.__lock:
+			self.__running = False
+			self.__changed.notify_all()
+		if self.is_alive():
+			self.join()
+
+
+	def run(self):
+		while True:
+			with self.__lock:
+				while self.__running and not self.__queue:
+					self.__changed.wait()
+				if not self.__queue:
+					return
+				raw = self.__queue.popleft()
+				self.__changed.notify_all()
+			self.__pipeline._process(raw)
+			self.__numProcessed += 1
+
+
+
+class FramePipeline:
+
+
+	def __init__(self, parse, dispatch, getSourceKey,
+		numWorkers=NUM_WORKERS, maxDepth=MAX_DEPTH,
+		overflow=OVERFLOW.BLOCK):
+		"""
+		@param parse a function which takes a raw received frame and
+			returns a Frame (or None)
+		@param dispatch a function called with each parsed Frame
+		@param getSourceKey a function which takes a raw received frame
+			and returns a key for its source (such as
+			apiFrameSourceKey), or None
+		@param numWorkers how many threads parse and dispatch frames
+		@param maxDepth the most frames each worker may have queued
+		@param overflow an OVERFLOW value: what to do with frames
+			received when a worker's queue is full
+		"""
+		if overflow not in OVERFLOW:
+			raise ValueError('Overflow policy %s not one of %s.'
+				% (overflow, OVERFLOW))
+		self.__parse = parse
+		self.__dispatch = dispatch
+		self.__getSourceKey = getSourceKey
+		self.__workers = [_Worker(self, i, maxDepth, overflow)
+			for i in xrange(max(1, numWorkers))]
+
+
+	def start(self):
+		for worker in self.__workers:
+			worker.start()
+
+
+	def put(self, raw):
+		"""
+		Queue a raw received frame (from the reading thread).
+		"""
+		key = self.__getSourceKey(raw)
+		workers = self.__workers
+		workers[hash(key) % len(workers)].put(raw)
+
+
+	def getDepth(self):
+		"""
+		@return the number of frames queued and not yet processed
+		"""
+		return sum(w.getDepth() for w in self.__workers)
+
+
+	def getMaxSeenDepth(self):
+		"""
+		@return the most frames any worker has had queued at once
+		"""
+		return max(w.getMaxSeenDepth() for w in self.__workers)
+
+
+	def getNumDropped(self):
+		return sum(w.getNumDropped() for w in self.__workers)
+
+
+	def getNumProcessed(self):
+		return sum(w.getNumProcessed() for w in self.__workers)
+
+
+	def halt(self):
+		"""
+		Process the frames already queued, then stop the workers.
+		"""
+		for worker in self.__workers:
+			worker.halt()
+
+
+	def _process(self, raw):
+		try:
+			frame = self.__parse(raw)
+			if frame:
+				self.__dispatch(frame)
+		except:
+			log.error('error processing received frame %r' % (raw,),
+				exc_info=True)
@@ -0,0 +1,341 @@
+"""
+Periodically poll every node in the network with a Command, without
+flooding the mesh: polls are spread across the interval, only so many are
+awaiting responses at once, and failed deliveries are retried with backoff.
+"""
+
+import copy
+import heapq
+import logging
+import random
+import threading
+import time
+
+from . import correlator, rtt
+
+
+__all__ = [
+	'FleetPoller',
+	'PollStats',
+]
+
+
+log = logging.getLogger('xh.polling')
+
+# most polls awaiting responses at once
+MAX_IN_FLIGHT = 4
+# retries after the first attempt
+MAX_RETRIES = 3
+# delay before the first retry, doubled for each further retry
+BACKOFF_SECONDS = 1.0
+# Each poll (and retry) is moved by up to this fraction of the spacing.
+JITTER_FRACTION = 0.5
+
+
+
+class PollStats:
+	"""
+	Counts of polls to one node, and their response times.
+	"""
+
+
+	def __init__(self):
+		self.__numPolls = 0
+		self.__numSucceeded = 0
+		self.__numAttempts = 0
+		self.__numTransmitFailures = 0
+		self.__numTimeouts = 0
+		self.__numErrors = 0
+		self.__totalLatencySeconds = 0.0
+		self.__lastLatencySeconds = None
+
+
+	def getNumPolls(self):
+		"""
+		@return the number of completed polls (each of one or more
+			attempts)
+		"""
+		return self.__numPolls
+
+
+	def getNumSucceeded(self):
+		return self.__numSucceeded
+
+
+	def getSuccessRate(self):
+		"""
+		@return the fraction of completed polls with a response, or None
+			if no polls are complete
+		"""
+		if not self.__numPolls:
+			return None
+		return float(self.__numSucceeded) / self.__numPolls
+
+
+	def getNumAttempts(self):
+		return self.__numAttempts
+
+
+	def getNumTransmitFailures(self):
+		return self.__numTransmitFailures
+
+
+	def getNumTimeouts(self):
+		return self.__numTimeouts
+
+
+	def getNumErrors(self):
+		"""
+		@return the number of responses with an error status (other
+			than TRANSMIT_FAILURE), each failing its poll
+		"""
+		return self.__numErrors
+
+
+	def getMeanLatencySeconds(self):
+		"""
+		@return the mean time from sending to the response, of the
+			attempts which succeeded (or None)
+		"""
+		if not self.__numSucceeded:
+			return None
+		return self.__totalLatencySeconds / self.__numSucceeded
+
+
+	def getLastLatencySeconds(self):
+		return self.__lastLatencySeconds
+
+
+	def _recordAttempt(self):
+		self.__numAttempts += 1
+
+
+	def _recordTransmitFailure(self):
+		self.__numTransmitFailures += 1
+
+
+	def _recordTimeout(self):
+		self.__numTimeouts += 1
+
+
+	def _recordError(self):
+		self.__numErrors += 1
+
+
+	def _recordPoll(self, latencySeconds):
+		"""
+		@param latencySeconds the successful attempt's response time, or
+			None if the poll failed
+		"""
+		self.__numPolls += 1
+		if latencySeconds is not None:
+			self.__numSucceeded += 1
+			self.__totalLatencySeconds += latencySeconds
+			self.__lastLatencySeconds = latencySeconds
+
+
+	def __str__(self):
+		rate = self.getSuccessRate()
+		latency = self.getMeanLatencySeconds()
+		return ('%d/%d polls ok%s, %d attempts (%d transmit failures,'
+			+ ' %d timeouts, %d errors)%s') % (
+			self.__numSucceeded, self.__numPolls,
+			'' if rate is None else ' (%.0f%%)' % (100 * rate),
+			self.__numAttempts, self.__numTransmitFailures,
+			self.__numTimeouts, self.__numErrors,
+			'' if latency is None
+				else ', mean latency %.3fs' % latency)
+
+
+
+class FleetPoller(threading.Thread):
+	"""
+	Every interval, send a Command to each of a set of nodes.
+
+	A poll is retried if the Command's response has the TRANSMIT_FAILURE
+	status, or if no response comes in time; it fails (without retrying)
+	if the response has another error status. Responses are received as
+	usual (by signals.FRAME_RECEIVED); the poller only keeps statistics.
+	"""
+
+
+	def __init__(self, createCommand, getSerials, intervalSeconds,
+		timeoutSeconds=None, maxInFlight=MAX_IN_FLIGHT,
+		maxRetries=MAX_RETRIES, backoffSeconds=BACKOFF_SECONDS,
+		priority=None):
+		"""
+		@param createCommand a function which takes a node's serial and
+			returns a new Command to send to it
+		@param getSerials a function which returns the serials of the
+			nodes to poll (called at the start of every interval)
+		@param intervalSeconds how often to poll each node
+		@param timeoutSeconds how long to wait for each response
+			(default: from the round-trip times measured to the
+			node, see xh.rtt)
+		@param priority the xh.transmit.PRIORITY to send polls with
+		"""
+		threading.Thread.__init__(self, name='FleetPoller')
+		self.daemon = True
+		self.__createCommand = createCommand
+		self.__getSerials = getSerials
+		self.__intervalSeconds = intervalSeconds
+		self.__timeoutSeconds = timeoutSeconds
+		self.__maxRetries = maxRetries
+		self.__backoffSeconds = backoffSeconds
+		self.__priority = priority
+
+		self.__inFlight = threading.Semaphore(maxInFlight)
+		self.__lock = threading.Lock()
+		self.__changed = threading.Condition(self.__lock)
+		self.__running = True
+		# heap of (time, serial, attempt number) of attempts to make
+		self.__schedule = []
+		# serials with a poll in progress
+		self.__polling = set()
+		self.__stats = {}
+
+
+	def getStats(self):
+		"""
+		@return a dict of node serial to a PollStats copy
+		"""
+		with self.__lock:
+			return dict((serial, copy.copy(stats))
+				for serial, stats in self.__stats.iteritems())
+
+
+	def halt(self):
+		"""
+		Stop polling (abandoning any retries), and wait for the thread
+		to finish.
+		"""
+		with self.__lock:
+			self.__running = False
+			self.__changed.notify()
+		if self.is_alive():
+			self.join()
+
+
+	def run(self):
+		nextRound = time.time()
+		while True:
+			with self.__lock:
+				if not self.__running:
+					return
+				now = time.time()
+				if now >= nextRound:
+					self.__scheduleRound(now)
+					nextRound = now + self.__intervalSeconds
+				if (self.__schedule
+					and self.__schedule[0][0] <= now):
+					t, serial, attempt = heapq.heappop(
+						self.__schedule)
+				else:
+					nextTime = nextRound
+					if self.__schedule:
+						nextTime = min(nextTime,
+							self.__schedule[0][0])
+					self.__changed.wait(nextTime - now)
+					continue
+			self.__inFlight.acquire()
+			# halt may have been called while waiting for a slot
+			with self.__lock:
+				if not self.__running:
+					self.__inFlight.release()
+					return
+			self.__attempt(serial, attempt)
+
+
+	def __scheduleRound(self, now):
+		"""
+		Schedule a poll of each node not still being polled, spread
+		across the interval. (The lock must be held.)
+		"""
+		try:
+			serials = [s for s in self.__getSerials()
+				if s not in self.__polling]
+		except:
+			log.error('error getting the serials to poll',
+				exc_info=True)
+			return
+		if not serials:
+			return
+		random.shuffle(serials)
+		spacing = self.__intervalSeconds / len(serials)
+		for i, serial in enumerate(serials):
+			t = now + spacing * (i + random.uniform(
+				0, JITTER_FRACTION))
+			heapq.heappush(self.__schedule, (t, serial, 0))
+			self.__polling.add(serial)
+
+
+	def __attempt(self, serial, attempt):
+		with self.__lock:
+			stats = self.__stats.setdefault(serial, PollStats())
+			stats._recordAttempt()
+		sentTime = time.time()
+		timeout = (self.__timeoutSeconds
+			or rtt.getTimeoutSeconds(serial))
+		try:
+			future = self.__createCommand(serial).sendAsync(
+				timeoutSeconds=timeout,
+				priority=self.__priority)
+		except:
+			log.error('error polling %s' % serial, exc_info=True)
+			self.__inFlight.release()
+			self.__finish(serial, None)
+			return
+		future.addDoneCallback(lambda f:
+			self.__handleResult(serial, attempt, sentTime, f))
+
+
+	def __handleResult(self, serial, attempt, sentTime, future):
+		self.__inFlight.release()
+		if future.isCancelled():
+			self.__finish(serial, None)
+			return
+		try:
+			response = future.getResult()
+		except correlator.TimeoutError:
+			with self.__lock:
+				self.__stats[serial]._recordTimeout()
+			self.__retry(serial, attempt)
+			return
+		except Exception as e:
+			log.warning('poll of %s failed: %s' % (serial, e))
+			self.__finish(serial, None)
+			return
+
+		status = response.getStatus()
+		if status == response.STATUS.TRANSMIT_FAILURE:
+			with self.__lock:
+				self.__stats[serial]._recordTransmitFailure()
+			self.__retry(serial, attempt)
+		elif status != response.STATUS.OK:
+			log.debug('poll of %s failed with status %s'
+				% (serial, status))
+			with self.__lock:
+				self.__stats[serial]._recordError()
+			self.__finish(serial, None)
+		else:
+			self.__finish(serial, time.time() - sentTime)
+
+
+	def __retry(self, serial, attempt):
+		if attempt >= self.__maxRetries:
+			log.debug('giving up polling %s after %d attempts'
+				% (serial, attempt + 1))
+			self.__finish(serial, None)
+			return
+		delay = self.__backoffSeconds * (2 ** attempt)
+		delay *= 1 + random.uniform(0, JITTER_FRACTION)
+		with self.__lock:
+			heapq.heappush(self.__schedule,
+				(time.time() + delay, serial, attempt + 1))
+			self.__changed.notify()
+
+
+	def __finish(self, serial, latencySeconds):
+		with self.__lock:
+			self.__stats[serial]._recordPoll(latencySeconds)
+			self.__polling.discard(serial)
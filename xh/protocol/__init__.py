@@ -1,5 +1,6 @@
 from constants import *
 from registry import Registry
+from schema import Field, Schema
 
 from frame import Frame, FrameRegistry
 
@@ -10,6 +11,7 @@ from nodeid import NodeId
 from command import Command, CommandRegistry
 from numbercommand import NumberCommand
 
+from baudrate import BaudRate
 from configureiopin import ConfigureIoPin
 from encryptionenable import EncryptionEnable
 from inputsample import InputSample
@@ -26,4 +28,14 @@ from voltagesupplythreshold import VoltageSupplyThreshold
 from wakehosttimer import WakeHostTimer
 from write import Write
 
+# All the Frame and Command classes are registered by now, so make the
+# registries' lookups (done for every frame and response) plain dict lookups.
+FrameRegistry.freeze()
+CommandRegistry.freeze()
+
 from parse import ParseFromDict, ParseFromDictSafe
+from parse import setLazyDecoding, isLazyDecoding
+from parse import KEY_AUDIT, setKeyAuditing, getUnusedKeyCounts, \
+	resetUnusedKeyCounts, logUnusedKeyCounts
+from apiframe import FrameSplitter, ParseFromApiFrame, ParseFromApiFrameSafe
+from apiframe import encodeFrame
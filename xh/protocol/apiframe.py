@@ -0,0 +1,447 @@
+"""
+Split the bytes read from a locally attached XBee into API frames, and parse
+API frame data straight into Frame objects, without first decoding it into
+the xbee library's API dicts (compare ParseFromDict).
+
+Both API mode 1 (AP=1) and escaped API mode 2 (AP=2) are supported. See page
+98 of the XBee Series 2 datasheet for the framing, and pages 111-117 for the
+frame data of each API id parsed here.
+"""
+
+import logging
+import struct
+
+from . import Command, Data, DEVICE_TYPE, Frame, NodeId, Sample
+from .parse import isLazyDecoding
+
+
+log = logging.getLogger('ParseFromApiFrame')
+
+START_BYTE = 0x7E
+ESCAPE_BYTE = 0x7D
+XON_BYTE = 0x11
+XOFF_BYTE = 0x13
+ESCAPE_XOR = 0x20
+ESCAPED_BYTES = frozenset([START_BYTE, ESCAPE_BYTE, XON_BYTE, XOFF_BYTE])
+
+# Longer frame data is taken to be a garbled length field.
+MAX_FRAME_DATA_BYTES = 0x400
+
+# API ids (the first byte of the frame data) of the frames parsed here
+API_ID_AT_RESPONSE = 0x88
+API_ID_IO_SAMPLE = 0x92
+API_ID_NODE_ID = 0x95
+API_ID_REMOTE_AT_RESPONSE = 0x97
+
+_START = chr(START_BYTE)
+_ESCAPE = chr(ESCAPE_BYTE)
+_LENGTH = struct.Struct('>H')
+
+# frame data layouts, from the API id up to any variable length field
+_AT_RESPONSE = struct.Struct('>BB2sB')
+_REMOTE_AT_RESPONSE = struct.Struct('>BBQH2sB')
+_IO_SAMPLE = struct.Struct('>BQHB')
+_NODE_ID = struct.Struct('>BQHBHQ')
+_NODE_ID_TRAILER = struct.Struct('>HBBHH')
+# a sample set's count and channel masks, and its digital samples (if any)
+_SAMPLE_HEADER_BYTES = 4
+_DIGITAL_SAMPLE_BYTES = 2
+
+
+
+class FrameSplitter:
+	"""
+	Collect bytes read from the serial port and split out the data of each
+	complete API frame with a valid checksum. Bytes which are not part of
+	such a frame are discarded (and counted), so the splitter resynchronizes
+	on the next start byte after line noise or a partial frame.
+	"""
+
+
+	def __init__(self, escaped=False):
+		"""
+		@param escaped whether the XBee is in escaped API mode (AP=2)
+		"""
+		self.__escaped = bool(escaped)
+		self.__buffer = bytearray()
+		self.__numFrames = 0
+		self.__numDiscardedBytes = 0
+		self.__numBadChecksums = 0
+
+
+	def isEscaped(self):
+		return self.__escaped
+
+
+	def getNumFrames(self):
+		return self.__numFrames
+
+
+	def getNumDiscardedBytes(self):
+		return self.__numDiscardedBytes
+
+
+	def getNumBadChecksums(self):
+		return self.__numBadChecksums
+
+
+	def feed(self, data):
+		"""
+		@param data a string (or bytearray, or memoryview) of bytes
+			read from the serial port
+		@return a list of the (unescaped) frame data strings of the
+			frames completed by data, in order
+		"""
+		self.__buffer += data
+		if self.__escaped:
+			frames = self.__splitEscaped()
+		else:
+			frames = self.__split()
+		self.__numFrames += len(frames)
+		return frames
+
+
+	def __discard(self, numBytes):
+		if numBytes:
+			del self.__buffer[:numBytes]
+			self.__numDiscardedBytes += numBytes
+
+
+	def __split(self):
+		"""
+		Scan the buffer once, and remove the bytes used (by frames, or
+		discarded) all at once at the end, rather than after each
+		frame.
+		"""
+		frames = []
+		buf = self.__buffer
+		n = len(buf)
+		i = 0
+		numDiscarded = 0
+		while True:
+			start = buf.find(_START, i)
+			if start < 0:
+				numDiscarded += n - i
+				i = n
+				break
+			numDiscarded += start - i
+			i = start
+
+			if n - i < 3:
+				break
+			length = _LENGTH.unpack_from(buf, i + 1)[0]
+			if length == 0 or length > MAX_FRAME_DATA_BYTES:
+				numDiscarded += 1
+				i += 1
+				continue
+			end = i + 3 + length + 1
+			if n < end:
+				break
+			if sum(buf[i+3:end]) & 0xFF != 0xFF:
+				self.__numBadChecksums += 1
+				numDiscarded += 1
+				i += 1
+				continue
+			frames.append(str(buf[i+3:end-1]))
+			i = end
+		del buf[:i]
+		self.__numDiscardedBytes += numDiscarded
+		return frames
+
+
+	def __splitEscaped(self):
+		"""
+		In escaped mode a start byte never occurs within a frame, so
+		each one starts a new frame, abandoning any incomplete one.
+		"""
+		frames = []
+		buf = self.__buffer
+		while True:
+			start = buf.find(_START)
+			if start < 0:
+				self.__discard(len(buf))
+				break
+			self.__discard(start)
+
+			nextStart = buf.find(_START, 1)
+			if nextStart < 0:
+				unescaped = _unescape(buf[1:])
+			else:
+				unescaped = _unescape(buf[1:nextStart])
+
+			end = None
+			if len(unescaped) >= 2:
+				length = _LENGTH.unpack_from(unescaped)[0]
+				if 0 < length <= MAX_FRAME_DATA_BYTES:
+					end = 2 + length + 1
+				else:
+					end = 0
+
+			if end is None or len(unescaped) < end:
+				if nextStart < 0:
+					break
+				# interrupted by the next frame
+				self.__discard(nextStart)
+				continue
+
+			if (end and sum(unescaped[2:end]) & 0xFF == 0xFF):
+				frames.append(str(unescaped[2:end-1]))
+				self.__numDiscardedBytes += len(unescaped) - end
+				if nextStart < 0:
+					del buf[:]
+				else:
+					del buf[:nextStart]
+			else:
+				if end:
+					self.__numBadChecksums += 1
+				if nextStart < 0:
+					self.__discard(len(buf))
+				else:
+					self.__discard(nextStart)
+		return frames
+
+
+
+def _unescape(escaped):
+	"""
+	@param escaped a bytearray of escaped frame bytes (after the start byte)
+	@return a bytearray of the unescaped bytes, without any trailing escape
+		byte (whose escaped byte has not arrived yet)
+	"""
+	pieces = escaped.split(_ESCAPE)
+	unescaped = pieces[0]
+	for piece in pieces[1:]:
+		if piece:
+			piece[0] ^= ESCAPE_XOR
+			unescaped += piece
+	return unescaped
+
+
+def escape(data):
+	"""
+	@param data a string of frame bytes (after the start byte)
+	@return data, escaped for escaped API mode
+	"""
+	if not any(chr(b) in data for b in ESCAPED_BYTES):
+		return data
+	return ''.join([(_ESCAPE + chr(ord(c) ^ ESCAPE_XOR))
+		if ord(c) in ESCAPED_BYTES else c for c in data])
+
+
+def encodeFrame(frameData, escaped=False):
+	"""
+	@param frameData a string of frame data, starting with the API id
+	@param escaped whether to escape the frame for escaped API mode
+	@return the framed bytes to write to the serial port: start byte,
+		length, frame data and checksum
+	"""
+	checksum = 0xFF - (sum(bytearray(frameData)) & 0xFF)
+	body = _LENGTH.pack(len(frameData)) + frameData + chr(checksum)
+	if escaped:
+		body = escape(body)
+	return _START + body
+
+
+def _decodeOptions(options):
+	return Frame.OPTIONS[options - 1]
+
+
+def _decodeSourceEvent(sourceEvent):
+	return NodeId.EVENT[sourceEvent - 1]
+
+
+def _parseAtResponse(view):
+	apiId, frameId, name, status = _AT_RESPONSE.unpack_from(view)
+	c = Command._createResponse(frameId, Command.NAME.fromString(name))
+	c._status = Command.STATUS[status]
+	if len(view) > _AT_RESPONSE.size:
+		c.parseParameter(view[_AT_RESPONSE.size:].tobytes())
+	return c
+
+
+def _parseRemoteAtResponse(view):
+	(apiId, frameId, serial, networkAddress, name,
+		status) = _REMOTE_AT_RESPONSE.unpack_from(view)
+	c = Command._createResponse(frameId, Command.NAME.fromString(name))
+	c._remoteSerial = serial
+	c._remoteNetworkAddress = networkAddress
+	c._status = Command.STATUS[status]
+	if len(view) > _REMOTE_AT_RESPONSE.size:
+		c.parseParameter(view[_REMOTE_AT_RESPONSE.size:].tobytes())
+	return c
+
+
+def _parseIoSample(view):
+	apiId, serial, networkAddress, options = _IO_SAMPLE.unpack_from(view)
+	d = Data()
+	d._sourceAddressLong = serial
+	d._sourceAddress = networkAddress
+	d._options = _decodeOptions(options)
+	d._sampleArrays = Sample.arraysFromEncoded(
+		view[_IO_SAMPLE.size:].tobytes())
+	return d
+
+
+def _parseNodeId(view):
+	(apiId, senderSerial, senderNetworkAddress, options, networkAddress,
+		serial) = _NODE_ID.unpack_from(view)
+	rest = view[_NODE_ID.size:].tobytes()
+	nameEnd = rest.index('\0')
+	(parentNetworkAddress, deviceType, sourceEvent, profileId,
+		manufacturerId) = _NODE_ID_TRAILER.unpack_from(
+			rest, nameEnd + 1)
+
+	n = NodeId()
+	n._senderSerial = senderSerial
+	n._senderNetworkAddress = senderNetworkAddress
+	n._options = _decodeOptions(options)
+	n._networkAddress = networkAddress
+	n._serial = serial
+	n._nodeIdentifier = rest[:nameEnd]
+	n._parentNetworkAddress = parentNetworkAddress
+	n._deviceType = DEVICE_TYPE[deviceType]
+	n._sourceEvent = _decodeSourceEvent(sourceEvent)
+	n._profileId = profileId
+	n._manufacturerId = manufacturerId
+	return n
+
+
+_PARSERS = {
+	API_ID_AT_RESPONSE: _parseAtResponse,
+	API_ID_IO_SAMPLE: _parseIoSample,
+	API_ID_NODE_ID: _parseNodeId,
+	API_ID_REMOTE_AT_RESPONSE: _parseRemoteAtResponse,
+}
+
+
+def _unpacker(layout, index, convert=None):
+	"""
+	@return a function which unpacks the value at the given index of the
+		layout from frame data (and converts it), for lazy decoding
+	"""
+	unpackFrom = layout.unpack_from
+	if convert is None:
+		return lambda data: unpackFrom(data)[index]
+	return lambda data: convert(unpackFrom(data)[index])
+
+
+def _nodeIdentifierEnd(data):
+	return data.index('\0', _NODE_ID.size)
+
+
+def _decodeNodeIdentifier(data):
+	return data[_NODE_ID.size:_nodeIdentifierEnd(data)]
+
+
+def _nodeIdTrailerUnpacker(index, convert=None):
+	"""
+	@return a function which unpacks the value at the given index of the
+		fields following the node identifier, for lazy decoding
+	"""
+	def decode(data):
+		value = _NODE_ID_TRAILER.unpack_from(
+			data, _nodeIdentifierEnd(data) + 1)[index]
+		if convert is None:
+			return value
+		return convert(value)
+	return decode
+
+
+def _decodeSamples(data):
+	return Sample.arraysFromEncoded(data, _IO_SAMPLE.size)
+
+
+def _checkIoSample(data):
+	"""
+	Check that IO sample frame data holds its fixed fields and sample set
+	header (and digital samples, if any), for lazy decoding.
+	"""
+	headerEnd = _IO_SAMPLE.size + _SAMPLE_HEADER_BYTES
+	digitalMask = data[_IO_SAMPLE.size + 1:_IO_SAMPLE.size + 3]
+	if len(data) < headerEnd or (digitalMask != '\0\0'
+		and len(data) < headerEnd + _DIGITAL_SAMPLE_BYTES):
+		raise ValueError('IO sample frame too short: %r' % data)
+
+
+def _checkNodeId(data):
+	"""
+	Check that node identification frame data holds its fixed fields, a
+	terminated node identifier and the fields after it, for lazy decoding.
+	"""
+	nameEnd = data.find('\0', _NODE_ID.size)
+	if (nameEnd < 0
+		or len(data) < nameEnd + 1 + _NODE_ID_TRAILER.size):
+		raise ValueError('Node identification frame too short: %r'
+			% data)
+
+
+# for lazy decoding: the class, Frame.TYPE, check and field decoders of each
+# API id
+_LAZY_FRAMES = {
+	API_ID_IO_SAMPLE: (Data, Frame.TYPE.rx_io_data_long_addr,
+		_checkIoSample, {
+		'_sourceAddressLong': _unpacker(_IO_SAMPLE, 1),
+		'_sourceAddress': _unpacker(_IO_SAMPLE, 2),
+		'_options': _unpacker(_IO_SAMPLE, 3, _decodeOptions),
+		'_sampleArrays': _decodeSamples,
+	}),
+	API_ID_NODE_ID: (NodeId, Frame.TYPE.node_id_indicator,
+		_checkNodeId, {
+		'_senderSerial': _unpacker(_NODE_ID, 1),
+		'_senderNetworkAddress': _unpacker(_NODE_ID, 2),
+		'_options': _unpacker(_NODE_ID, 3, _decodeOptions),
+		'_networkAddress': _unpacker(_NODE_ID, 4),
+		'_serial': _unpacker(_NODE_ID, 5),
+		'_nodeIdentifier': _decodeNodeIdentifier,
+		'_parentNetworkAddress': _nodeIdTrailerUnpacker(0),
+		'_deviceType': _nodeIdTrailerUnpacker(1,
+			DEVICE_TYPE.__getitem__),
+		'_sourceEvent': _nodeIdTrailerUnpacker(2, _decodeSourceEvent),
+		'_profileId': _nodeIdTrailerUnpacker(3),
+		'_manufacturerId': _nodeIdTrailerUnpacker(4),
+		'_statusFromReserved': lambda data: None,
+	}),
+}
+
+
+def ParseFromApiFrameSafe(data):
+	"""
+	Call ParseFromApiFrame to create a Frame from API frame data,
+	converting any errors to logged errors.
+	@return a Frame (subclass) on successful parsing or None on error
+	"""
+	try:
+		return ParseFromApiFrame(data)
+	except:
+		log.error('error handling API frame: %r' % str(data),
+			exc_info=True)
+		return None
+
+
+def ParseFromApiFrame(data):
+	"""
+	Create a Frame of the appropriate class from the (unescaped) data of an
+	API frame, as split out by a FrameSplitter. Fixed width fields are
+	unpacked in place; only variable length fields (command parameters,
+	samples and node identifiers) are copied out. With lazy decoding (see
+	setLazyDecoding), Data and NodeId frames keep the frame data (once
+	checked to hold every field) and decode each field when it is first
+	accessed.
+	@param data a string, bytearray or memoryview of the frame data,
+		starting with the API id
+	"""
+	view = memoryview(data)
+	apiId = ord(view[0])
+	if isLazyDecoding():
+		lazy = _LAZY_FRAMES.get(apiId)
+		if lazy is not None:
+			frameClass, frameType, check, decoders = lazy
+			if not isinstance(data, str):
+				data = view.tobytes()
+			check(data)
+			return frameClass._createLazy(frameType, data, decoders)
+	parse = _PARSERS.get(apiId)
+	if parse is None:
+		raise RuntimeError('No parser for API frame id 0x%02X. Data to '
+			'parse: %r' % (apiId, view.tobytes()))
+	return parse(view)
@@ -0,0 +1,60 @@
+from .. import encoding
+from . import Command, CommandRegistry
+
+
+
+class BaudRate(Command):
+	"""
+	The rate of the serial interface between the local XBee and its host.
+	In API mode, a new rate takes effect as soon as the response is sent
+	(at the old rate), so the host must then reopen the port at the new
+	rate. The rate is stored only when written (see Write), so a reset
+	returns the XBee to its stored rate.
+
+	Standard rates are set by their index in STANDARD_BAUDS. The Series 2
+	also accepts other rates, given as the rate itself (above 0x7F), which
+	are reported that way too.
+
+	See the serial interfacing commands in the XBee series 2 datasheet.
+	"""
+	__slots__ = ('__baud',)
+
+	STANDARD_BAUDS = (1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200)
+
+
+	def __init__(self, baud=None, **kwargs):
+		Command.__init__(self, Command.NAME.BD, **kwargs)
+		self.__baud = None
+		if baud is not None:
+			baudNum = int(baud)
+			if baudNum not in self.STANDARD_BAUDS:
+				raise ValueError(
+					'Baud %r not one of %s.'
+					% (baud, self.STANDARD_BAUDS))
+			self.__baud = baudNum
+			self.setParameter(self.STANDARD_BAUDS.index(baudNum))
+
+
+	def getBaud(self):
+		return self.__baud
+
+
+	def parseParameter(self, p):
+		n = encoding.stringToNumber(p)
+		if n < len(self.STANDARD_BAUDS):
+			self.__baud = self.STANDARD_BAUDS[n]
+		else:
+			self.__baud = n
+
+
+	def getNamedValues(self):
+		d = Command.getNamedValues(self, includeParameter=False)
+		baud = self.getBaud()
+		if baud is not None:
+			baud = '%d' % baud
+		d.update({'baud': baud})
+		return d
+
+
+
+CommandRegistry.put(Command.NAME.BD, BaudRate)
@@ -1,16 +1,38 @@
 import logging
+import struct
 import threading
 
-from .. import encoding, enumutil
+from .. import correlator, encoding, enumutil
 from ..deps import Enum
-from . import Frame, FrameRegistry, Registry
+from . import Field, Frame, FrameRegistry, Registry
 
 
 log = logging.getLogger('Command')
 
+# API ids and frame data layouts (up to the parameter) of AT Command and
+# Remote AT Command Request frames, from pages 106-108 of the XBee Series 2
+# datasheet
+_API_ID_AT = 0x08
+_API_ID_REMOTE_AT = 0x17
+_AT = struct.Struct('>BB2s')
+_REMOTE_AT = struct.Struct('>BBQHB2s')
+# network address for a remote destination known only by its serial
+_UNKNOWN_NETWORK_ADDRESS = 0xFFFE
+# remote command option: apply changes on the remote node immediately
+_APPLY_CHANGES = 0x02
+
 
 
 class Command(Frame):
+	__slots__ = (
+		'__frameId',
+		'__name',
+		'__parameter',
+		'_status',
+		'_remoteNetworkAddress',
+		'_remoteSerial',
+	)
+
 	# The fields expected to be in a command dict.
 	FIELD = Enum(
 		# sequence; packed number
@@ -34,8 +56,9 @@ class Command(Frame):
 
 
 	# Recognized command names (alphabetized).
-	NAME = Enum(
+	NAME = enumutil.InternedEnum(
 		'%V', # InputVolts (voltage level on Vcc pin)
+		'BD', # BaudRate (of the serial interface)
 		'D0', # configure IO pin DIO0 / AD0 / COMM
 		'D1', # configure IO pin DIO1 / AD1
 		'D2', # configure IO pin DIO2 / AD2
@@ -91,9 +114,15 @@ class Command(Frame):
 	__sendingFrameId = _MIN_FRAME_ID
 	__frameIdLock = threading.Lock()
 
-	# For sending, keep an Xbee object singleton and make thread-safe.
+	# For sending, keep an Xbee object singleton, or (preferably) a
+	# transmit queue, which is thread-safe. Each Xbee object may have a
+	# transmit queue of its own, so that one writer writes every frame for
+	# its serial port; frames sent straight through an Xbee object are
+	# written under a lock.
 	_xbeeSingleton = None
-	__xbeeSingletonLock = threading.Lock()
+	_transmitQueue = None
+	_xbeeTransmitQueues = {}
+	__xbeeLock = threading.Lock()
 
 
 	def __init__(self, name, responseFrameId=None, dest=None,
@@ -116,19 +145,13 @@ class Command(Frame):
 
 		Frame.__init__(self, frameType=frameType)
 
-		self.__remoteNetworkAddress = None
-		self.__remoteSerial = None
+		self._remoteNetworkAddress = None
+		self._remoteSerial = None
 
 		if responseFrameId is None:
-			with Command.__frameIdLock:
-				next = Command.__sendingFrameId
-				self.__frameId = next
-				next += 1
-				if (next > Command._MAX_FRAME_ID):
-					next = Command._MIN_FRAME_ID
-				Command.__sendingFrameId = next
+			self.__frameId = Command._allocateFrameId()
 			if dest is not None:
-				self.__remoteSerial = int(dest)
+				self._remoteSerial = int(dest)
 		else:
 			self.__frameId = int(responseFrameId)
 
@@ -139,6 +162,26 @@ class Command(Frame):
 		self.setStatus(None)
 
 
+	@staticmethod
+	def _allocateFrameId():
+		"""
+		@return the next frame ID for a Command to send, skipping IDs
+			of Commands still awaiting responses
+		@raise RuntimeError if all frame IDs are awaiting responses
+		"""
+		with Command.__frameIdLock:
+			next = Command.__sendingFrameId
+			for i in xrange(Command._MAX_FRAME_ID):
+				frameId = next
+				next += 1
+				if (next > Command._MAX_FRAME_ID):
+					next = Command._MIN_FRAME_ID
+				if not correlator.isFrameIdPending(frameId):
+					Command.__sendingFrameId = next
+					return frameId
+		raise RuntimeError('All frame IDs are awaiting responses.')
+
+
 	def getFrameId(self):
 		return self.__frameId
 
@@ -152,11 +195,11 @@ class Command(Frame):
 
 
 	def getRemoteNetworkAddress(self):
-		return self.__remoteNetworkAddress
+		return self._remoteNetworkAddress
 
 
 	def getRemoteSerial(self):
-		return self.__remoteSerial
+		return self._remoteSerial
 
 
 	def setStatus(self, status):
@@ -164,11 +207,11 @@ class Command(Frame):
 			raise ValueError(
 				'Status "%s" not None or in STATUS enum.'
 				% status)
-		self.__status = status
+		self._status = status
 
 
 	def getStatus(self):
-		return self.__status
+		return self._status
 
 
 	def setParameter(self, parameter):
@@ -205,39 +248,6 @@ class Command(Frame):
 			% namedStrings)
 
 
-	def _updateFromDict(self, d, usedKeys):
-		"""
-		Parse status, parameter, and any class-specific fields from a
-		response dict.
-		"""
-		Frame._updateFromDict(self, d, usedKeys)
-
-		statusKey = str(Command.FIELD.status)
-		status = d.get(statusKey)
-		if status is not None:
-			status = Command.STATUS[encoding.stringToNumber(status)]
-			self.setStatus(status)
-			usedKeys.add(statusKey)
-
-		paramKey = str(Command.FIELD.parameter)
-		parameter = d.get(paramKey)
-		if parameter is not None:
-			self.parseParameter(parameter)
-			usedKeys.add(paramKey)
-
-		srcKey = str(Command.FIELD.source_addr)
-		src = d.get(srcKey)
-		if src is not None:
-			self.__remoteNetworkAddress = (
-				encoding.stringToNumber(src))
-			usedKeys.add(srcKey)
-
-			srcLongKey = str(Command.FIELD.source_addr_long)
-			self.__remoteSerial = encoding.stringToNumber(
-				d[srcLongKey])
-			usedKeys.add(srcLongKey)
-
-
 	def parseParameter(self, encoded):
 		"""
 		Parse the Command's response parameter into specific datum/data
@@ -274,18 +284,53 @@ class Command(Frame):
 		cls._xbeeSingleton = xb
 
 
-	def send(self, xb=None):
+	@classmethod
+	def setTransmitQueue(cls, transmitQueue):
+		"""
+		@param transmitQueue an xh.transmit.TransmitQueue to send
+			Commands through by default, or None
+		"""
+		cls._transmitQueue = transmitQueue
+
+
+	@classmethod
+	def setXbeeTransmitQueue(cls, xb, transmitQueue):
+		"""
+		@param transmitQueue an xh.transmit.TransmitQueue which
+			writes to the serial port of the Xbee API object xb,
+			to queue Commands sent with xb on, or None
+		"""
+		if transmitQueue is None:
+			cls._xbeeTransmitQueues.pop(xb, None)
+		else:
+			cls._xbeeTransmitQueues[xb] = transmitQueue
+
+
+	def send(self, xb=None, priority=None, onWritten=None):
 		"""
 		Send this Command.
 		@param xb The Xbee API object to use to send the Command. If not
-			provided, tries to send using the Xbee singleton.
-		To use the Xbee singleton, it must have been set using
-		setXbeeSingleton. If the singleton is used, a lock is acquired
-		around sending (and this method is thread-safe), otherwise the
-		caller is responsible for thread safety.
+			provided, the Command is queued on the transmit queue
+			(if set, using setTransmitQueue), and send returns
+			without waiting for it to be written; otherwise it is
+			sent using the Xbee singleton (set using
+			setXbeeSingleton). A Command sent using an Xbee object
+			with a transmit queue (see setXbeeTransmitQueue) is
+			queued on that.
+		@param priority the xh.transmit.PRIORITY to send with, if sent
+			by a transmit queue (default NORMAL)
+		@param onWritten if given, called (with no arguments) once the
+			Command is written to the serial port
+		This method is thread-safe: Commands not queued are sent with a
+		lock held.
 		"""
 		log.debug('sending %s' % self)
 
+		if xb is None and Command._transmitQueue is not None:
+			self.__queue(Command._transmitQueue, priority,
+				onWritten)
+			return
+
 		if xb is None:
 			if Command._xbeeSingleton is None:
 				raise RuntimeError('No xb kwarg provided to '
@@ -295,6 +340,11 @@ class Command(Frame):
 		else:
 			senderXbee = xb
 
+		transmitQueue = Command._xbeeTransmitQueues.get(senderXbee)
+		if transmitQueue is not None:
+			self.__queue(transmitQueue, priority, onWritten)
+			return
+
 		kwargs = {
 			'command': str(self.getName()),
 			'frame_id': self._encodedFrameId(),
@@ -307,12 +357,63 @@ class Command(Frame):
 			sendFn = senderXbee.remote_at
 		else:
 			sendFn = senderXbee.at
+		with Command.__xbeeLock:
+			sendFn(**kwargs)
+		if onWritten is not None:
+			onWritten()
+
+
+	def __queue(self, transmitQueue, priority, onWritten):
+		kwargs = {
+			'destination': self.getRemoteSerial(),
+			'onWritten': onWritten,
+		}
+		if priority is not None:
+			kwargs['priority'] = priority
+		transmitQueue.put(self.getApiFrameData(), **kwargs)
 
-		if senderXbee is Command._xbeeSingleton:
-			with Command.__xbeeSingletonLock:
-				sendFn(**kwargs)
+
+	def getApiFrameData(self):
+		"""
+		@return the API frame data (starting with the API id) to send
+			this Command: an AT Command frame, or a Remote AT
+			Command Request if the Command is remote
+		"""
+		name = str(self.getName())
+		if self.isRemote():
+			header = _REMOTE_AT.pack(_API_ID_REMOTE_AT,
+				self.getFrameId(), self.getRemoteSerial(),
+				_UNKNOWN_NETWORK_ADDRESS, _APPLY_CHANGES, name)
 		else:
-			sendFn(**kwargs)
+			header = _AT.pack(_API_ID_AT, self.getFrameId(), name)
+		return header + (self._encodedParameter() or '')
+
+
+	def sendAsync(self, xb=None, timeoutSeconds=None, priority=None):
+		"""
+		Send this Command (see send), without waiting for its response.
+		@param timeoutSeconds if given, after how long (from when the
+			Command is written) to fail the returned Future with
+			correlator.TimeoutError
+		@return a correlator.Future for the (first) Frame received in
+			response
+		If another Command sent with this one's frame ID is still
+		awaiting its response, this Command takes a new frame ID.
+		"""
+		if correlator.isFrameIdPending(self.getFrameId()):
+			self.__frameId = Command._allocateFrameId()
+		frameId = self.getFrameId()
+		remoteSerial = self.getRemoteSerial()
+		future = correlator.expect(frameId, remoteSerial=remoteSerial,
+			timeoutSeconds=timeoutSeconds, sent=False)
+		onWritten = lambda: correlator.markSent(frameId, remoteSerial,
+			future)
+		try:
+			self.send(xb=xb, priority=priority, onWritten=onWritten)
+		except:
+			future.cancel()
+			raise
+		return future
 
 
 	def _encodedFrameId(self):
@@ -328,18 +429,22 @@ class Command(Frame):
 
 
 	@classmethod
-	def _createFromDict(cls, d, usedKeys):
-		frameIdKey = str(Command.FIELD.frame_id)
-		frameId = d.get(frameIdKey)
-		frameId = encoding.stringToNumber(d[frameIdKey])
-		usedKeys.add(frameIdKey)
-
-		nameKey = str(Command.FIELD.command)
-		name = d.get(nameKey)
+	def _createFromDict(cls, d):
+		frameId = encoding.stringToNumber(d[_FRAME_ID_KEY])
+
+		name = d.get(_NAME_KEY)
 		if name is not None:
 			name = enumutil.fromString(Command.NAME, name)
-			usedKeys.add(nameKey)
 
+		return cls._createResponse(frameId, name)
+
+
+	@staticmethod
+	def _createResponse(frameId, name):
+		"""
+		Create a response Command of the class registered for the given
+		Command.NAME value (or a plain Command).
+		"""
 		commandClass = CommandRegistry.get(name)
 		if commandClass:
 			c = commandClass(responseFrameId=frameId,
@@ -350,6 +455,31 @@ class Command(Frame):
 		return c
 
 
+	@staticmethod
+	def _decodeStatus(encodedStatus):
+		return Command.STATUS[encoding.stringToNumber(encodedStatus)]
+
+
+
+_FRAME_ID_KEY = str(Command.FIELD.frame_id)
+_NAME_KEY = str(Command.FIELD.command)
+
+# The frame id and command name are read by _createFromDict to pick the
+# (sub)class; the parameter is parsed by the Command subclass.
+Command._SCHEMA = Frame._SCHEMA.extend('Command', [
+	Field(Command.FIELD.frame_id),
+	Field(Command.FIELD.command),
+	Field(Command.FIELD.status, attr='_status',
+		convert=Command._decodeStatus, optional=True),
+	Field(Command.FIELD.parameter, method='parseParameter',
+		optional=True),
+	Field(Command.FIELD.source_addr, attr='_remoteNetworkAddress',
+		numBytes=2, optional=True),
+	Field(Command.FIELD.source_addr_long, attr='_remoteSerial',
+		numBytes=8, optional=True),
+])
+
+
 
 CommandRegistry = Registry(Command.NAME)
 CommandRegistry.__doc__ = ('Which Command.NAME is to be parsed '
@@ -10,6 +10,7 @@ class ConfigureIoPin(Command):
 
 	See I/O Commands, pages 133-5 of the Xbee Series 2 Datasheet.
 	"""
+	__slots__ = ('__pinNumber', '__pinName', '__function')
 
 
 	# all available functions, across all pins
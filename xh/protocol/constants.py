@@ -1,4 +1,4 @@
-from .. import util
+from .. import enumutil, util
 from ..deps import Enum
 
 
@@ -19,7 +19,7 @@ DEVICE_TYPE = Enum(
 
 
 # See Xbee Series 2 datasheet page 13 for pin name/number table.
-PIN = Enum(
+PIN = enumutil.InternedEnum(
 	# Digital I/O Pins
 	'DIO0',
 	'DIO1',
@@ -1,11 +1,25 @@
+import array
 import logging
+import struct
 
 from .. import encoding, enumutil
 from ..deps import Enum
-from . import Frame, FrameRegistry, PIN, Registry
+from . import Field, Frame, FrameRegistry, PIN
 
 log = logging.getLogger('xh.protocol.Data')
 
+_EXPECTED_NUM_SETS = 1
+
+# Each sample is encoded compactly as a code for its class and pin (digital
+# pin number n is code n, analog pin number n is code _ANALOG_CODE_BASE + n)
+# and a raw value (0 or 1 for digital pins, API units for analog pins). The
+# arrays' type codes are:
+_CODE_TYPE = 'B'
+_RAW_VALUE_TYPE = 'H'
+_ANALOG_CODE_BASE = 16
+_NUM_CODES = 2 * _ANALOG_CODE_BASE
+_EMPTY_SAMPLE_ARRAYS = (array.array(_CODE_TYPE), array.array(_RAW_VALUE_TYPE))
+
 
 __all__ = [
 	'Data',
@@ -21,6 +35,7 @@ class Data(Frame):
 	"""
 	Automatically sampled values. See SampleRate and VoltageSupplyThreshold.
 	"""
+	__slots__ = ('_sourceAddress', '_sourceAddressLong', '_sampleArrays')
 
 
 	FIELD = Enum(
@@ -34,7 +49,7 @@ class Data(Frame):
 		Frame.__init__(self, frameType=Frame.TYPE.rx_io_data_long_addr)
 		self._sourceAddress = None
 		self._sourceAddressLong = None
-		self._samples = []
+		self._sampleArrays = _EMPTY_SAMPLE_ARRAYS
 
 
 	def getSourceAddress(self):
@@ -46,7 +61,21 @@ class Data(Frame):
 
 
 	def getSamples(self):
-		return list(self._samples)
+		"""
+		@return a new list of Sample objects
+		"""
+		return Sample.createFromArrays(self._sampleArrays)
+
+
+	def getSampleArrays(self):
+		"""
+		Get the samples without creating Sample objects, for bulk
+		consumers.
+		@return (pinNames, values): parallel tuples of the PIN and the
+			value (volts for analog pins, a bool for digital pins)
+			of each sample
+		"""
+		return Sample.valuesFromArrays(self._sampleArrays)
 
 
 	def getNamedValues(self):
@@ -70,34 +99,27 @@ class Data(Frame):
 
 
 	@classmethod
-	def _createFromDict(cls, d, usedKeys):
-		data = cls()
+	def _createFromDict(cls, d):
+		return cls()
 
-		sourceAddrKey = str(cls.FIELD.source_addr)
-		data._sourceAddress = encoding.stringToNumber(d[sourceAddrKey])
-		usedKeys.add(sourceAddrKey)
 
-		sourceAddrLongKey = str(cls.FIELD.source_addr_long)
-		data._sourceAddressLong = encoding.stringToNumber(
-			d[sourceAddrLongKey])
-		usedKeys.add(sourceAddrLongKey)
-
-		samplesKey = str(cls.FIELD.samples)
-		data._samples = []
-		for sd in d[samplesKey]:
-			data._samples += Sample.createFromDict(sd)
-		usedKeys.add(samplesKey)
+	@staticmethod
+	def _decodeSamples(sampleDicts):
+		"""
+		@param sampleDicts a list of dicts of samples, as from the API
+		@return sample arrays (see Sample.arraysFromDicts)
+		"""
+		return Sample.arraysFromDicts(sampleDicts)
 
-		return data
 
 
+class Sample(object):
+	__slots__ = ('__pinName',)
 
-class Sample:
-	PIN_TYPE = Enum(
+	PIN_TYPE = enumutil.InternedEnum(
 		'adc',		# analog sample
 		'dio',		# digital sample
 	)
-	_Registry = Registry(PIN_TYPE)
 
 
 	def __init__(self, pinName):
@@ -135,18 +157,140 @@ class Sample:
 			values (numeric for analog pins; numeric or boolean for
 			digital pins)
 		"""
-		for key, numericValue in d.iteritems():
-			pinTypeStr, pinNum = key.split('-')
-			pinNum = int(pinNum)
-			pinType = enumutil.fromString(cls.PIN_TYPE, pinTypeStr)
+		return iter(cls.createFromArrays(cls.arraysFromDicts([d])))
+
+
+	@staticmethod
+	def arraysFromDicts(sampleDicts):
+		"""
+		@param sampleDicts a list of maps of XBee API sample keys to
+			sample values (see createFromDict)
+		@return (codes, rawValues): parallel arrays of the pin code
+			and raw value of each sample
+		"""
+		codes = array.array(_CODE_TYPE)
+		rawValues = array.array(_RAW_VALUE_TYPE)
+		for d in sampleDicts:
+			for key, numericValue in d.iteritems():
+				code = _SAMPLE_KEY_TO_CODE.get(key)
+				if code is None:
+					raise ValueError(('Sample key %r is not'
+						+ ' one of %s.') % (key,
+						sorted(_SAMPLE_KEY_TO_CODE)))
+				if code < _ANALOG_CODE_BASE and not (
+						numericValue is True
+						or numericValue is False):
+					numericValue = encoding.numberToBoolean(
+						numericValue)
+				codes.append(code)
+				rawValues.append(numericValue)
+		return (codes, rawValues)
+
+
+	@staticmethod
+	def arraysFromEncoded(encoded, offset=0):
+		"""
+		Parse a packed sample set, as sent in an IO Data Sample Rx
+		Indicator frame or an IS response parameter (see page 114 of
+		the Xbee series 2 datasheet for the I/O frame overview, and
+		page 96 for the sample parameter details):
+			offset	description
+			0	number of sample sets (always 1)
+			1-2	digital channel mask (bit field)
+			3	analog channel mask
+			?4-5	digital samples (bit field, matching channels,
+				only present if any digital channels are on)
+			6-7+	optional analog samples (two bytes each)
+		@param offset where the sample set starts within encoded
+		@return (codes, rawValues): parallel arrays of the pin code
+			and raw value of each sample: digital, then analog
+		"""
+		# The number of sample sets is expected to always be 1.
+		numSets = encoding.stringToNumber(encoded[offset:offset+1])
+		if numSets != _EXPECTED_NUM_SETS:
+			raise RuntimeError(('Number of sample sets is expected '
+			+ 'to always be %d, but is %d.')
+			% (_EXPECTED_NUM_SETS, numSets))
+		offset += 1
+
+		digitalPinNumbers = encoding.bitFieldToIndices(
+			encoding.stringToNumber(encoded[offset:offset+2]))
+		offset += 2
+
+		analogPinNumbers = encoding.bitFieldToIndices(
+			encoding.stringToNumber(encoded[offset:offset+1]))
+		offset += 1
+
+		codes = array.array(_CODE_TYPE, digitalPinNumbers)
+		rawValues = array.array(_RAW_VALUE_TYPE)
+		if digitalPinNumbers:
+			digitalOnBits = encoding.stringToNumber(
+				encoded[offset:offset+2])
+			offset += 2
+			rawValues.extend([(digitalOnBits >> pinNum) & 1
+				for pinNum in digitalPinNumbers])
+
+		numAnalog = min(len(analogPinNumbers),
+			(len(encoded) - offset) / 2)
+		codes.extend([_ANALOG_CODE_BASE + pinNum
+			for pinNum in analogPinNumbers[:numAnalog]])
+		rawValues.extend(struct.unpack_from('>%dH' % numAnalog,
+			encoded, offset))
+
+		for code in codes:
+			if _CODE_ENTRIES[code] is None:
+				raise ValueError('No pin for sample code %d.'
+					% code)
+		return (codes, rawValues)
+
+
+	@staticmethod
+	def createFromEncoded(encoded, offset=0):
+		"""
+		Parse a packed sample set (see arraysFromEncoded).
+		@return a list of Samples: digital, then analog
+		"""
+		return Sample.createFromArrays(
+			Sample.arraysFromEncoded(encoded, offset))
+
+
+	@staticmethod
+	def createFromArrays(sampleArrays):
+		"""
+		@param sampleArrays (codes, rawValues), as from arraysFromDicts
+			or arraysFromEncoded
+		@return a list of Sample objects
+		"""
+		codes, rawValues = sampleArrays
+		samples = []
+		for code, rawValue in zip(codes, rawValues):
+			sampleClass, pinName, convert = _CODE_ENTRIES[code]
+			samples.append(sampleClass(pinName, convert(rawValue)))
+		return samples
 
-			concreteClass = cls._Registry.get(pinType)
-			yield concreteClass.createFromRawValues(
-				pinNum, numericValue)
+
+	@staticmethod
+	def valuesFromArrays(sampleArrays):
+		"""
+		@param sampleArrays (codes, rawValues), as from arraysFromDicts
+			or arraysFromEncoded
+		@return (pinNames, values): parallel tuples of the PIN and the
+			value (volts, or a bool) of each sample
+		"""
+		codes, rawValues = sampleArrays
+		pinNames = []
+		values = []
+		for code, rawValue in zip(codes, rawValues):
+			sampleClass, pinName, convert = _CODE_ENTRIES[code]
+			pinNames.append(pinName)
+			values.append(convert(rawValue))
+		return (tuple(pinNames), tuple(values))
 
 
 
 class AnalogSample(Sample):
+	__slots__ = ('__volts',)
+
 	_PIN_NUM_VCC = 7
 
 
@@ -171,21 +315,11 @@ class AnalogSample(Sample):
 		return 'volts=%.3f' % self.getVolts()
 
 
-	@classmethod
-	def createFromRawValues(cls, pinNum, numericValue):
-		v = encoding.numberToVolts(numericValue)
-		if pinNum == cls._PIN_NUM_VCC:
-			pinName = PIN.VCC
-		else:
-			pinName = enumutil.fromString(PIN, 'AD%d' % pinNum)
-		return cls(pinName, v)
-
-
-Sample._Registry.put(Sample.PIN_TYPE.adc, AnalogSample)
 
+class DigitalSample(Sample):
+	__slots__ = ('__isSet',)
 
 
-class DigitalSample(Sample):
 	def __init__(self, pinName, isSet):
 		Sample.__init__(self, pinName)
 		self.__isSet = bool(isSet)
@@ -202,17 +336,48 @@ class DigitalSample(Sample):
 		return str(self.getIsSet())
 
 
-	@classmethod
-	def createFromRawValues(cls, pinNum, numericValue):
-		pinName = enumutil.fromString(PIN, 'DIO%d' % pinNum)
-		if numericValue in (True, False):
-			bit = numericValue
+
+def _buildCodeTables():
+	"""
+	@return (entries, keyToCode): for each sample code, the Sample class,
+		PIN and function from raw value to value (or None for codes of
+		no pin); and a map of XBee API sample keys to codes
+	"""
+	entries = [None] * _NUM_CODES
+	keyToCode = {}
+	for pinNum in range(_ANALOG_CODE_BASE):
+		pinName = 'DIO%d' % pinNum
+		if pinName in PIN:
+			entries[pinNum] = (DigitalSample,
+				PIN.fromString(pinName), bool)
+			key = '%s-%d' % (Sample.PIN_TYPE.dio, pinNum)
+			keyToCode[key] = pinNum
+
+		if pinNum == AnalogSample._PIN_NUM_VCC:
+			pinName = str(PIN.VCC)
 		else:
-			bit = encoding.numberToBoolean(numericValue)
-		return cls(pinName, bit)
+			pinName = 'AD%d' % pinNum
+		if pinName in PIN:
+			code = _ANALOG_CODE_BASE + pinNum
+			entries[code] = (AnalogSample, PIN.fromString(pinName),
+				encoding.numberToVolts)
+			key = '%s-%d' % (Sample.PIN_TYPE.adc, pinNum)
+			keyToCode[key] = code
+	return (tuple(entries), keyToCode)
+
+
+_CODE_ENTRIES, _SAMPLE_KEY_TO_CODE = _buildCodeTables()
+
 
 
-Sample._Registry.put(Sample.PIN_TYPE.dio, DigitalSample)
+Data._SCHEMA = Frame._SCHEMA.extend('Data', [
+	Field(Data.FIELD.source_addr, attr='_sourceAddress', numBytes=2),
+	Field(Data.FIELD.source_addr_long, attr='_sourceAddressLong',
+		numBytes=8),
+	Field(Data.FIELD.samples, attr='_sampleArrays',
+		convert=Data._decodeSamples),
+])
+Data._LAZY_DICT_DECODERS = Data._SCHEMA.getLazyDecoders()
 
 
 
@@ -7,6 +7,7 @@ class EncryptionEnable(Command):
 	"""
 	Whether network encryption is enabled.
 	"""
+	__slots__ = ('__enabled',)
 
 
 	def __init__(self, **kwargs):
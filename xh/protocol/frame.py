@@ -1,14 +1,20 @@
 import datetime
-from .. import encoding
+import time
+from .. import encoding, enumutil
 from ..deps import Enum
-from . import Registry
+from . import Field, Registry, Schema
 
 
 
-class Frame:
+class Frame(object):
+	# Many frames may be held at once (as received history or in queues),
+	# so Frame classes declare __slots__ rather than having an instance
+	# __dict__. Each subclass must declare __slots__ (if only as ()).
+	__slots__ = ('__frameType', '_options', '_timestamp', '_lazy', '_radio')
+
 	# ZigBee Mesh frame types, matching the xbee library's names.
 	# See: http://code.google.com/p/python-xbee/source/browse/xbee/zigbee.py
-	TYPE = Enum(
+	TYPE = enumutil.InternedEnum(
 		'at',				# 0x08 in XBee API
 		# AT command (queued)		# 0x09
 		# Remote Command Request	# 0x17
@@ -41,19 +47,34 @@ class Frame:
 		'BROADCAST',
 	)
 
+	# Set by subclasses which support lazy decoding from API dicts to a
+	# dict of field attribute name to decoder (see _createLazy).
+	_LAZY_DICT_DECODERS = None
+
 
 	def __init__(self, frameType=None):
 		if not (frameType is None or frameType in self.TYPE):
 			raise ValueError(('Frame type %s is neither None nor '
 				+ 'one of the TYPE enum values.') % frameType)
 		self.__frameType = frameType
-		self.__options = None
-		self._timestamp = datetime.datetime.utcnow()
+		self._options = None
+		self._timestamp = time.time()
+		self._lazy = None
+		self._radio = None
 
 
 	def getTimestamp(self):
 		"""
-		@return the UTC creation timestamp of the sample data
+		@return the UTC creation timestamp of the sample data, as a
+			datetime
+		"""
+		return datetime.datetime.utcfromtimestamp(self._timestamp)
+
+
+	def getTimestampSeconds(self):
+		"""
+		@return the creation timestamp of the sample data, in seconds
+			since the epoch (as from time.time)
 		"""
 		return self._timestamp
 
@@ -63,53 +84,101 @@ class Frame:
 
 
 	def getOptions(self):
-		return self.__options
+		return self._options
+
+
+	def setRadio(self, radio):
+		self._radio = radio
+
+
+	def getRadio(self):
+		"""
+		@return the xh.radios.LocalRadio which received this Frame, or
+			None
+		"""
+		return self._radio
 
 
 	@classmethod
-	def createFromDict(cls, d, usedKeys):
+	def createFromDict(cls, d, lazy=False):
 		"""
-		Create a new instance of a Frame subclass. This calls protected
-		methods which subclasses should/may override.
-		@see _createFromDict, _updateFromDict
+		Create a new instance of a Frame subclass: _createFromDict makes
+		the instance, then the class's compiled _SCHEMA decodes the
+		fields of the API dict onto it.
 		@param d an API dict from which to draw values
-		@param usedKeys a set to which to add the names of any used
-			keys, naming keys for values from the API dict
+		@param lazy if True, and the class supports it (has
+			_LAZY_DICT_DECODERS), decode each field only when it
+			is first accessed (see _createLazy); the fields are
+			still checked now (see Schema.check)
 		"""
-		frame = cls._createFromDict(d, usedKeys)
-		frame._updateFromDict(d, usedKeys)
+		if lazy and cls._LAZY_DICT_DECODERS is not None:
+			cls._SCHEMA.check(d)
+			return cls._createLazy(
+				Frame.TYPE.fromString(d[_FRAME_TYPE_KEY]),
+				d, cls._LAZY_DICT_DECODERS)
+		return cls._SCHEMA.decode(cls._createFromDict(d), d)
+
+
+	@classmethod
+	def _createLazy(cls, frameType, encoded, decoders):
+		"""
+		Create an instance of a Frame subclass whose fields are left
+		unset (so __init__ is not called), to be decoded from the
+		encoded frame when first accessed, and then kept. The caller
+		checks that encoded holds every field.
+		@param encoded an API dict, or API frame data
+		@param decoders a dict from the name of every field attribute
+			of the class to a function which decodes its value from
+			encoded
+		"""
+		frame = cls.__new__(cls)
+		frame.__frameType = frameType
+		frame._timestamp = time.time()
+		frame._lazy = (encoded, decoders)
+		frame._radio = None
 		return frame
 
 
+	def __getattr__(self, name):
+		"""
+		Decode (and keep) a field of a lazily created Frame. This is
+		only called for attributes which are not set.
+		"""
+		if name != '_lazy' and self._lazy is not None:
+			encoded, decoders = self._lazy
+			decode = decoders.get(name)
+			if decode is not None:
+				value = decode(encoded)
+				setattr(self, name, value)
+				return value
+		raise AttributeError('%r object has no attribute %r'
+			% (type(self).__name__, name))
+
+
 	@classmethod
-	def _createFromDict(cls, d, usedKeys):
+	def getDictKeys(cls):
 		"""
-		Create a new instance of a Frame subclass. Frame subclasses
-		must override this.
-		@param d an API dict from which to initialize the frame
-		@param usedKeys a set to which to add any keys used; key names
-			are those in the API dict which are read
+		@return a frozenset of all the API dict keys which this class
+			may use in createFromDict
 		"""
-		raise NotImplementedError()
+		return cls._SCHEMA.getKeys()
 
 
-	def _updateFromDict(self, d, usedKeys):
+	@classmethod
+	def _createFromDict(cls, d):
 		"""
-		Update this Frame with any recognized data in an API dict.
-		Subclasses may override (and call) this.
-		@param d data from the xbee Python API, unprocessed
-		@param usedKeys a set to update with any keys from the API dict
-			which were used
+		Create a new instance of a Frame subclass, to be filled in from
+		the given API dict. Frame subclasses must override this.
+		@param d an API dict, from which to read any values needed to
+			construct the Frame (which should be declared in the
+			class's _SCHEMA)
 		"""
-		optionsKey = str(Frame.FIELD.options)
-		optionsStr = d.get(optionsKey)
-		if optionsStr is not None:
-			self._parseOptions(optionsStr)
-			usedKeys.add(optionsKey)
+		raise NotImplementedError()
 
 
-	def _parseOptions(self, encodedOptions):
-		self.__options = Frame.OPTIONS[
+	@staticmethod
+	def _decodeOptions(encodedOptions):
+		return Frame.OPTIONS[
 			encoding.stringToNumber(encodedOptions) - 1]
 
 
@@ -146,5 +215,16 @@ class Frame:
 
 
 
+_FRAME_TYPE_KEY = str(Frame.FIELD.id)
+
+# Fields common to all frames. The frame type is read by ParseFromDict.
+Frame._SCHEMA = Schema('Frame', [
+	Field(Frame.FIELD.id),
+	Field(Frame.FIELD.options, attr='_options',
+		convert=Frame._decodeOptions, optional=True),
+])
+
+
+
 FrameRegistry = Registry(Frame.TYPE)
 FrameRegistry.__doc__ = 'Which Frame.TYPE is to be parsed by which class.'
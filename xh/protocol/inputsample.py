@@ -1,7 +1,6 @@
 import logging
 
-from .. import encoding
-from . import AnalogSample, Command, CommandRegistry, DigitalSample
+from . import Command, CommandRegistry, Sample
 
 log = logging.getLogger('InputSample')
 
@@ -16,76 +15,42 @@ class InputSample(Command):
 	Note that sleeping devices will not wait before sampling upon receipt of
 	this command (see also NumberOfSleepPeriods and WakeHostTimer).
 	"""
-	_EXPECTED_NUM_SETS = 1
+	__slots__ = ('__sampleArrays',)
 
 
 	def __init__(self, **kwargs):
 		Command.__init__(self, Command.NAME.IS, **kwargs)
-		self.__samples = None
+		self.__sampleArrays = None
 
 
 	def getSamples(self):
-		return self.__samples and list(self.__samples)
+		"""
+		@return a new list of Sample objects, or None if this is not a
+			response
+		"""
+		if self.__sampleArrays is None:
+			return None
+		return Sample.createFromArrays(self.__sampleArrays)
+
+
+	def getSampleArrays(self):
+		"""
+		@return (pinNames, values), as from Data.getSampleArrays, or
+			None if this is not a response
+		"""
+		if self.__sampleArrays is None:
+			return None
+		return Sample.valuesFromArrays(self.__sampleArrays)
 
 
 	def parseParameter(self, encoded):
 		"""
 		Parse the Command's response parameter into samples. The
-		expected format is like the IO Data Sample Rx Indicator frame
-		(see page 114 of the Xbee series 2 datasheet for the I/O frame
-		overview, and page 96 for the sample parameter details):
-			offset	description
-			0	receive options: 0x01 = ack, 0x02 = broadcast
-			1-2	digital channel mask (bit field)
-			3	analog channel mask
-			?4-5	digital samples (bit field, matching channels,
-				only present if any digital channels are on)
-			6-7+	optional analog samples (two bytes each)
+		expected format is like the IO Data Sample Rx Indicator frame;
+		see Sample.arraysFromEncoded.
 		"""
 		self.setParameter(encoded)
-		self.__samples = []
-		offset = 0
-
-		# The number of sample sets is expected to always be 1.
-		numSets = encoding.stringToNumber(encoded[offset:offset+1])
-		if numSets != self._EXPECTED_NUM_SETS:
-			raise RuntimeError(('Number of sample sets is expected '
-			+ 'to always be %d, but is %d.')
-			% (self._EXPECTED_NUM_SETS, numSets))
-		offset += 1
-
-		digitalPinNumbers = encoding.bitFieldToIndexSet(
-			encoding.stringToNumber(encoded[offset:offset+2]))
-		offset += 2
-
-		analogPinNumbers = sorted(encoding.bitFieldToIndexSet(
-			encoding.stringToNumber(encoded[offset:offset+1])))
-		offset += 1
-
-		if digitalPinNumbers:
-			digitalOnValues = encoding.bitFieldToIndexSet(
-				encoding.stringToNumber(
-					encoded[offset:offset+2]))
-			offset += 2
-		else:
-			digitalOnValues = set()
-
-		analogValues = []
-		while offset + 2 <= len(encoded):
-			analogValues.append(encoding.stringToNumber(
-				encoded[offset:offset+2]))
-			offset += 2
-
-		for digitalPinNum in digitalPinNumbers:
-			digitalValue = digitalPinNum in digitalOnValues
-			self.__samples.append(DigitalSample.createFromRawValues(
-				digitalPinNum, digitalValue))
-
-		for analogPinNum, analogValueNum in zip(
-				analogPinNumbers, analogValues):
-			analogSample = AnalogSample.createFromRawValues(
-				analogPinNum, analogValueNum)
-			self.__samples.append(analogSample)
+		self.__sampleArrays = Sample.arraysFromEncoded(encoded)
 
 
 	def getNamedValues(self):
@@ -7,6 +7,7 @@ class InputVolts(Command):
 	"""
 	The voltage level on the Vcc pin.
 	"""
+	__slots__ = ('__volts',)
 
 
 	def __init__(self, **kwargs):
@@ -4,6 +4,9 @@ from . import Command, CommandRegistry, DEVICE_TYPE, NodeId
 
 
 class NodeDiscover(Command):
+	__slots__ = ('__nodeId',)
+
+
 	def __init__(self, **kwargs):
 		Command.__init__(self, Command.NAME.ND, **kwargs)
 		self.__nodeId = NodeId()
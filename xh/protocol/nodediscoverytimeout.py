@@ -7,6 +7,8 @@ class NodeDiscoveryTimeout(NumberCommand):
 	The timeout after a NodeDiscover command is sent within which all nodes
 	must respond. See page 130 of the Xbee series 2 datasheet.
 	"""
+	__slots__ = ()
+
 	_MIN = 0x20
 	_MAX = 0xFF
 	_EXTERNAL_PER_INTERNAL = 100
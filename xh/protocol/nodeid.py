@@ -1,10 +1,24 @@
 from .. import encoding
 from ..deps import Enum
-from . import DEVICE_TYPE, Frame, FrameRegistry
+from . import DEVICE_TYPE, Field, Frame, FrameRegistry
 
 
 
 class NodeId(Frame):
+	__slots__ = (
+		'_networkAddress',
+		'_serial',
+		'_nodeIdentifier',
+		'_parentNetworkAddress',
+		'_deviceType',
+		'_statusFromReserved',
+		'_profileId',
+		'_manufacturerId',
+		'_sourceEvent',
+		'_senderNetworkAddress',
+		'_senderSerial',
+	)
+
 	# The fields expected to be in a node ID dict.
 	FIELD = Enum(
 		# ASCII name
@@ -60,86 +74,47 @@ class NodeId(Frame):
 	def __init__(self):
 		Frame.__init__(self, frameType=Frame.TYPE.node_id_indicator)
 
-		self.__networkAddress = None
-		self.__serial = None
-		self.__nodeIdentifier = None
-		self.__parentNetworkAddress = None
-		self.__deviceType = None
-		self.__statusFromReserved = None
-		self.__profileId = None
-		self.__manufacturerId = None
+		self._networkAddress = None
+		self._serial = None
+		self._nodeIdentifier = None
+		self._parentNetworkAddress = None
+		self._deviceType = None
+		self._statusFromReserved = None
+		self._profileId = None
+		self._manufacturerId = None
 
 		# only set for a Node ID event, not as part of NodeDiscover
-		self.__sourceEvent = None
-		self.__senderNetworkAddress = None
-		self.__senderSerial = None
+		self._sourceEvent = None
+		self._senderNetworkAddress = None
+		self._senderSerial = None
 
 
 	@classmethod
-	def _createFromDict(cls, d, usedKeys):
-		id = NodeId()
-		return id
-
-
-	def _updateFromDict(self, d, usedKeys):
-		Frame._updateFromDict(self, d, usedKeys)
-
-		nodeIdKey = str(NodeId.FIELD.node_id)
-		self.setNodeIdentifier(d[nodeIdKey])
-		usedKeys.add(nodeIdKey)
-
-		parentAddrKey = str(NodeId.FIELD.parent_source_addr)
-		self.setParentNetworkAddress(
-			encoding.stringToNumber(d[parentAddrKey]))
-		usedKeys.add(parentAddrKey)
-
-		deviceTypeKey = str(NodeId.FIELD.device_type)
-		self.setDeviceType(DEVICE_TYPE[
-			encoding.stringToNumber(d[deviceTypeKey])])
-		usedKeys.add(deviceTypeKey)
+	def _createFromDict(cls, d):
+		return cls()
 
-		profileKey = str(NodeId.FIELD.digi_profile_id)
-		self.setProfileId(encoding.stringToNumber(d[profileKey]))
-		usedKeys.add(profileKey)
 
-		manuKey = str(NodeId.FIELD.manufacturer_id)
-		self.setManufacturerId(encoding.stringToNumber(d[manuKey]))
-		usedKeys.add(manuKey)
+	@staticmethod
+	def _decodeDeviceType(encodedType):
+		return DEVICE_TYPE[encoding.stringToNumber(encodedType)]
 
-		srcKey = str(NodeId.FIELD.source_event)
-		self.setSourceEvent(NodeId.EVENT[
-			encoding.stringToNumber(d[srcKey]) - 1])
-		usedKeys.add(srcKey)
 
-		addrKey = str(NodeId.FIELD.source_addr)
-		self.setNetworkAddress(encoding.stringToNumber(d[addrKey]))
-		usedKeys.add(addrKey)
-
-		serKey = str(NodeId.FIELD.source_addr_long)
-		self.setSerial(encoding.stringToNumber(d[serKey]))
-		usedKeys.add(serKey)
-
-		sAddrKey = str(NodeId.FIELD.sender_addr)
-		self.setSenderNetworkAddress(
-			encoding.stringToNumber(d[sAddrKey]))
-		usedKeys.add(sAddrKey)
-
-		sSerKey = str(NodeId.FIELD.sender_addr_long)
-		self.setSenderSerial(encoding.stringToNumber(d[sSerKey]))
-		usedKeys.add(sSerKey)
+	@staticmethod
+	def _decodeSourceEvent(encodedEvent):
+		return NodeId.EVENT[encoding.stringToNumber(encodedEvent) - 1]
 
 
 	def setNetworkAddress(self, networkAddress):
-		self.__networkAddress = int(networkAddress)
+		self._networkAddress = int(networkAddress)
 
 
 	def getNetworkAddress(self):
 		"""The (original transmitter's) 16-bit network address."""
-		return self.__networkAddress
+		return self._networkAddress
 
 
 	def setSerial(self, serial):
-		self.__serial = int(serial)
+		self._serial = int(serial)
 
 
 	def getSerial(self):
@@ -147,20 +122,20 @@ class NodeId(Frame):
 		The (original transmitter's) 64-bit network address /
 		serial number.
 		"""
-		return self.__serial
+		return self._serial
 
 
 	def setSenderNetworkAddress(self, addr):
-		self.__senderNetworkAddress = int(addr)
+		self._senderNetworkAddress = int(addr)
 
 
 	def getSenderNetworkAddress(self):
 		"""The Node ID frame sender's 16-bit network address."""
-		return self.__senderNetworkAddress
+		return self._senderNetworkAddress
 
 
 	def setSenderSerial(self, serial):
-		self.__senderSerial = int(serial)
+		self._senderSerial = int(serial)
 
 
 	def getSenderSerial(self):
@@ -168,69 +143,69 @@ class NodeId(Frame):
 		The Node ID frame sender's 64-bit network address /
 		serial number.
 		"""
-		return self.__senderSerial
+		return self._senderSerial
 
 
 	def setNodeIdentifier(self, nodeIdentifier):
-		self.__nodeIdentifier = str(nodeIdentifier)
+		self._nodeIdentifier = str(nodeIdentifier)
 
 
 	def getNodeIdentifier(self):
-		return self.__nodeIdentifier
+		return self._nodeIdentifier
 
 
 	def setParentNetworkAddress(self, pna):
-		self.__parentNetworkAddress = int(pna)
+		self._parentNetworkAddress = int(pna)
 
 
 	def getParentNetworkAddress(self):
-		return self.__parentNetworkAddress
+		return self._parentNetworkAddress
 
 
 	def setDeviceType(self, deviceType):
 		if not (deviceType is None or deviceType in DEVICE_TYPE):
 			raise ValueError('Device type %s is not in %s.' %
 				(deviceType, DEVICE_TYPE))
-		self.__deviceType = deviceType
+		self._deviceType = deviceType
 
 
 	def getDeviceType(self):
-		return self.__deviceType
+		return self._deviceType
 
 
 	def setStatusFromReserved(self, status):
-		self.__statusFromReserved = status
+		self._statusFromReserved = status
 
 
 	def getStatusFromReserved(self):
-		return self.__statusFromReserved
+		return self._statusFromReserved
 
 
 	def setProfileId(self, profileId):
-		self.__profileId = int(profileId)
+		self._profileId = int(profileId)
 
 
 	def getProfileId(self):
-		return self.__profileId
+		return self._profileId
 
 
 	def setManufacturerId(self, manufacturerId):
-		self.__manufacturerId = int(manufacturerId)
+		self._manufacturerId = int(manufacturerId)
 
 
 	def getManufacturerId(self):
-		return self.__manufacturerId
+		return self._manufacturerId
 
 
 	def setSourceEvent(self, event):
 		if not (event is None or event in NodeId.EVENT):
 			raise ValueError('Source event %s is not in %s.' %
 				(event, NodeId.EVENT))
-		self.__sourceEvent = event
+		self._sourceEvent = event
 
 
 	def getSourceEvent(self):
-		return self.__sourceEvent
+		return self._sourceEvent
 
 
 	def getNamedValues(self):
@@ -259,4 +234,27 @@ class NodeId(Frame):
 		return 'NodeId%s' % (values or ' (empty)')
 
 
+NodeId._SCHEMA = Frame._SCHEMA.extend('NodeId', [
+	Field(NodeId.FIELD.node_id, attr='_nodeIdentifier', convert=str),
+	Field(NodeId.FIELD.parent_source_addr, attr='_parentNetworkAddress',
+		numBytes=2),
+	Field(NodeId.FIELD.device_type, attr='_deviceType',
+		convert=NodeId._decodeDeviceType),
+	Field(NodeId.FIELD.digi_profile_id, attr='_profileId', numBytes=2),
+	Field(NodeId.FIELD.manufacturer_id, attr='_manufacturerId',
+		numBytes=2),
+	Field(NodeId.FIELD.source_event, attr='_sourceEvent',
+		convert=NodeId._decodeSourceEvent),
+	Field(NodeId.FIELD.source_addr, attr='_networkAddress', numBytes=2),
+	Field(NodeId.FIELD.source_addr_long, attr='_serial', numBytes=8),
+	Field(NodeId.FIELD.sender_addr, attr='_senderNetworkAddress',
+		numBytes=2),
+	Field(NodeId.FIELD.sender_addr_long, attr='_senderSerial',
+		numBytes=8),
+])
+NodeId._LAZY_DICT_DECODERS = NodeId._SCHEMA.getLazyDecoders(
+	defaults=['_statusFromReserved'])
+
+
+
 FrameRegistry.put(Frame.TYPE.node_id_indicator, NodeId)
@@ -7,6 +7,8 @@ class NumberCommand(Command):
 	"""
 	Base for a Command that sets/reads a single number.
 	"""
+	__slots__ = ('__name', '__getterName', '__num')
+
 	# to be overridden by subclasses
 	_MIN = 0
 	_MAX = 0xFFFF
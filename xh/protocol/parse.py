@@ -1,11 +1,171 @@
 import logging
+import threading
 
 from .. import encoding, enumutil
-from . import Command, CommandRegistry, Data, Frame, FrameRegistry, NodeId
+from ..deps import Enum
+from . import Frame, FrameRegistry
 
 
 log = logging.getLogger('ParsedFromDict')
 
+_FRAME_TYPE_KEY = str(Frame.FIELD.id)
+
+
+# How ParseFromDict checks API dicts for keys which no Frame class uses.
+KEY_AUDIT = Enum(
+	'ALL',		# check every frame and warn each time (for development)
+	'FIRST_N',	# check only the first n frames of each frame type
+	'SAMPLED',	# check one of every n frames of each frame type
+	'NONE',		# never check
+)
+DEFAULT_KEY_AUDIT = KEY_AUDIT.FIRST_N
+DEFAULT_KEY_AUDIT_FRAMES = 10
+
+_lazyDecoding = False
+
+
+
+class _KeyAuditor:
+	"""
+	Decide which parsed frames to check for unused API dict keys, and keep
+	aggregate counts of the unused keys found.
+
+	Frame counts are updated without locking, so under concurrent parsing
+	the frames checked are approximately (not exactly) those the mode
+	describes; the unused key counts are exact.
+	"""
+
+
+	def __init__(self):
+		self.__lock = threading.Lock()
+		self.__unusedCounts = {}
+		self.setMode(DEFAULT_KEY_AUDIT, DEFAULT_KEY_AUDIT_FRAMES)
+
+
+	def setMode(self, mode, numFrames):
+		if mode not in KEY_AUDIT:
+			raise ValueError('Key audit mode %r is not in %s.'
+				% (mode, KEY_AUDIT))
+		if numFrames < 1:
+			raise ValueError('Number of frames %r must be >= 1.'
+				% numFrames)
+		self.__mode = mode
+		self.__numFrames = numFrames
+		self.__frameCounts = {}
+
+
+	def getMode(self):
+		return self.__mode
+
+
+	def isDue(self, frameType):
+		"""
+		@return whether the next frame of the given type should be
+			checked for unused keys
+		"""
+		mode = self.__mode
+		if mode is KEY_AUDIT.ALL:
+			return True
+		elif mode is KEY_AUDIT.NONE:
+			return False
+		count = self.__frameCounts.get(frameType, 0)
+		if mode is KEY_AUDIT.FIRST_N:
+			if count >= self.__numFrames:
+				return False
+			self.__frameCounts[frameType] = count + 1
+			return True
+		self.__frameCounts[frameType] = count + 1
+		return count % self.__numFrames == 0
+
+
+	def audit(self, frame, d, usedKeys):
+		"""
+		Count any keys of the API dict which are not in usedKeys. In
+		KEY_AUDIT.ALL mode, warn about every frame with unused keys;
+		otherwise warn only the first time each key goes unused.
+		"""
+		unusedKeys = set(d.keys()).difference(usedKeys)
+		if not unusedKeys:
+			return
+		frameType = frame.getFrameType()
+		newKeys = []
+		with self.__lock:
+			for k in unusedKeys:
+				countKey = (str(frameType), k)
+				count = self.__unusedCounts.get(countKey, 0)
+				if count == 0:
+					newKeys.append(k)
+				self.__unusedCounts[countKey] = count + 1
+		if newKeys or self.__mode is KEY_AUDIT.ALL:
+			unused = {}
+			for k in unusedKeys:
+				unused[k] = d[k]
+			log.warning('In parsing %s, did not use %s.'
+				% (frame, unused))
+
+
+	def getUnusedCounts(self):
+		with self.__lock:
+			return dict(self.__unusedCounts)
+
+
+	def resetUnusedCounts(self):
+		with self.__lock:
+			self.__unusedCounts = {}
+
+
+_keyAuditor = _KeyAuditor()
+
+
+def setKeyAuditing(mode, numFrames=DEFAULT_KEY_AUDIT_FRAMES):
+	"""
+	Set how ParseFromDict checks for unused API dict keys.
+	@param mode a KEY_AUDIT value. Use KEY_AUDIT.ALL during development to
+		check (and warn about) every frame.
+	@param numFrames for KEY_AUDIT.FIRST_N, how many frames of each type to
+		check; for KEY_AUDIT.SAMPLED, check one of every numFrames
+	"""
+	_keyAuditor.setMode(mode, numFrames)
+
+
+def getUnusedKeyCounts():
+	"""
+	@return a dict of (frame type name, API dict key) to the number of
+		audited frames in which that key went unused
+	"""
+	return _keyAuditor.getUnusedCounts()
+
+
+def resetUnusedKeyCounts():
+	_keyAuditor.resetUnusedCounts()
+
+
+def logUnusedKeyCounts():
+	"""
+	Log a summary of the unused keys found by auditing (if any).
+	"""
+	counts = getUnusedKeyCounts()
+	if not counts:
+		return
+	summary = 'Unused API dict keys (in audited frames):'
+	for (frameType, key), count in sorted(counts.iteritems()):
+		summary += '\n\t%s %s: %d' % (frameType, key, count)
+	log.warning(summary)
+
+
+def setLazyDecoding(lazy):
+	"""
+	Set whether parsing creates frames (of the classes which support it)
+	which decode each field only when it is first accessed. Frames which no
+	receiver inspects then cost little more than their creation.
+	"""
+	global _lazyDecoding
+	_lazyDecoding = bool(lazy)
+
+
+def isLazyDecoding():
+	return _lazyDecoding
+
 
 def ParseFromDictSafe(d):
 	"""
@@ -23,28 +183,21 @@ def ParseFromDictSafe(d):
 def ParseFromDict(d):
 	"""
 	Parse common fields from a response dict and create a Frame of the
-	appropriate class.
+	appropriate class. Depending on the key auditing mode (see
+	setKeyAuditing), the dict may be checked for unused keys; and with lazy
+	decoding (see setLazyDecoding), fields may be left to be decoded when
+	first accessed.
 	"""
-	usedKeys = set()
-
-	frameTypeKey = str(Frame.FIELD.id)
-	frameType = enumutil.fromString(Frame.TYPE, d[frameTypeKey])
-	usedKeys.add(frameTypeKey)
+	frameType = enumutil.fromString(Frame.TYPE, d[_FRAME_TYPE_KEY])
 
 	frameClass = FrameRegistry.get(frameType)
 	if frameClass is None:
 		raise RuntimeError(('No Frame subclass to handle parsing '
 			+ 'Frame.TYPE.%s. Data to parse: %s') % (frameType, d))
 
-	frame = frameClass.createFromDict(d, usedKeys)
+	frame = frameClass.createFromDict(d, lazy=_lazyDecoding)
 
-	unusedKeys = set(d.keys()).difference(usedKeys)
-	if unusedKeys:
-		unused = {}
-		for k in unusedKeys:
-			unused[k] = d[k]
-		log.warning('In parsing %s, did not use %s.' % (frame, unused))
+	if _keyAuditor.isDue(frameType):
+		_keyAuditor.audit(frame, d, frameClass.getDictKeys())
 
 	return frame
-
-
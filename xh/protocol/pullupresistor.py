@@ -14,6 +14,7 @@ class PullUpResistor(Command):
 
 	See Xbee Series 2 datasheet, page 135.
 	"""
+	__slots__ = ('__bitField',)
 
 
 	_PIN_NUMBER_ORDER = (
@@ -83,7 +84,7 @@ class PullUpResistor(Command):
 		if b is None:
 			return None
 		return set([self._PIN_NUMBER_ORDER[i] for i in
-			encoding.bitFieldToIndexSet(b)])
+			encoding.bitFieldToIndices(b)])
 
 
 	def getPinNamesFromBitField(self):
@@ -101,7 +102,7 @@ class PullUpResistor(Command):
 		d = Command.getNamedValues(self, includeParameter=False)
 		pins = self.getPinNamesFromBitField()
 		if pins is not None:
-			pins = [str(p) for p in pins]
+			pins = [str(p) for p in sorted(pins)]
 		d.update({
 			'bitField': self.getBitField(),
 			'enabledPins': pins,
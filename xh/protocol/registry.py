@@ -8,6 +8,9 @@ class Registry:
 	"""
 	A dict with guards to ensure that a key is only inserted once, and that
 	keys must all be members of a particular collection.
+
+	Once all entries are registered, a Registry may be frozen; lookups then
+	go straight to the underlying dict, without checking the name.
 	"""
 	def __init__(self, names):
 		"""
@@ -16,6 +19,7 @@ class Registry:
 		"""
 		self.__names = names
 		self.__registry = {}
+		self.__frozen = False
 
 
 	def _checkName(self, name):
@@ -29,6 +33,9 @@ class Registry:
 		Set the value for the given name (key).
 		@param name a value from the names given at Registry creation.
 		"""
+		if self.__frozen:
+			raise RuntimeError(('Registry is frozen; cannot add an '
+				+ 'entry for %s: %s.') % (name, value))
 		self._checkName(name)
 		if name in self.__registry:
 			raise RuntimeError(('Command registry already has an '
@@ -44,3 +51,17 @@ class Registry:
 		self._checkName(name)
 		return self.__registry.get(name)
 
+
+	def freeze(self):
+		"""
+		Disallow any further entries, and make get a plain dict lookup
+		(which does not check that the name is valid, and so returns
+		None for any unregistered or invalid name).
+		"""
+		self.__frozen = True
+		self.get = self.__registry.get
+
+
+	def isFrozen(self):
+		return self.__frozen
+
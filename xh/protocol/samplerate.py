@@ -7,6 +7,8 @@ class SampleRate(Command):
 	The IO sample rate, for periodic sampling, used if at least one digital
 	or analog pin has sampling enabled.
 	"""
+	__slots__ = ('__rate', '__disabled')
+
 	RATE_DISABLED = 0
 	RATE_MIN = 0x32
 	RATE_MAX = 0xFFFF
@@ -0,0 +1,242 @@
+"""
+Declarative descriptions of the API dict fields which a Frame class reads,
+compiled (once, at import) into straight-line decoder functions.
+"""
+
+from .. import encoding
+
+
+__all__ = [
+	'Field',
+	'Schema',
+]
+
+
+
+class Field:
+	"""
+	One value in an API dict, and where its decoded value goes on a Frame.
+	"""
+
+
+	def __init__(self, key, attr=None, method=None, numBytes=None,
+			convert=None, optional=False):
+		"""
+		@param key the API dict key (an Enum value or a string)
+		@param attr the Frame attribute in which to store the decoded
+			value
+		@param method instead of attr, the name of a Frame method to
+			call with the decoded value
+		@param numBytes the width of a packed number; if given (and
+			convert is not), the value is unpacked with the
+			matching xh.encoding codec
+		@param convert a function from the raw API value to the value
+			to store; if neither this nor numBytes is given, the
+			raw value is stored
+		@param optional if True, the key may be absent from the dict,
+			in which case the Frame is left unchanged
+		If neither attr nor method is given, the key is only declared as
+		used (for example, because a factory method reads it).
+		"""
+		if attr is not None and method is not None:
+			raise ValueError(('Field %s may set attr %r or call '
+				+ 'method %r, but not both.')
+				% (key, attr, method))
+		self.__key = str(key)
+		self.__attr = attr
+		self.__method = method
+		self.__numBytes = numBytes
+		if convert is None and numBytes is not None:
+			convert = encoding.getCodec(numBytes).decode
+		self.__convert = convert
+		self.__optional = bool(optional)
+
+
+	def getKey(self):
+		return self.__key
+
+
+	def getAttr(self):
+		return self.__attr
+
+
+	def getMethod(self):
+		return self.__method
+
+
+	def getNumBytes(self):
+		return self.__numBytes
+
+
+	def getConvert(self):
+		return self.__convert
+
+
+	def isOptional(self):
+		return self.__optional
+
+
+	def __repr__(self):
+		return 'Field(%r, %s)' % (self.__key,
+			self.__attr or self.__method)
+
+
+
+class Schema:
+	"""
+	The ordered fields which one Frame class reads from an API dict, and the
+	decoder function compiled from them.
+
+	The decoder, decode(frame, d), is generated source with one statement
+	per field, so decoding does no per-field key building, lookup of field
+	descriptions, or bookkeeping of which keys were used; the set of keys a
+	Schema may use is known up front (see getKeys).
+	"""
+
+
+	def __init__(self, name, fields, base=None):
+		"""
+		@param name names the compiled decoder, for tracebacks
+		@param fields a sequence of Field objects
+		@param base an optional Schema whose fields are decoded first
+		"""
+		self.__name = name
+		baseFields = base and base.getFields() or ()
+		self.__fields = baseFields + tuple(fields)
+		self.__keys = frozenset([f.getKey() for f in self.__fields])
+		self.__checks = tuple([(f.getKey(), f.getNumBytes(),
+			f.isOptional()) for f in self.__fields])
+		self.decode = _compileDecoder(name, self.__fields)
+
+
+	def extend(self, name, fields):
+		"""
+		@return a new Schema with this Schema's fields followed by the
+			given ones
+		"""
+		return Schema(name, fields, base=self)
+
+
+	def getName(self):
+		return self.__name
+
+
+	def getFields(self):
+		return self.__fields
+
+
+	def getKeys(self):
+		"""
+		@return a frozenset of the API dict keys this Schema may use
+		"""
+		return self.__keys
+
+
+	def getLazyDecoders(self, defaults=()):
+		"""
+		@param defaults names of Frame attributes which no field sets,
+			to decode as None
+		@return a dict from each Frame attribute set by this Schema to
+			a function which decodes its value from an API dict, for
+			lazily decoded Frames. An absent optional field decodes
+			as None.
+		@throw ValueError if a field calls a method (and so cannot be
+			decoded on its own)
+		"""
+		decoders = dict([(attr, _decodeNone) for attr in defaults])
+		for field in self.__fields:
+			if field.getMethod() is not None:
+				raise ValueError(('Field %s of Schema %s '
+					+ 'calls a method, so cannot be '
+					+ 'decoded lazily.')
+					% (field.getKey(), self.__name))
+			if field.getAttr() is not None:
+				decoders[field.getAttr()] = _lazyDecoder(field)
+		return decoders
+
+
+	def check(self, d):
+		"""
+		Check, without decoding anything, that an API dict has every
+		(non-optional) field, and that each fixed width field is wide
+		enough: what decode would otherwise fail on first. (For lazily
+		decoded Frames, so that a malformed dict is still rejected when
+		parsed.)
+		@throw KeyError if a field is missing
+		@throw ValueError if a fixed width field is too short
+		"""
+		for key, numBytes, optional in self.__checks:
+			v = d.get(key)
+			if v is None:
+				if optional:
+					continue
+				raise KeyError(key)
+			if numBytes is not None and len(v) < numBytes:
+				raise ValueError(('Field %s of %s is %d bytes, '
+					+ 'not %d.') % (key, self.__name,
+					len(v), numBytes))
+
+
+
+def _decodeNone(d):
+	return None
+
+
+def _lazyDecoder(field):
+	"""
+	@return a function which decodes the given field from an API dict
+	"""
+	key, convert = field.getKey(), field.getConvert()
+	if convert is None:
+		convert = lambda v: v
+	if field.isOptional():
+		def decode(d):
+			v = d.get(key)
+			if v is None:
+				return None
+			return convert(v)
+	else:
+		def decode(d):
+			return convert(d[key])
+	return decode
+
+
+
+def _compileDecoder(name, fields):
+	"""
+	Generate and compile the source of a function which decodes the given
+	fields from an API dict onto a Frame.
+	"""
+	namespace = {}
+	lines = ['def decode%s(frame, d):' % name]
+	for i, field in enumerate(fields):
+		attr, method = field.getAttr(), field.getMethod()
+		if attr is None and method is None:
+			continue
+
+		convert = field.getConvert()
+		if field.isOptional():
+			lines.append('\tv = d.get(%r)' % field.getKey())
+			lines.append('\tif v is not None:')
+			indent = '\t\t'
+		else:
+			lines.append('\tv = d[%r]' % field.getKey())
+			indent = '\t'
+		if convert is None:
+			value = 'v'
+		else:
+			convertName = '_convert%d' % i
+			namespace[convertName] = convert
+			value = '%s(v)' % convertName
+
+		if attr is not None:
+			lines.append('%sframe.%s = %s' % (indent, attr, value))
+		else:
+			lines.append('%sframe.%s(%s)' % (indent, method, value))
+	lines.append('\treturn frame')
+
+	source = '\n'.join(lines) + '\n'
+	exec compile(source, '<schema %s>' % name, 'exec') in namespace
+	decoder = namespace['decode%s' % name]
+	decoder.source = source
+	return decoder
@@ -23,6 +23,8 @@ class SleepMode(Command):
 	See pages 85 (sleep details) and 137 (command listing) of the XBee
 	series 2 datasheet.
 	"""
+	__slots__ = ('__mode',)
+
 	MODE = Enum(
 		'DISABLED',		# never sleep; be a router
 		'PIN_ENABLE',		# sleep when PIN_SLEEP_RQ high
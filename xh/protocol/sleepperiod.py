@@ -14,6 +14,8 @@ class SleepPeriod(NumberCommand):
 	See pages 85 (sleep details) and 137 (command listing) of the XBee
 	series 2 datasheet.
 	"""
+	__slots__ = ()
+
 	_MIN = 0x20 # in internal units
 	_MAX = 0xAF0
 	_EXTERNAL_PER_INTERNAL = 10
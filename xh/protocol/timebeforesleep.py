@@ -10,6 +10,8 @@ class TimeBeforeSleep(NumberCommand):
 	See pages 85 (sleep details) and 137 (command listing) of the XBee
 	series 2 datasheet.
 	"""
+	__slots__ = ()
+
 	_MIN = 1
 	_MAX = 0xFFFE
 
@@ -19,6 +19,8 @@ class VoltageSupplyThreshold(Command):
 	bug in xbee-python (see Data), however those returned from
 	InputSample are correct.
 	"""
+	__slots__ = ('__threshold',)
+
 	__THRESHOLD_MAX = encoding.numberToVolts(0xFFFF)
 
 	# recommended useful extrema from Xbee Series 2 datasheet,
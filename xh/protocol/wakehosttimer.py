@@ -10,6 +10,7 @@ class WakeHostTimer(NumberCommand):
 	See pages 85 (sleep details) and 137 (command listing) of the XBee
 	series 2 datasheet.
 	"""
+	__slots__ = ()
 
 
 	def __init__(self, delayMillis=None, **kwargs):
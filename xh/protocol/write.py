@@ -6,6 +6,9 @@ class Write(Command):
 	"""
 	Write settings to nonvolatile memory on the device.
 	"""
+	__slots__ = ()
+
+
 	def __init__(self, **kwargs):
 		Command.__init__(self, Command.NAME.WR, **kwargs)
 
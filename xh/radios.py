@@ -0,0 +1,170 @@
+"""
+Use several locally attached XBees at once (on different serial ports, and
+perhaps different PANs), to get past the throughput of one serial link.
+
+Each LocalRadio has its own reader and transmit queue (see
+setuputil.initializedRadios). Frames received by all of them are sent by
+signals.FRAME_RECEIVED as usual, with the LocalRadio which received each as
+the signal's sender and as the Frame's getRadio(). A RadioRouter takes the
+place of the single TransmitQueue for Command.send, and queues each frame
+on the radio which most recently heard from its destination (as found from
+the source serial in the raw received frames, before they are parsed).
+"""
+
+import logging
+import threading
+
+from . import encoding, transmit
+
+
+__all__ = [
+	'LocalRadio',
+	'RadioRouter',
+]
+
+
+log = logging.getLogger('xh.radios')
+
+
+
+class LocalRadio:
+	"""
+	One locally attached XBee.
+	"""
+
+
+	def __init__(self, name):
+		"""
+		@param name a name for the radio, such as its serial device
+		"""
+		self.__name = name
+		self.__xb = None
+		self.__transmitQueue = None
+
+
+	def getName(self):
+		return self.__name
+
+
+	def setXbee(self, xb):
+		self.__xb = xb
+
+
+	def getXbee(self):
+		"""
+		@return the Xbee API object of the radio
+		"""
+		return self.__xb
+
+
+	def setTransmitQueue(self, transmitQueue):
+		self.__transmitQueue = transmitQueue
+
+
+	def getTransmitQueue(self):
+		return self.__transmitQueue
+
+
+	def __str__(self):
+		return 'LocalRadio %s' % self.__name
+
+
+	def __repr__(self):
+		return '<%s>' % self
+
+
+
+class RadioRouter:
+	"""
+	Queue frames to send on the LocalRadio which last received a Frame
+	from their destination. Frames for the local XBee, or for a node not
+	heard from yet, are sent by the default (first) radio.
+
+	A RadioRouter has the same put method as a transmit.TransmitQueue, so
+	it can be given to Command.setTransmitQueue.
+	"""
+
+
+	def __init__(self):
+		self.__radios = ()
+		self.__lock = threading.Lock()
+		# serial to the LocalRadio which last heard from it
+		self.__routes = {}
+
+
+	def addRadio(self, radio):
+		"""
+		@param radio a LocalRadio, with its transmit queue set
+		"""
+		with self.__lock:
+			self.__radios += (radio,)
+
+
+	def getRadios(self):
+		return self.__radios
+
+
+	def getDefaultRadio(self):
+		if not self.__radios:
+			raise RuntimeError('No radios added to %s.' % self)
+		return self.__radios[0]
+
+
+	def getRadio(self, serial=None):
+		"""
+		@param serial the serial of a remote node, or None for the local
+			XBee
+		@return the LocalRadio to send to the node with
+		"""
+		radio = self.__routes.get(serial)
+		if radio is None:
+			radio = self.getDefaultRadio()
+		return radio
+
+
+	def getRoutes(self):
+		"""
+		@return a dict of serial to the LocalRadio which last heard from
+			it
+		"""
+		with self.__lock:
+			return dict(self.__routes)
+
+
+	def recordReceived(self, radio, sourceKey):
+		"""
+		Route frames for a received frame's source node to the radio
+		which received it.
+		@param sourceKey the encoded source serial of the raw frame (see
+			pipeline.apiFrameSourceKey and pipeline.dictSourceKey),
+			or None if it has none
+		"""
+		if (sourceKey is None
+			or len(sourceKey) != encoding.BYTES_PER_SERIAL):
+			return
+		serial = encoding.stringToNumber(sourceKey)
+		with self.__lock:
+			previous = self.__routes.get(serial)
+			self.__routes[serial] = radio
+		if previous is not None and previous is not radio:
+			log.debug('routing to %s by %s (was %s)'
+				% (serial, radio.getName(), previous.getName()))
+
+
+	def put(self, frameData, destination=None,
+		priority=transmit.PRIORITY.NORMAL, onWritten=None):
+		"""
+		Queue an API frame on the transmit queue of the radio for its
+		destination (see transmit.TransmitQueue.put).
+		"""
+		self.getRadio(destination).getTransmitQueue().put(frameData,
+			destination=destination, priority=priority,
+			onWritten=onWritten)
+
+
+	def getDepth(self, priority=None):
+		"""
+		@return the number of frames queued on all the radios
+		"""
+		return sum(r.getTransmitQueue().getDepth(priority=priority)
+			for r in self.__radios)
@@ -0,0 +1,189 @@
+"""
+Readers of API frames from the serial port, which parse them directly into
+Frame objects (see xh.protocol.ParseFromApiFrame), in place of the xbee
+library's reader thread and API dicts.
+
+ApiFrameReader polls the serial port (through pyserial), which works
+anywhere. SelectApiFrameReader waits on the port's file descriptor, and
+reads everything available with one system call; it needs POSIX.
+"""
+
+import errno
+import io
+import logging
+import os
+import select
+import threading
+import time
+
+from . import protocol
+
+
+log = logging.getLogger('xh.reader')
+
+# how long to wait before checking the serial port again, when idle
+POLL_SECONDS = 0.01
+
+# the most bytes for SelectApiFrameReader to read at once
+READ_BYTES = 4096
+
+# whether SelectApiFrameReader can wait on serial ports
+SELECT_AVAILABLE = os.name == 'posix'
+
+
+
+class ApiFrameReader(threading.Thread):
+
+
+	def __init__(self, serialObj, callback, escaped=False, parse=True):
+		"""
+		@param serialObj the open serial port to read from
+		@param callback a function called with each parsed Frame
+		@param escaped whether the XBee is in escaped API mode (AP=2)
+		@param parse if False, callback is called with the data of each
+			API frame instead, unparsed (to parse elsewhere, as by
+			an xh.pipeline.FramePipeline)
+		"""
+		threading.Thread.__init__(self, name='ApiFrameReader')
+		self.daemon = True
+		self.__serial = serialObj
+		self.__callback = callback
+		self.__parse = parse
+		self.__splitter = protocol.FrameSplitter(escaped=escaped)
+		self.__running = threading.Event()
+		self.__running.set()
+
+
+	def getSplitter(self):
+		return self.__splitter
+
+
+	def halt(self):
+		"""
+		Stop reading, and wait for the thread to finish.
+		"""
+		self.__running.clear()
+		self._wake()
+		if self.is_alive():
+			self.join()
+
+
+	def _wake(self):
+		"""
+		Wake the thread if blocked in _read, once it has been halted.
+		(Polling, it needs no waking.)
+		"""
+		pass
+
+
+	def run(self):
+		while self.__running.is_set():
+			try:
+				data = self._read()
+			except:
+				log.error('error reading from serial port',
+					exc_info=True)
+				break
+			if data is None:
+				break
+			if data:
+				self._handleData(data)
+
+
+	def _read(self):
+		"""
+		@return the bytes read from the serial port (possibly none, to
+			check whether the reader is halted), or None at the end
+			of input
+		"""
+		numWaiting = self.__serial.inWaiting()
+		if not numWaiting:
+			time.sleep(POLL_SECONDS)
+			return ''
+		return self.__serial.read(numWaiting)
+
+
+	def _handleData(self, data):
+		for frameData in self.__splitter.feed(data):
+			if not self.__parse:
+				self.__callback(frameData)
+				continue
+			frame = protocol.ParseFromApiFrameSafe(frameData)
+			if frame:
+				self.__callback(frame)
+
+
+
+class SelectApiFrameReader(ApiFrameReader):
+	"""
+	An ApiFrameReader which sleeps until the serial port's file descriptor
+	is readable (by epoll where available, else select), instead of
+	polling the port, and then reads all the bytes available with one
+	read into a buffer reused for every read.
+	"""
+
+
+	def __init__(self, serialObj, callback, escaped=False, parse=True,
+		readBytes=READ_BYTES):
+		"""
+		@param serialObj an open serial port with a file descriptor (as
+			from fileno()), such as a POSIX pyserial Serial
+		@param readBytes the most bytes to read at once
+		(For the other parameters, see ApiFrameReader.)
+		"""
+		ApiFrameReader.__init__(self, serialObj, callback,
+			escaped=escaped, parse=parse)
+		self.name = 'SelectApiFrameReader'
+		self.__fd = serialObj.fileno()
+		self.__file = io.FileIO(self.__fd, 'r', closefd=False)
+		self.__buffer = bytearray(readBytes)
+		self.__view = memoryview(self.__buffer)
+		# written to by halt, to wake the thread
+		self.__wakeRead, self.__wakeWrite = os.pipe()
+		if hasattr(select, 'epoll'):
+			self.__epoll = select.epoll()
+			self.__epoll.register(self.__fd, select.EPOLLIN)
+			self.__epoll.register(self.__wakeRead, select.EPOLLIN)
+		else:
+			self.__epoll = None
+
+
+	def halt(self):
+		if self.__wakeWrite is None:
+			# already halted, and its descriptors closed
+			return
+		ApiFrameReader.halt(self)
+		if self.__epoll:
+			self.__epoll.close()
+		os.close(self.__wakeRead)
+		os.close(self.__wakeWrite)
+		self.__wakeRead = self.__wakeWrite = None
+
+
+	def _wake(self):
+		os.write(self.__wakeWrite, 'x')
+
+
+	def _read(self):
+		if self.__epoll:
+			readable = [fd for fd, event in self.__epoll.poll()]
+		else:
+			readable, _, _ = select.select(
+				[self.__fd, self.__wakeRead], [], [])
+		if self.__wakeRead in readable:
+			# drain it, or every later poll returns at once
+			os.read(self.__wakeRead, READ_BYTES)
+		if self.__fd not in readable:
+			return ''
+		try:
+			n = self.__file.readinto(self.__buffer)
+		except (IOError, OSError) as e:
+			if e.errno == errno.EAGAIN:
+				return ''
+			raise
+		if n is None:
+			# nothing after all (with a non-blocking descriptor)
+			return ''
+		if not n:
+			return None
+		return self.__view[:n]
@@ -0,0 +1,229 @@
+"""
+Estimate how long each destination takes to respond to a Command, from the
+measured round-trip times of the responses the correlator matches, and
+derive a timeout for waiting on the next response (as TCP does for its
+retransmission timeout, RFC 6298). Each time a response fails to arrive
+in time the destination's timeout is doubled, until its next response is
+measured.
+
+Commands to a sleeping end device are held by its parent until it wakes,
+so for a node known (from SleepPeriod and SleepMode responses) to sleep,
+its sleep period is added to the timeout.
+"""
+
+import copy
+import logging
+import threading
+
+
+__all__ = [
+	'RttEstimator',
+	'getEstimator',
+	'getTimeoutSeconds',
+	'recordTimeout',
+]
+
+
+log = logging.getLogger('xh.rtt')
+
+# timeouts before any round trip to a destination is measured
+INITIAL_LOCAL_TIMEOUT_SECONDS = 0.2
+INITIAL_REMOTE_TIMEOUT_SECONDS = 3.0
+# the old fixed timeout, which no estimate undercuts
+MIN_TIMEOUT_SECONDS = 0.2
+MAX_TIMEOUT_SECONDS = 60.0
+
+# gains for the smoothed round-trip time and its mean deviation
+_ALPHA = 1.0 / 8
+_BETA = 1.0 / 4
+# deviations to allow above the smoothed round-trip time
+_K = 4
+
+
+
+class RttEstimator:
+	"""
+	The smoothed round-trip time (and its mean deviation) to one
+	destination.
+	"""
+
+
+	def __init__(self, initialTimeoutSeconds):
+		self.__initialTimeoutSeconds = initialTimeoutSeconds
+		self.__smoothedSeconds = None
+		self.__deviationSeconds = None
+		self.__numSamples = 0
+		self.__backoff = 1
+
+
+	def addSample(self, rttSeconds):
+		"""
+		Fold a measured round-trip time into the estimate, and undo
+		any backoff.
+		"""
+		self.__backoff = 1
+		if self.__smoothedSeconds is None:
+			self.__smoothedSeconds = rttSeconds
+			self.__deviationSeconds = rttSeconds / 2.0
+		else:
+			error = abs(self.__smoothedSeconds - rttSeconds)
+			self.__deviationSeconds = ((1 - _BETA)
+				* self.__deviationSeconds + _BETA * error)
+			self.__smoothedSeconds = ((1 - _ALPHA)
+				* self.__smoothedSeconds + _ALPHA * rttSeconds)
+		self.__numSamples += 1
+
+
+	def getNumSamples(self):
+		return self.__numSamples
+
+
+	def getSmoothedSeconds(self):
+		"""
+		@return the smoothed round-trip time, or None if none measured
+		"""
+		return self.__smoothedSeconds
+
+
+	def getDeviationSeconds(self):
+		return self.__deviationSeconds
+
+
+	def backOff(self):
+		"""
+		Double the timeout (up to MAX_TIMEOUT_SECONDS), after a
+		response failed to arrive within it.
+		"""
+		if self.getTimeoutSeconds() < MAX_TIMEOUT_SECONDS:
+			self.__backoff *= 2
+
+
+	def getTimeoutSeconds(self):
+		"""
+		@return how long to wait for a response before giving up
+		"""
+		if self.__smoothedSeconds is None:
+			timeout = self.__initialTimeoutSeconds
+		else:
+			timeout = self.__smoothedSeconds + max(
+				MIN_TIMEOUT_SECONDS,
+				_K * self.__deviationSeconds)
+		timeout = max(MIN_TIMEOUT_SECONDS, timeout)
+		return min(MAX_TIMEOUT_SECONDS, timeout * self.__backoff)
+
+
+
+class RttTable:
+	"""
+	An RttEstimator for each destination (remote serial, or None for the
+	local XBee), and the known sleep behavior of each remote node.
+	"""
+
+
+	def __init__(self):
+		self.__lock = threading.Lock()
+		self.__estimators = {}
+		self.__sleepPeriodSeconds = {}
+		self.__nonSleeping = set()
+
+
+	def recordResponse(self, remoteSerial, rttSeconds, response):
+		"""
+		@param remoteSerial the destination of the Command
+		@param rttSeconds the time from sending the Command to receiving
+			its response
+		@param response the Command received in response, which is
+			checked for the node's sleep settings
+		"""
+		with self.__lock:
+			self.__getEstimator(remoteSerial).addSample(rttSeconds)
+			if remoteSerial is not None:
+				self.__recordSleepSettings(remoteSerial,
+					response)
+
+
+	def recordTimeout(self, remoteSerial):
+		"""
+		Back off the destination's timeout after a Command to it went
+		unanswered in time.
+		"""
+		with self.__lock:
+			self.__getEstimator(remoteSerial).backOff()
+
+
+	def __recordSleepSettings(self, serial, response):
+		"""
+		(The lock must be held.)
+		"""
+		if response.getStatus() != response.STATUS.OK:
+			return
+		name = str(response.getName())
+		if name == 'SP':
+			millis = response.getPeriodMillis()
+			if millis is not None:
+				self.__sleepPeriodSeconds[serial] = (
+					millis / 1000.0)
+		elif name == 'SM':
+			mode = response.getMode()
+			if mode == response.MODE.DISABLED:
+				self.__nonSleeping.add(serial)
+			elif mode is not None:
+				self.__nonSleeping.discard(serial)
+
+
+	def __getEstimator(self, remoteSerial):
+		"""
+		(The lock must be held.)
+		"""
+		estimator = self.__estimators.get(remoteSerial)
+		if estimator is None:
+			estimator = RttEstimator(INITIAL_LOCAL_TIMEOUT_SECONDS
+				if remoteSerial is None
+				else INITIAL_REMOTE_TIMEOUT_SECONDS)
+			self.__estimators[remoteSerial] = estimator
+		return estimator
+
+
+	def getEstimator(self, remoteSerial):
+		"""
+		@return a copy of the RttEstimator for the destination
+		"""
+		with self.__lock:
+			return copy.copy(self.__getEstimator(remoteSerial))
+
+
+	def getTimeoutSeconds(self, remoteSerial):
+		"""
+		@return how long to wait for a response from the destination
+		"""
+		with self.__lock:
+			timeout = self.__getEstimator(
+				remoteSerial).getTimeoutSeconds()
+			if remoteSerial not in self.__nonSleeping:
+				timeout += self.__sleepPeriodSeconds.get(
+					remoteSerial, 0.0)
+		return timeout
+
+
+_table = RttTable()
+
+
+def recordResponse(remoteSerial, rttSeconds, response):
+	_table.recordResponse(remoteSerial, rttSeconds, response)
+
+
+def recordTimeout(remoteSerial):
+	_table.recordTimeout(remoteSerial)
+
+
+def getEstimator(remoteSerial):
+	return _table.getEstimator(remoteSerial)
+
+
+def getTimeoutSeconds(remoteSerial):
+	"""
+	@param remoteSerial the destination's serial, or None for the local
+		XBee
+	@return how long to wait for a response from the destination
+	"""
+	return _table.getTimeoutSeconds(remoteSerial)
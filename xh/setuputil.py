@@ -8,13 +8,15 @@ import logging
 import os
 import readline
 import serial.tools.list_ports
+import time
 import traceback
 
 from yapsy.PluginManager import PluginManagerSingleton
 
 from .deps import serial, xbee, yapsy
 from xbee.tests.Fake import FakeDevice
-from . import Config, signals, protocol
+from . import Config, capture, pipeline, radios, reader, signals, protocol, \
+	simulator, transmit
 
 
 log = logging.getLogger('xh.setuputil')
@@ -22,6 +24,13 @@ log = logging.getLogger('xh.setuputil')
 # special value for the serial device for which a fake is used
 FAKE_SERIAL = 'fake serial device'
 
+# how long to wait for the local XBee to respond, while negotiating its baud
+NEGOTIATION_TIMEOUT_SECONDS = 0.5
+# how long to give the XBee to switch rates after it responds
+BAUD_SWITCH_SECONDS = 0.1
+# the serial port's read timeout while negotiating
+_NEGOTIATION_READ_SECONDS = 0.05
+
 # ignore in finding Serial ports
 EXCLUDE_DEVICES = set([
 	'Bluetooth',
@@ -89,42 +98,381 @@ def activatedPlugins():
 				% pluginInfo.name, exc_info=True)
 
 
+def sendFrameReceivedSignal(frame, radio=None):
+	"""
+	Send a signals.FRAME_RECEIVED signal for the given received Frame.
+	@param radio the xh.radios.LocalRadio which received the Frame, if
+		known, which is set on the Frame and sent as the signal's sender
+	"""
+	if radio is not None:
+		frame.setRadio(radio)
+	responses = signals.FRAME_RECEIVED.send_robust(sender=radio,
+		frame=frame)
+	signals.logErrors(responses)
+
+
+def parseFrameAndSendSignal(rawData):
+	"""
+	Parse an xbee library API dict and send a signals.FRAME_RECEIVED signal
+	for the Frame.
+	"""
+	frame = protocol.ParseFromDictSafe(rawData)
+	if frame:
+		sendFrameReceivedSignal(frame)
+
+
 @contextlib.contextmanager
-def initializedXbee(serialDevice=None):
+def initializedXbee(serialDevice=None, nativeReader=False, escaped=False,
+	numWorkers=pipeline.NUM_WORKERS, overflow=pipeline.OVERFLOW.BLOCK,
+	bauds=None, capturePath=None):
 	"""
 	Open a serial connection to the locally attached Xbee return an xbee API
 	object representing the module, for sending frames.
 
 	A signals.FRAME_RECEIVED signal will be sent when a frame is received.
+	Commands sent without an explicit xb are queued for a transmit thread
+	(see Command.setTransmitQueue), as are Commands sent with the returned
+	xb (see Command.setXbeeTransmitQueue).
 
 	If FAKE_SERIAL is used for the serial device name, a fake object is
-	created (and no communication is actually done).
-	"""
+	created (and no communication is actually done). An
+	xh.capture.ReplayDevice may also be given as the serial device, to
+	receive the frames of a capture file, or an xh.simulator.SimulatedMesh,
+	to talk to simulated nodes.
 
-	if serialDevice == FAKE_SERIAL:
-		serialObj = FakeDevice()
+	@param serialDevice the serial device of the Xbee, or a list of several
+		to open at once (see initializedRadios), in which case the
+		xbee API object of the first is returned
+	@param nativeReader if True, received API frames are parsed directly
+		into Frames by an xh.reader.SelectApiFrameReader (or, where
+		not available, an ApiFrameReader); otherwise (the
+		default), the xbee library reads and decodes them into API
+		dicts, which are then parsed
+	@param escaped whether the Xbee is in escaped API mode (AP=2) rather
+		than API mode (AP=1)
+	@param numWorkers how many threads parse received frames and send
+		their signals (see xh.pipeline.FramePipeline), or 0 to do so
+		on the thread reading the serial port
+	@param overflow the xh.pipeline.OVERFLOW policy for frames received
+		faster than the workers handle them
+	@param bauds serial rates (above Config.SERIAL_BAUD) to try moving
+		the Xbee to at the start (see negotiateBaud), and back from
+		at the end (default: Config.NEGOTIATED_SERIAL_BAUDS)
+	@param capturePath if given, the path of a file to record the
+		received API frames in (see xh.capture.CaptureWriter),
+		which needs nativeReader
+	"""
+	if isinstance(serialDevice, (list, tuple)):
+		serialDevices = serialDevice
 	else:
-		device = serialDevice or pickSerialDevice()
-		serialObj = serial.Serial(device, Config.SERIAL_BAUD)
+		serialDevices = [serialDevice]
+	with initializedRadios(serialDevices, nativeReader=nativeReader,
+		escaped=escaped, numWorkers=numWorkers, overflow=overflow,
+		bauds=bauds, capturePath=capturePath) as router:
+		yield router.getDefaultRadio().getXbee()
 
-	def parseFrameAndSendSignal(rawData):
-		frame = protocol.ParseFromDictSafe(rawData)
-		if frame:
-			responses = signals.FRAME_RECEIVED.send_robust(
-					sender=None, frame=frame)
-			signals.logErrors(responses)
 
-	xb = xbee.ZigBee(serialObj, callback=parseFrameAndSendSignal)
+@contextlib.contextmanager
+def initializedRadios(serialDevices, nativeReader=False, escaped=False,
+	numWorkers=pipeline.NUM_WORKERS, overflow=pipeline.OVERFLOW.BLOCK,
+	bauds=None, capturePath=None):
+	"""
+	Open several locally attached Xbees at once (as for initializedXbee),
+	each with its own reader and transmit queue, and return an
+	xh.radios.RadioRouter of them.
+
+	Received Frames are tagged with the radio which received them (see
+	Frame.getRadio). Commands sent without an explicit xb are queued on the
+	radio which last heard from their destination, or on the first radio;
+	those sent with a radio's xb explicitly are queued on that radio.
+
+	@param serialDevices a list of serial devices (or FAKE_SERIAL, or
+		xh.capture.ReplayDevices, or xh.simulator.SimulatedMeshes)
+	@param numWorkers how many threads handle each radio's received
+		frames (see initializedXbee)
+	@param capturePath if given, the path of a file to record all the
+		radios' received API frames in
+	"""
+	if capturePath is not None and not nativeReader:
+		raise ValueError('Capturing frames needs the native reader.')
+	if bauds is None:
+		bauds = Config.NEGOTIATED_SERIAL_BAUDS
+	router = radios.RadioRouter()
+	captureWriter = None
+	if capturePath is not None:
+		captureWriter = capture.CaptureWriter(capturePath)
+	halts = []
+	try:
+		for serialDevice in serialDevices:
+			halts.append(_openRadio(serialDevice, router,
+				nativeReader, escaped, numWorkers, overflow,
+				bauds, captureWriter))
+	except:
+		_haltRadios(halts)
+		if captureWriter:
+			captureWriter.close()
+		raise
+	protocol.Command.setTransmitQueue(router)
 
 	try:
-		yield xb
+		yield router
 	except KeyboardInterrupt as e:
 		log.info('got Ctl-C')
 	except Exception as e:
 		log.error(e.message, exc_info=True)
 	finally:
+		protocol.Command.setTransmitQueue(None)
+		_haltRadios(halts)
+		if captureWriter:
+			captureWriter.close()
+			log.info('captured %d frames in %s' % (
+				captureWriter.getNumFrames(), capturePath))
+
+
+def _openRadio(serialDevice, router, nativeReader, escaped, numWorkers,
+	overflow, bauds, captureWriter):
+	"""
+	Open a locally attached Xbee, with its reader and transmit queue, and
+	add it to the router.
+	@param captureWriter an xh.capture.CaptureWriter to record the received
+		API frames with, or None
+	@return a function which closes the Xbee
+	"""
+	baud = Config.SERIAL_BAUD
+	name = serialDevice
+	if serialDevice == FAKE_SERIAL:
+		serialObj = FakeDevice()
+	elif isinstance(serialDevice, (capture.ReplayDevice,
+		simulator.SimulatedMesh)):
+		serialObj = serialDevice
+		name = serialDevice.getName()
+	else:
+		serialDevice = serialDevice or pickSerialDevice()
+		serialObj = serial.Serial(serialDevice, baud)
+		if bauds:
+			try:
+				baud = negotiateBaud(serialObj, bauds,
+					escaped=escaped)
+			except:
+				serialObj.close()
+				raise
+		name = serialDevice
+	radio = radios.LocalRadio(name)
+
+	def dispatch(frame):
+		sendFrameReceivedSignal(frame, radio=radio)
+
+	if nativeReader:
+		parse = protocol.ParseFromApiFrameSafe
+		getSourceKey = pipeline.apiFrameSourceKey
+	else:
+		parse = protocol.ParseFromDictSafe
+		getSourceKey = pipeline.dictSourceKey
+	framePipeline = None
+	if numWorkers > 0:
+		framePipeline = pipeline.FramePipeline(parse, dispatch,
+			getSourceKey, numWorkers=numWorkers, overflow=overflow)
+		framePipeline.start()
+		handleRaw = framePipeline.put
+	else:
+		def handleRaw(rawData):
+			frame = parse(rawData)
+			if frame:
+				dispatch(frame)
+
+	def received(rawData):
+		if captureWriter is not None:
+			captureWriter.write(name, rawData)
+		# (by the raw source serial, without decoding the frame)
+		router.recordReceived(radio, getSourceKey(rawData))
+		handleRaw(rawData)
+
+	frameReader = None
+	if nativeReader:
+		# The xbee object is only used for sending, so it starts no
+		# reader thread of its own.
+		xb = xbee.ZigBee(serialObj, escaped=escaped)
+		if serialDevice != FAKE_SERIAL:
+			if (reader.SELECT_AVAILABLE
+				and hasattr(serialObj, 'fileno')):
+				readerClass = reader.SelectApiFrameReader
+			else:
+				readerClass = reader.ApiFrameReader
+			frameReader = readerClass(serialObj, received,
+				escaped=escaped, parse=False)
+			frameReader.start()
+	else:
+		xb = xbee.ZigBee(serialObj, callback=received,
+			escaped=escaped)
+
+	transmitQueue = transmit.TransmitQueue(serialObj, escaped=escaped,
+		baud=baud)
+	transmitQueue.start()
+	radio.setXbee(xb)
+	radio.setTransmitQueue(transmitQueue)
+	router.addRadio(radio)
+	# so that sends with this xb explicitly do not write to the port
+	# alongside the transmit queue
+	protocol.Command.setXbeeTransmitQueue(xb, transmitQueue)
+
+	def halt():
+		protocol.Command.setXbeeTransmitQueue(xb, None)
+		transmitQueue.halt()
+		if frameReader:
+			frameReader.halt()
 		xb.halt()
-		serialObj.close()
+		if framePipeline:
+			framePipeline.halt()
+		try:
+			if baud != Config.SERIAL_BAUD:
+				# so the next to open it finds it at the usual
+				# rate
+				restoreBaud(serialObj, escaped=escaped)
+		finally:
+			serialObj.close()
+	return halt
+
+
+def _haltRadios(halts):
+	for halt in halts:
+		try:
+			halt()
+		except:
+			log.error('error closing radio', exc_info=True)
+
+
+def negotiateBaud(serialObj, bauds, escaped=False):
+	"""
+	Move the local Xbee, and the open serial port to it, to the highest of
+	the given rates that works. Each change is verified by reading the rate
+	back at the new rate; if that fails, the Xbee is moved back, and the
+	next lower rate is tried. The change is not written, so resetting the
+	Xbee returns it to its stored rate (as does restoreBaud).
+
+	This must be done before anything else reads from or writes to the
+	port.
+
+	If the Xbee does not respond at the port's rate (as when left at
+	another by a previous run which did not restore it), it is looked for
+	at each of the given rates.
+
+	@param serialObj the open serial port, whose baudrate is the rate to
+		start from
+	@param bauds rates (of protocol.BaudRate.STANDARD_BAUDS) to try
+	@return the serial port's rate in the end
+	@raise RuntimeError if the Xbee stops responding
+	"""
+	oldTimeout = serialObj.timeout
+	serialObj.timeout = _NEGOTIATION_READ_SECONDS
+	try:
+		return _negotiateBaud(serialObj, sorted(set(bauds),
+			reverse=True), escaped)
+	finally:
+		serialObj.timeout = oldTimeout
+
+
+def _negotiateBaud(serialObj, bauds, escaped):
+	current = serialObj.baudrate
+	if not _isAtBaud(serialObj, current, escaped):
+		found = None
+		for baud in bauds:
+			_reopen(serialObj, baud)
+			if _isAtBaud(serialObj, baud, escaped):
+				found = baud
+				break
+		if found is None:
+			_reopen(serialObj, current)
+			log.warning(('no response from local XBee at %d'
+				+ ' baud; not changing its rate') % current)
+			return current
+		log.info('found local XBee at %d baud' % found)
+		current = found
+
+	for baud in bauds:
+		if baud <= current:
+			break
+		response = _exchange(serialObj, protocol.BaudRate(baud),
+			escaped)
+		if (response is None
+			or response.getStatus() != response.STATUS.OK):
+			log.info('local XBee did not take %d baud' % baud)
+			continue
+		_reopen(serialObj, baud)
+		if _isAtBaud(serialObj, baud, escaped):
+			log.info('moved local XBee from %d to %d baud'
+				% (current, baud))
+			return baud
+
+		log.warning(('no response from local XBee at %d baud;'
+			+ ' moving back to %d') % (baud, current))
+		# in case the Xbee did change, and only its responses were
+		# lost
+		_send(serialObj, protocol.BaudRate(current), escaped)
+		time.sleep(BAUD_SWITCH_SECONDS)
+		_reopen(serialObj, current)
+		if not _isAtBaud(serialObj, current, escaped):
+			raise RuntimeError(('Lost contact with local XBee'
+				+ ' moving from %d to %d baud.')
+				% (current, baud))
+	return current
+
+
+def restoreBaud(serialObj, escaped=False):
+	"""
+	Move the local Xbee back to Config.SERIAL_BAUD (from a rate set by
+	negotiateBaud), once nothing else uses the port.
+	"""
+	serialObj.timeout = _NEGOTIATION_READ_SECONDS
+	response = _exchange(serialObj, protocol.BaudRate(Config.SERIAL_BAUD),
+		escaped)
+	if response is None or response.getStatus() != response.STATUS.OK:
+		log.warning('local XBee did not move back to %d baud'
+			% Config.SERIAL_BAUD)
+
+
+def _reopen(serialObj, baud):
+	serialObj.close()
+	serialObj.baudrate = baud
+	serialObj.open()
+	time.sleep(BAUD_SWITCH_SECONDS)
+
+
+def _isAtBaud(serialObj, baud, escaped):
+	"""
+	@return whether the Xbee responds, reporting the given rate
+	"""
+	response = _exchange(serialObj, protocol.BaudRate(), escaped)
+	return (response is not None
+		and response.getStatus() == response.STATUS.OK
+		and response.getBaud() == baud)
+
+
+def _send(serialObj, command, escaped):
+	serialObj.write(protocol.encodeFrame(command.getApiFrameData(),
+		escaped=escaped))
+	# Finish sending before the port may be reopened at another rate.
+	serialObj.flush()
+
+
+def _exchange(serialObj, command, escaped,
+	timeoutSeconds=NEGOTIATION_TIMEOUT_SECONDS):
+	"""
+	Send a local Command straight to the serial port, and read its
+	response, with no reader or transmit queue running.
+	@return the response Command, or None if none came in time
+	"""
+	serialObj.flushInput()
+	_send(serialObj, command, escaped)
+	splitter = protocol.FrameSplitter(escaped=escaped)
+	deadline = time.time() + timeoutSeconds
+	while time.time() < deadline:
+		data = serialObj.read(serialObj.inWaiting() or 1)
+		for frameData in splitter.feed(data):
+			frame = protocol.ParseFromApiFrameSafe(frameData)
+			if (isinstance(frame, protocol.Command)
+				and frame.getFrameId() == command.getFrameId()):
+				return frame
+	return None
 
 
 def runPythonStartup():
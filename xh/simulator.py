@@ -0,0 +1,706 @@
+"""
+Simulate a mesh of XBee nodes, and the local XBee (the coordinator) through
+which they are reached, as a stand-in for a serial device, to generate load
+for testing and benchmarking without hundreds of radios.
+
+Each SimulatedNode has its own serial, network address, node identifier,
+device type, pin configuration, IO sample rate and (for end devices) cyclic
+sleep schedule. A SimulatedMesh reads the API frames written to it by the
+host, and answers local AT commands (as the coordinator: ND is answered by
+every node, within the discovery timeout) and remote AT commands (SH, SL, MY,
+NI, ND, IS, %V, D0-D7, P0-P2, IR, SM, SP, ST and so on) with properly encoded
+responses, after a simulated transmission latency. Nodes with an IO sample
+rate send IO samples at that rate while awake. A sleeping end device answers
+a remote command when it next wakes.
+
+Nothing runs in the background: whatever is due is generated when the mesh
+is read, so thousands of nodes cost only the frames they send.
+
+Use one by opening it as the serial device (xh run --simulate N).
+"""
+
+import heapq
+import logging
+import random
+import struct
+import threading
+import time
+
+from . import encoding, protocol
+from .protocol import Command, DEVICE_TYPE
+
+
+__all__ = [
+	'SimulatedMesh',
+	'SimulatedNode',
+	'createNodes',
+]
+
+
+log = logging.getLogger('xh.simulator')
+
+# serials of the simulated coordinator, and (after it) the nodes
+SERIAL_BASE = 0x0013A20040A00000
+BROADCAST_SERIAL = 0xFFFF
+COORDINATOR_NETWORK_ADDRESS = 0x0000
+UNKNOWN_NETWORK_ADDRESS = 0xFFFE
+
+# pin configuration command names to their DIO numbers (and analog channel,
+# for the pins which have one), and the pin functions
+PIN_COMMAND_TO_DIO = {
+	'D0': 0, 'D1': 1, 'D2': 2, 'D3': 3, 'D4': 4, 'D5': 5, 'D6': 6,
+	'D7': 7, 'P0': 10, 'P1': 11, 'P2': 12,
+}
+NUM_ANALOG_PINS = 4
+PIN_DISABLED = 0
+PIN_ANALOG_INPUT = 2
+PIN_DIGITAL_INPUT = 3
+PIN_OUTPUT_LOW = 4
+PIN_OUTPUT_HIGH = 5
+_PIN_FUNCTION_MAX = 5
+
+# sleep modes with a cyclic sleep schedule (see SleepMode)
+CYCLIC_SLEEP_MODES = (4, 5)
+
+# The default configuration of nodes made by createNodes.
+DEFAULT_PIN_FUNCTIONS = {
+	'D1': PIN_ANALOG_INPUT,
+	'D2': PIN_ANALOG_INPUT,
+	'D4': PIN_DIGITAL_INPUT,
+}
+DEFAULT_SAMPLE_RATE_MILLIS = 1000
+END_DEVICE_FRACTION = 0.25
+END_DEVICE_SLEEP_MILLIS = 5000
+END_DEVICE_AWAKE_MILLIS = 1000
+SUPPLY_VOLTS = 3.3
+
+# how long a transmission takes each way (seconds, lowest and highest), and
+# how long before an undeliverable remote command fails
+LATENCY_SECONDS = (0.005, 0.03)
+TRANSMIT_FAILURE_SECONDS = 0.5
+
+# the most bytes for a SimulatedMesh to have waiting at once
+BUFFER_BYTES = 0x10000
+
+_API_ID_AT = 0x08
+_API_ID_REMOTE_AT = 0x17
+_AT = struct.Struct('>BB2s')
+_REMOTE_AT = struct.Struct('>BBQHB2s')
+_AT_RESPONSE = struct.Struct('>BB2sB')
+_REMOTE_AT_RESPONSE = struct.Struct('>BBQH2sB')
+_IO_SAMPLE = struct.Struct('>BQHB')
+_ND_TRAILER = struct.Struct('>HBBHH')
+_SAMPLE_SET = struct.Struct('>BHB')
+_SAMPLE_VALUE = struct.Struct('>H')
+
+_IO_SAMPLE_OPTIONS = 0x01	# acknowledged
+_PROFILE_ID = 0xC105
+_MANUFACTURER_ID = 0x101E
+_ANALOG_MAX = 0x3FF
+_ANALOG_STEP = 0x10
+_DIGITAL_FLIP_PROBABILITY = 0.1
+
+# numeric parameters: name to (bytes in a response, lowest, highest)
+_NUMBERS = {
+	'IR': (2, 0, 0xFFFF),
+	'SM': (1, 0, 5),
+	'SP': (2, 0x20, 0xAF0),
+	'SN': (2, 1, 0xFFFF),
+	'ST': (2, 1, 0xFFFE),
+	'NT': (1, 0x20, 0xFF),
+	'BD': (4, 0, 0x7FFFFFFF),
+	'EE': (1, 0, 1),
+	'PR': (2, 0, 0x3FFF),
+	'V+': (2, 0, 0xFFFF),
+	'WH': (2, 0, 0xFFFF),
+}
+for _name in PIN_COMMAND_TO_DIO:
+	_NUMBERS[_name] = (1, PIN_DISABLED, _PIN_FUNCTION_MAX)
+del _name
+
+# commands accepted (with no effect) and answered with no parameter
+_ACTIONS = ('AC', 'WR', 'FR', 'RE')
+
+
+
+class SimulatedNode:
+	"""
+	One simulated XBee. Its AT parameters are kept in API units, as the
+	XBee reports them.
+	"""
+
+
+	def __init__(self, serial, networkAddress, nodeIdentifier='',
+		deviceType=DEVICE_TYPE.ROUTER, pinFunctions=None,
+		sampleRateMillis=0, sleepMillis=None, awakeMillis=None,
+		supplyVolts=SUPPLY_VOLTS, seed=None):
+		"""
+		@param pinFunctions a dict of pin configuration command name
+			(such as 'D0') to pin function (such as
+			PIN_ANALOG_INPUT)
+		@param sampleRateMillis how often to send IO samples, or 0 for
+			never (IR)
+		@param sleepMillis if given, the node sleeps cyclically for this
+			long at a time (SM=4 and SP)
+		@param awakeMillis how long the node stays awake between sleeps
+			(ST)
+		@param seed for the node's sample values (default: the serial)
+		"""
+		self.__serial = serial
+		self.__networkAddress = networkAddress
+		self.__nodeIdentifier = nodeIdentifier
+		self.__deviceType = deviceType
+		self.__supplyVolts = supplyVolts
+		self.__random = random.Random(serial if seed is None else seed)
+		self.__numbers = {
+			'IR': sampleRateMillis,
+			'SM': 0,
+			'SP': 0x20,
+			'SN': 1,
+			'ST': 5000,
+			'NT': 0x3C,
+			'BD': 3,
+			'EE': 0,
+			'PR': 0x1FFF,
+			'V+': 0,
+			'WH': 0,
+		}
+		for name in PIN_COMMAND_TO_DIO:
+			self.__numbers[name] = PIN_DISABLED
+		self.__numbers.update(pinFunctions or {})
+		if sleepMillis is not None:
+			self.__numbers['SM'] = CYCLIC_SLEEP_MODES[0]
+			self.__numbers['SP'] = sleepMillis / 10
+		if awakeMillis is not None:
+			self.__numbers['ST'] = awakeMillis
+		self.__sleepPhaseSeconds = (self.__random.random()
+			* self.__getCycleSeconds())
+		self.__analogValues = [self.__random.randint(0, _ANALOG_MAX)
+			for i in xrange(NUM_ANALOG_PINS)]
+		self.__digitalBits = self.__random.getrandbits(16)
+
+
+	def getSerial(self):
+		return self.__serial
+
+
+	def getNetworkAddress(self):
+		return self.__networkAddress
+
+
+	def getNodeIdentifier(self):
+		return self.__nodeIdentifier
+
+
+	def getDeviceType(self):
+		return self.__deviceType
+
+
+	def getNumber(self, name):
+		"""
+		@return the value of a numeric AT parameter, in API units
+		"""
+		return self.__numbers[name]
+
+
+	def getSampleRateMillis(self):
+		return self.__numbers['IR']
+
+
+	def isSleepy(self):
+		return self.__numbers['SM'] in CYCLIC_SLEEP_MODES
+
+
+	def __getCycleSeconds(self):
+		return (self.__numbers['SP'] * 10
+			+ self.__numbers['ST']) / 1000.0
+
+
+	def getNextWake(self, t):
+		"""
+		@param t a time, in seconds
+		@return the first time, at or after t, the node is awake
+		"""
+		if not self.isSleepy():
+			return t
+		cycle = self.__getCycleSeconds()
+		phase = (t + self.__sleepPhaseSeconds) % cycle
+		awake = self.__numbers['ST'] / 1000.0
+		if phase < awake:
+			return t
+		return t + cycle - phase
+
+
+	def isAwake(self, t):
+		return self.getNextWake(t) == t
+
+
+	def encodeNodeDiscovery(self, parentNetworkAddress):
+		"""
+		@return the parameter of this node's ND response
+		"""
+		return (struct.pack('>HQ', self.__networkAddress, self.__serial)
+			+ self.__nodeIdentifier + '\0'
+			+ _ND_TRAILER.pack(parentNetworkAddress,
+				self.__deviceType.index, 0,
+				_PROFILE_ID, _MANUFACTURER_ID))
+
+
+	def encodeSamples(self):
+		"""
+		Take a sample of the input pins (the analog values wander, and
+		the digital ones sometimes flip).
+		@return the encoded sample set, or None if no pins are inputs
+		"""
+		digitalMask = 0
+		analogMask = 0
+		outputMask = 0
+		highMask = 0
+		rand = self.__random
+		for name, dio in PIN_COMMAND_TO_DIO.iteritems():
+			function = self.__numbers[name]
+			if function == PIN_ANALOG_INPUT:
+				analogMask |= 1 << dio
+			elif function >= PIN_DIGITAL_INPUT:
+				digitalMask |= 1 << dio
+			if function >= PIN_OUTPUT_LOW:
+				outputMask |= 1 << dio
+			if function == PIN_OUTPUT_HIGH:
+				highMask |= 1 << dio
+		if not (digitalMask or analogMask):
+			return None
+		encoded = _SAMPLE_SET.pack(1, digitalMask, analogMask)
+		if digitalMask:
+			if rand.random() < _DIGITAL_FLIP_PROBABILITY:
+				self.__digitalBits ^= 1 << rand.choice(
+					encoding.bitFieldToIndices(digitalMask))
+			# outputs read as the level they are set to
+			encoded += _SAMPLE_VALUE.pack((self.__digitalBits
+				& digitalMask & ~outputMask) | highMask)
+		for pin in encoding.bitFieldToIndices(analogMask):
+			value = self.__analogValues[pin] + rand.randint(
+				-_ANALOG_STEP, _ANALOG_STEP)
+			value = min(max(value, 0), _ANALOG_MAX)
+			self.__analogValues[pin] = value
+			encoded += _SAMPLE_VALUE.pack(value)
+		return encoded
+
+
+	def handleCommand(self, name, parameter):
+		"""
+		Get or set an AT parameter (other than ND, which the mesh
+		answers).
+		@param name the command name, such as 'D0'
+		@param parameter the parameter to set, or '' to get
+		@return (Command.STATUS index, response parameter)
+		"""
+		status = Command.STATUS
+		if name in _NUMBERS:
+			numBytes, low, high = _NUMBERS[name]
+			if not parameter:
+				return status.OK.index, (
+					encoding.numberToString(
+						self.__numbers[name], numBytes))
+			value = encoding.stringToNumber(parameter)
+			if not (low <= value <= high and self.__isValid(name,
+				value)):
+				return status.INVALID_PARAMETER.index, ''
+			self.__numbers[name] = value
+			return status.OK.index, ''
+		if name == 'NI':
+			if parameter:
+				self.__nodeIdentifier = parameter
+				return status.OK.index, ''
+			return status.OK.index, self.__nodeIdentifier
+		if parameter:
+			if name in _ACTIONS:
+				return status.OK.index, ''
+			return status.INVALID_PARAMETER.index, ''
+		if name == 'SH':
+			return status.OK.index, struct.pack('>I',
+				self.__serial >> 32)
+		if name == 'SL':
+			return status.OK.index, struct.pack('>I',
+				self.__serial & 0xFFFFFFFF)
+		if name == 'MY':
+			return status.OK.index, struct.pack('>H',
+				self.__networkAddress)
+		if name == '%V':
+			return status.OK.index, struct.pack('>H',
+				int(encoding.voltsToNumber(self.__supplyVolts)))
+		if name == 'IS':
+			samples = self.encodeSamples()
+			if samples is None:
+				return status.ERROR.index, ''
+			return status.OK.index, samples
+		if name in _ACTIONS:
+			return status.OK.index, ''
+		return status.INVALID_COMMAND.index, ''
+
+
+	def __isValid(self, name, value):
+		if name == 'IR':
+			return (value == 0
+				or value >= protocol.SampleRate.RATE_MIN)
+		if name == 'SM':
+			return value in (0, 1) + CYCLIC_SLEEP_MODES
+		if value == PIN_ANALOG_INPUT and name in PIN_COMMAND_TO_DIO:
+			return PIN_COMMAND_TO_DIO[name] < NUM_ANALOG_PINS
+		return True
+
+
+	def __str__(self):
+		return 'SimulatedNode %s (%s 0x%016x)' % (self.__nodeIdentifier,
+			self.__deviceType, self.__serial)
+
+
+
+def createNodes(numNodes, seed=0, sampleRateMillis=DEFAULT_SAMPLE_RATE_MILLIS,
+	endDeviceFraction=END_DEVICE_FRACTION):
+	"""
+	@return a list of numNodes SimulatedNodes, with serials after
+		SERIAL_BASE, unique random network addresses, identifiers
+		sim0001 and on, the DEFAULT_PIN_FUNCTIONS, and sampling at
+		sampleRateMillis; the given fraction of them are end devices
+		which sleep cyclically
+	"""
+	rand = random.Random(seed)
+	networkAddresses = rand.sample(
+		xrange(COORDINATOR_NETWORK_ADDRESS + 1,
+			UNKNOWN_NETWORK_ADDRESS), numNodes)
+	nodes = []
+	for i in xrange(numNodes):
+		isEndDevice = rand.random() < endDeviceFraction
+		nodes.append(SimulatedNode(SERIAL_BASE + i + 1,
+			networkAddresses[i], 'sim%04d' % (i + 1),
+			deviceType=(DEVICE_TYPE.END_DEVICE if isEndDevice
+				else DEVICE_TYPE.ROUTER),
+			pinFunctions=DEFAULT_PIN_FUNCTIONS,
+			sampleRateMillis=sampleRateMillis,
+			sleepMillis=(END_DEVICE_SLEEP_MILLIS if isEndDevice
+				else None),
+			awakeMillis=(END_DEVICE_AWAKE_MILLIS if isEndDevice
+				else None),
+			seed=rand.getrandbits(32)))
+	return nodes
+
+
+
+class SimulatedMesh:
+	"""
+	A stand-in for the serial device of a local XBee (like the xbee
+	library's FakeDevice), which is the coordinator of a mesh of
+	SimulatedNodes. It is thread-safe, so the reader and the transmit
+	queue may use it at once.
+	"""
+
+
+	def __init__(self, numNodes=0, nodes=None, escaped=False, seed=0,
+		latencySeconds=LATENCY_SECONDS, **kwargs):
+		"""
+		@param numNodes how many nodes to create (see createNodes, to
+			which other keyword arguments are passed), unless nodes
+			is given
+		@param nodes a list of SimulatedNodes
+		@param escaped whether to act as in escaped API mode (AP=2)
+		@param latencySeconds the (lowest, highest) time a transmission
+			takes each way
+		"""
+		if nodes is None:
+			nodes = createNodes(numNodes, seed=seed, **kwargs)
+		self.__nodes = list(nodes)
+		sleepMillis = max([n.getNumber('SP') * 10
+			for n in self.__nodes if n.isSleepy()] or [None])
+		self.__coordinator = SimulatedNode(SERIAL_BASE,
+			COORDINATOR_NETWORK_ADDRESS, 'coordinator',
+			deviceType=DEVICE_TYPE.COORDINATOR)
+		if sleepMillis is not None:
+			# The parents of sleeping end devices must know how
+			# long they sleep, as the real ones do.
+			self.__coordinator.handleCommand('SP',
+				struct.pack('>H', sleepMillis / 10))
+		self.__bySerial = dict((n.getSerial(), n)
+			for n in self.__nodes + [self.__coordinator])
+		self.__escaped = escaped
+		self.__latencySeconds = latencySeconds
+		self.__random = random.Random(seed)
+		self.__lock = threading.Lock()
+		self.__splitter = protocol.FrameSplitter(escaped=escaped)
+		self.__pending = bytearray()
+		# (due time, sequence number, function, arguments)
+		self.__events = []
+		self.__numEvents = 0
+		# the nodes with a sample scheduled
+		self.__sampling = set()
+		self.__numFramesSent = 0
+		self.__numFramesReceived = 0
+		self.__startTime = None
+		self.__isOpen = True
+
+
+	def getName(self):
+		return 'simulated mesh of %d nodes' % len(self.__nodes)
+
+
+	def getNodes(self):
+		return self.__nodes
+
+
+	def getCoordinator(self):
+		"""
+		@return the SimulatedNode acting as the local XBee
+		"""
+		return self.__coordinator
+
+
+	def getNode(self, serial):
+		return self.__bySerial.get(serial)
+
+
+	def getNumFramesSent(self):
+		"""
+		@return how many frames the mesh has made available to read
+		"""
+		return self.__numFramesSent
+
+
+	def getNumFramesReceived(self):
+		"""
+		@return how many frames the host has written to the mesh
+		"""
+		return self.__numFramesReceived
+
+
+	def inWaiting(self):
+		with self.__lock:
+			self.__fill()
+			return len(self.__pending)
+
+
+	def read(self, size=1):
+		with self.__lock:
+			self.__fill()
+			data = str(self.__pending[:size])
+			del self.__pending[:size]
+			return data
+
+
+	def write(self, data):
+		with self.__lock:
+			now = self.__start()
+			for frameData in self.__splitter.feed(data):
+				self.__numFramesReceived += 1
+				try:
+					self.__handleFrame(now, frameData)
+				except:
+					log.error('error simulating response to'
+						+ ' %r' % (frameData,),
+						exc_info=True)
+
+
+	def flush(self):
+		pass
+
+
+	def flushInput(self):
+		with self.__lock:
+			del self.__pending[:]
+
+
+	def close(self):
+		self.__isOpen = False
+
+
+	def isOpen(self):
+		return self.__isOpen
+
+
+	def __str__(self):
+		return 'SimulatedMesh of %d nodes' % len(self.__nodes)
+
+
+	def __start(self):
+		"""
+		Start the nodes sampling, the first time the mesh is used.
+		(The lock must be held.)
+		@return the time now, in seconds from the start
+		"""
+		if self.__startTime is None:
+			self.__startTime = time.time()
+			for node in self.__nodes:
+				self.__scheduleSample(0.0, node, spread=True)
+		return time.time() - self.__startTime
+
+
+	def __schedule(self, due, function, *args):
+		self.__numEvents += 1
+		heapq.heappush(self.__events,
+			(due, self.__numEvents, function, args))
+
+
+	def __fill(self):
+		"""
+		Generate the frames which are due (up to BUFFER_BYTES) into the
+		bytes waiting to be read. (The lock must be held.)
+		"""
+		now = self.__start()
+		events = self.__events
+		while (events and events[0][0] <= now
+			and len(self.__pending) < BUFFER_BYTES):
+			due, n, function, args = heapq.heappop(events)
+			function(due, *args)
+
+
+	def __send(self, frameData):
+		self.__pending += protocol.encodeFrame(frameData,
+			escaped=self.__escaped)
+		self.__numFramesSent += 1
+
+
+	def __latency(self):
+		return self.__random.uniform(*self.__latencySeconds)
+
+
+	def __handleFrame(self, now, frameData):
+		apiId = ord(frameData[0])
+		if apiId == _API_ID_AT:
+			frameId, name = _AT.unpack_from(frameData)[1:]
+			self.__handleLocal(now, frameId, name,
+				frameData[_AT.size:])
+		elif apiId == _API_ID_REMOTE_AT:
+			(frameId, serial, networkAddress, options,
+				name) = _REMOTE_AT.unpack_from(frameData)[1:]
+			self.__handleRemote(now, frameId, serial, name,
+				frameData[_REMOTE_AT.size:])
+		else:
+			log.debug('not simulating API frame type 0x%02x'
+				% apiId)
+
+
+	def __handleLocal(self, now, frameId, name, parameter):
+		if name == 'ND':
+			self.__discover(now, frameId, parameter)
+			return
+		status, response = self.__coordinator.handleCommand(name,
+			parameter)
+		if frameId:
+			self.__send(_AT_RESPONSE.pack(
+				protocol.apiframe.API_ID_AT_RESPONSE, frameId,
+				name, status) + response)
+
+
+	def __discover(self, now, frameId, parameter):
+		"""
+		Have each node (or the one with the given identifier) answer
+		ND, at a random time within the discovery timeout, or when an
+		end device next wakes within that and its sleep time.
+		"""
+		timeoutSeconds = self.__coordinator.getNumber('NT') / 10.0
+		sleepSeconds = self.__coordinator.getNumber('SP') / 100.0
+		for node in self.__nodes:
+			if parameter and parameter != node.getNodeIdentifier():
+				continue
+			due = node.getNextWake(now
+				+ self.__random.uniform(0, timeoutSeconds))
+			if due - now > timeoutSeconds + sleepSeconds:
+				continue
+			self.__schedule(due + self.__latency(),
+				self.__answerDiscovery, node, frameId)
+
+
+	def __answerDiscovery(self, now, node, frameId):
+		if not frameId:
+			return
+		parent = UNKNOWN_NETWORK_ADDRESS
+		if node.getDeviceType() == DEVICE_TYPE.END_DEVICE:
+			parent = COORDINATOR_NETWORK_ADDRESS
+		self.__send(_AT_RESPONSE.pack(
+			protocol.apiframe.API_ID_AT_RESPONSE, frameId, 'ND',
+			Command.STATUS.OK.index)
+			+ node.encodeNodeDiscovery(parent))
+
+
+	def __handleRemote(self, now, frameId, serial, name, parameter):
+		if serial == BROADCAST_SERIAL:
+			targets = self.__nodes
+		else:
+			targets = [self.__bySerial.get(serial)]
+		for node in targets:
+			if node is None:
+				self.__schedule(now + TRANSMIT_FAILURE_SECONDS,
+					self.__failRemote, serial, frameId,
+					name)
+				continue
+			# A sleeping end device gets the command (from its
+			# parent) when it wakes.
+			arrival = node.getNextWake(now + self.__latency())
+			self.__schedule(arrival, self.__answerRemote, node,
+				frameId, name, parameter)
+
+
+	def __answerRemote(self, now, node, frameId, name, parameter):
+		if name == 'ND':
+			status = Command.STATUS.OK.index
+			response = node.encodeNodeDiscovery(
+				UNKNOWN_NETWORK_ADDRESS)
+		else:
+			status, response = node.handleCommand(name, parameter)
+			if node not in self.__sampling:
+				self.__scheduleSample(now, node)
+		if frameId:
+			self.__schedule(now + self.__latency(),
+				self.__sendRemoteResponse, node.getSerial(),
+				node.getNetworkAddress(), frameId, name,
+				status, response)
+
+
+	def __failRemote(self, now, serial, frameId, name):
+		if frameId:
+			self.__sendRemoteResponse(now, serial,
+				UNKNOWN_NETWORK_ADDRESS, frameId, name,
+				Command.STATUS.TRANSMIT_FAILURE.index, '')
+
+
+	def __sendRemoteResponse(self, now, serial, networkAddress, frameId,
+		name, status, response):
+		self.__send(_REMOTE_AT_RESPONSE.pack(
+			protocol.apiframe.API_ID_REMOTE_AT_RESPONSE, frameId,
+			serial, networkAddress, name, status) + response)
+
+
+	def __scheduleSample(self, now, node, spread=False):
+		"""
+		Schedule the node's next IO sample, one sample period from now
+		(or when it next wakes), if it has a sample rate.
+		@param spread whether to pick a random time within the period
+			instead, to spread the nodes out
+		"""
+		rateSeconds = node.getSampleRateMillis() / 1000.0
+		if not rateSeconds:
+			return
+		if spread:
+			rateSeconds *= self.__random.random()
+		self.__sampling.add(node)
+		self.__schedule(node.getNextWake(now + rateSeconds),
+			self.__sample, node)
+
+
+	def __sample(self, now, node):
+		"""
+		Send an IO sample from the node, and schedule the next (unless
+		its sample rate has been set to 0).
+		"""
+		self.__sampling.discard(node)
+		if not node.getSampleRateMillis():
+			return
+		samples = node.encodeSamples()
+		if samples is not None:
+			self.__schedule(now + self.__latency(),
+				self.__sendSample, node.getSerial(),
+				node.getNetworkAddress(), samples)
+		self.__scheduleSample(now, node)
+
+
+	def __sendSample(self, now, serial, networkAddress, samples):
+		self.__send(_IO_SAMPLE.pack(protocol.apiframe.API_ID_IO_SAMPLE,
+			serial, networkAddress, _IO_SAMPLE_OPTIONS) + samples)
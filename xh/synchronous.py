@@ -3,65 +3,58 @@ Functions for synchronously sending Commands and waiting for responses.
 """
 
 import logging
-import multiprocessing
+import Queue
+import threading
 import time
 
-from . import signals
+from . import correlator, rtt, transmit
 
 
 __all__ = [
 	'sendAndWait',
 	'sendAndAccumulate',
+	'sendAndIterate',
+	'sendBatch',
 ]
 
 
 log = logging.getLogger('synchronous')
 
-TIMEOUT_SECONDS = 0.2
-CHECK_INTERVAL_SECONDS = 0.01
-TimeoutError = multiprocessing.TimeoutError
+# the response timeout for the local XBee before any is measured (see xh.rtt)
+TIMEOUT_SECONDS = rtt.INITIAL_LOCAL_TIMEOUT_SECONDS
 
+# default number of Commands sendBatch keeps awaiting responses at once
+BATCH_WINDOW = 8
+TimeoutError = correlator.TimeoutError
 
 
-class _Response:
-	def __init__(self):
-		self.__value = None
 
-
-	def get(self):
-		return self.__value
-
-
-	def set(self, v):
-		self.__value = v
-
-
-
-def sendAndWait(command, xb=None):
+def sendAndWait(command, xb=None, timeoutSeconds=None,
+	priority=transmit.PRIORITY.INTERACTIVE):
 	"""
 	Send a Command and wait for its (single) response.
+	@param timeoutSeconds how long to wait for the response (default:
+		from the round-trip times measured to the destination, see
+		xh.rtt)
+	@param priority the xh.transmit.PRIORITY to send with (see
+		Command.send); by default INTERACTIVE, ahead of queued
+		batches and polls, as a person (such as at the shell) is
+		usually the one waiting. Configuration should be sent at
+		NORMAL.
 	@return the Frame received in response
 	@raise TimeoutError if no response is received
-		within a short timeout
+		within timeoutSeconds
 	"""
-	r = _Response()
-	id = command.getFrameId()
-	def recordSingleResponseCb(sender=None, signal=None, frame=None):
-		if hasattr(frame, 'getFrameId') and frame.getFrameId() == id:
-			r.set(frame)
-	signals.FRAME_RECEIVED.connect(recordSingleResponseCb)
-	command.send(xb=xb)
-
-	elapsed = 0
-	while r.get() is None and elapsed <= TIMEOUT_SECONDS:
-		time.sleep(CHECK_INTERVAL_SECONDS)
-		elapsed += CHECK_INTERVAL_SECONDS
-	signals.FRAME_RECEIVED.disconnect(recordSingleResponseCb)
-	if r.get() is None:
+	if timeoutSeconds is None:
+		timeoutSeconds = rtt.getTimeoutSeconds(
+			command.getRemoteSerial())
+	future = command.sendAsync(xb=xb, timeoutSeconds=timeoutSeconds,
+		priority=priority)
+	try:
+		return future.getResult()
+	except TimeoutError:
 		raise TimeoutError('No response after %.3fs waiting for %s'
-			% (TIMEOUT_SECONDS, command))
-	else:
-		return r.get()
+			% (timeoutSeconds, command))
 
 
 def sendAndAccumulate(command, timeoutSeconds, xb=None):
@@ -69,17 +62,91 @@ def sendAndAccumulate(command, timeoutSeconds, xb=None):
 	Send a Command and wait to accumulate multiple responses.
 	@return a list of Frames received in response
 	"""
-	r = _Response()
-	r.set([])
+	return list(sendAndIterate(command, timeoutSeconds, xb=xb))
 
-	id = command.getFrameId()
-	def accumulateMultipleCallback(sender=None, signal=None, frame=None):
-		if hasattr(frame, 'getFrameId') and frame.getFrameId() == id:
-			r.get().append(frame)
-	signals.FRAME_RECEIVED.connect(accumulateMultipleCallback)
-	command.send(xb=xb)
-	time.sleep(timeoutSeconds)
-	signals.FRAME_RECEIVED.disconnect(accumulateMultipleCallback)
-
-	return r.get()
 
+def sendAndIterate(command, timeoutSeconds, xb=None, count=None,
+	quietSeconds=None):
+	"""
+	Send a Command and generate its responses as they are received.
+	@param timeoutSeconds the most time to wait for responses
+	@param count if given, stop after this many responses
+	@param quietSeconds if given, stop when this long passes (since
+		sending, or since the last response) without a response
+	"""
+	if count is not None and count <= 0:
+		return
+	responses = Queue.Queue()
+	with correlator.listening(command.getFrameId(),
+		command.getRemoteSerial(), responses.put):
+		command.send(xb=xb)
+		deadline = time.time() + timeoutSeconds
+		lastTime = time.time()
+		numReceived = 0
+		while True:
+			stopTime = deadline
+			if quietSeconds is not None:
+				stopTime = min(stopTime,
+					lastTime + quietSeconds)
+			waitSeconds = stopTime - time.time()
+			if waitSeconds <= 0:
+				return
+			try:
+				frame = responses.get(timeout=waitSeconds)
+			except Queue.Empty:
+				return
+			lastTime = time.time()
+			numReceived += 1
+			yield frame
+			if count is not None and numReceived >= count:
+				return
+
+
+def sendBatch(commands, window=BATCH_WINDOW, xb=None, timeoutSeconds=None,
+	priority=None):
+	"""
+	Send Commands in order, without waiting for each response before
+	sending the next, and wait for all their responses.
+	@param window the most Commands to have awaiting responses at once
+	@param timeoutSeconds how long to wait for each response, once its
+		Command is sent (default: as for sendAndWait)
+	@param priority the xh.transmit.PRIORITY to send with (default
+		NORMAL)
+	@return a list with, for each Command in order, the Frame received in
+		response, or the exception (such as TimeoutError) raised
+		instead
+	"""
+	commands = list(commands)
+	available = threading.Semaphore(window)
+	futures = []
+	if timeoutSeconds is None:
+		timeouts = [rtt.getTimeoutSeconds(command.getRemoteSerial())
+			for command in commands]
+	else:
+		timeouts = [timeoutSeconds] * len(commands)
+	for command, timeout in zip(commands, timeouts):
+		available.acquire()
+		try:
+			future = command.sendAsync(xb=xb,
+				timeoutSeconds=timeout, priority=priority)
+		except Exception as e:
+			available.release()
+			futures.append(e)
+			continue
+		future.addDoneCallback(lambda f: available.release())
+		futures.append(future)
+
+	results = []
+	for command, timeout, future in zip(commands, timeouts, futures):
+		if isinstance(future, Exception):
+			results.append(future)
+			continue
+		try:
+			results.append(future.getResult())
+		except TimeoutError:
+			results.append(TimeoutError(
+				'No response after %.3fs waiting for %s'
+				% (timeout, command)))
+		except Exception as e:
+			results.append(e)
+	return results
@@ -0,0 +1,251 @@
+"""
+A queue of API frames to send to the locally attached XBee, written to the
+serial port by a dedicated thread, so that senders (such as plugins sending
+Commands) do not wait on serial I/O or on each other.
+
+Frames are scheduled, rather than written in the order queued:
+ * by priority, so that (for example) a command from the interactive shell
+   is not stuck behind a burst of polls to every node;
+ * fairly among destinations within a priority, taking one frame from each
+   destination in turn;
+ * no faster than the serial port and the radio's buffer can take them (by
+   a token bucket), so that frames wait here, where they can still be
+   reordered, rather than in the serial driver or the radio.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from . import protocol
+from .config import Config
+from .deps import Enum
+
+
+log = logging.getLogger('xh.transmit')
+
+PRIORITY = Enum(
+	'INTERACTIVE',	# commands a person is waiting on
+	'NORMAL',	# the default
+	'BULK',		# periodic polling and other background traffic
+)
+
+# size of the XBee's serial receive buffer; the most to write at once
+RADIO_BUFFER_BYTES = 200
+
+# bits on the wire per byte sent (8N1: start bit, 8 data bits, stop bit)
+_BITS_PER_BYTE = 10
+
+
+
+class TransmitQueue(threading.Thread):
+
+
+	def __init__(self, serialObj, escaped=False, baud=Config.SERIAL_BAUD,
+		bufferBytes=RADIO_BUFFER_BYTES):
+		"""
+		@param serialObj the open serial port to write to
+		@param escaped whether the XBee is in escaped API mode (AP=2)
+		@param baud the serial port's baud rate, which limits the rate
+			frames are written
+		@param bufferBytes the most bytes to write at once
+		"""
+		threading.Thread.__init__(self, name='TransmitQueue')
+		self.daemon = True
+		self.__serial = serialObj
+		self.__escaped = escaped
+		self.__bytesPerSecond = float(baud) / _BITS_PER_BYTE
+		self.__bufferBytes = bufferBytes
+		self.__tokens = float(bufferBytes)
+		self.__tokensTime = time.time()
+		self.__neededTokens = 0
+
+		# for each priority, frames queued for each destination
+		# (in round-robin order)
+		self.__queues = [collections.OrderedDict() for p in PRIORITY]
+		self.__depths = [0 for p in PRIORITY]
+		self.__lock = threading.Lock()
+		self.__queued = threading.Condition(self.__lock)
+		self.__running = True
+
+		self.__numFrames = 0
+		self.__numWrites = 0
+		self.__numBytes = 0
+		self.__totalWaitSeconds = 0.0
+		self.__maxWaitSeconds = 0.0
+
+
+	def put(self, frameData, destination=None, priority=PRIORITY.NORMAL,
+			onWritten=None):
+		"""
+		Queue an API frame to be sent, and return without waiting.
+		@param frameData a string of frame data, starting with the API
+			id
+		@param destination the serial of the remote node the frame is
+			for, or None if for the local XBee
+		@param priority a PRIORITY value
+		@param onWritten if given, called (with no arguments, on the
+			queue's thread) once the frame is written
+		"""
+		encoded = protocol.encodeFrame(frameData,
+			escaped=self.__escaped)
+		with self.__lock:
+			if not self.__running:
+				raise RuntimeError('TransmitQueue halted.')
+			queues = self.__queues[priority.index]
+			frames = queues.get(destination)
+			if frames is None:
+				frames = collections.deque()
+				queues[destination] = frames
+			frames.append((time.time(), encoded, onWritten))
+			self.__depths[priority.index] += 1
+			self.__queued.notify()
+
+
+	def getDepth(self, priority=None):
+		"""
+		@param priority if given, count only frames of this PRIORITY
+		@return the number of frames queued and not yet written
+		"""
+		if priority is None:
+			return sum(self.__depths)
+		return self.__depths[priority.index]
+
+
+	def getNumFrames(self):
+		return self.__numFrames
+
+
+	def getNumWrites(self):
+		"""
+		@return the number of serial writes (each of one or more
+			frames)
+		"""
+		return self.__numWrites
+
+
+	def getNumBytes(self):
+		return self.__numBytes
+
+
+	def getMeanWaitSeconds(self):
+		"""
+		@return the mean time from a frame being queued to its being
+			written
+		"""
+		with self.__lock:
+			if not self.__numFrames:
+				return 0.0
+			return self.__totalWaitSeconds / self.__numFrames
+
+
+	def getMaxWaitSeconds(self):
+		return self.__maxWaitSeconds
+
+
+	def halt(self):
+		"""
+		Write the frames already queued, then stop and wait for the
+		thread to finish.
+		"""
+		with self.__lock:
+			self.__running = False
+			self.__queued.notify()
+		if self.is_alive():
+			self.join()
+
+
+	def run(self):
+		while True:
+			with self.__lock:
+				while self.__running and not any(self.__depths):
+					self.__queued.wait()
+				if not any(self.__depths):
+					break
+				enqueueTimes, pieces, callbacks = (
+					self.__takeFrames())
+			if not pieces:
+				# Wait for the serial port and radio to drain.
+				time.sleep(self.__getTokenWaitSeconds())
+				continue
+
+			data = ''.join(pieces)
+			try:
+				self.__serial.write(data)
+			except:
+				log.error(('error writing %d frames to serial'
+					+ ' port') % len(pieces), exc_info=True)
+				continue
+			self.__recordWrite(enqueueTimes, len(data))
+			for callback in callbacks:
+				try:
+					callback()
+				except:
+					log.error('error in onWritten callback'
+						+ ' %s' % callback,
+						exc_info=True)
+
+
+	def __refillTokens(self):
+		now = time.time()
+		self.__tokens = min(self.__bufferBytes, self.__tokens
+			+ (now - self.__tokensTime) * self.__bytesPerSecond)
+		self.__tokensTime = now
+
+
+	def __getTokenWaitSeconds(self):
+		"""
+		@return how long until the bucket has room for the frame which
+			did not fit
+		"""
+		deficit = self.__neededTokens - self.__tokens
+		return max(0.001, deficit / self.__bytesPerSecond)
+
+
+	def __takeFrames(self):
+		"""
+		Take as many frames as the token bucket allows, highest priority
+		first, and each priority's destinations in turn. (The lock must
+		be held.)
+		@return (queued times, encoded frames, onWritten callbacks)
+		"""
+		self.__refillTokens()
+		enqueueTimes = []
+		pieces = []
+		callbacks = []
+		for i, queues in enumerate(self.__queues):
+			while queues:
+				destination = next(iter(queues))
+				frames = queues[destination]
+				t, encoded, onWritten = frames[0]
+				# Allow a frame larger than the buffer once it
+				# is empty.
+				size = min(len(encoded), self.__bufferBytes)
+				if size > self.__tokens:
+					self.__neededTokens = size
+					return enqueueTimes, pieces, callbacks
+				frames.popleft()
+				del queues[destination]
+				self.__depths[i] -= 1
+				self.__tokens -= size
+				enqueueTimes.append(t)
+				pieces.append(encoded)
+				if onWritten is not None:
+					callbacks.append(onWritten)
+				if frames:
+					# to the back of the round robin
+					queues[destination] = frames
+		return enqueueTimes, pieces, callbacks
+
+
+	def __recordWrite(self, enqueueTimes, numBytes):
+		now = time.time()
+		waits = [now - t for t in enqueueTimes]
+		with self.__lock:
+			self.__numFrames += len(waits)
+			self.__numWrites += 1
+			self.__numBytes += numBytes
+			self.__totalWaitSeconds += sum(waits)
+			self.__maxWaitSeconds = max(self.__maxWaitSeconds,
+				max(waits))
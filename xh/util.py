@@ -9,13 +9,16 @@ def invertedDict(d):
 def invertedDictWithRepeatedValues(d):
 	"""
 	@return a dict where each value in the original maps to a tuple of the
-		values in the original map which mapped to it
+		values in the original map which mapped to it, in sorted order
+		(so that the order does not depend on how the keys hash)
 	"""
 	o = {}
 	for k, v in d.iteritems():
 		keys = o.get(v, ())
 		keys = keys + (k,)
 		o[v] = keys
+	for v, keys in o.iteritems():
+		o[v] = tuple(sorted(keys))
 	return o
 
 